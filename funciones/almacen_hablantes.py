@@ -0,0 +1,293 @@
+import os                 # Para manejo de rutas
+import json               # Para reescribir diarization_results.json y los parámetros del re-agrupamiento
+import numpy as np        # Para guardar y comparar los embeddings
+from funciones.diarizacion_por_ventanas import unir_ventanas, UMBRAL_HABLANTES
+from funciones.vad import MapaTiempo  # Tiempos del audio condensado -> originales
+
+# Archivo con los embeddings y las salidas de segmentación, junto a diarization_results.json
+ALMACEN_HABLANTES = "diarization_embeddings.npz"
+# Parámetros del último re-agrupamiento de la carpeta; `post_partum.py` los vuelve a aplicar (y forman parte
+# de la clave de caché de la diarización) para que una nueva ejecución no regrese a los turnos anteriores
+REAGRUPAMIENTO = "reagrupamiento.json"
+# Versión de pyannote.audio con la que se probó `_reagrupar_completo` (usa métodos internos del pipeline)
+PYANNOTE_PROBADO = "3.2"
+# Atributos del pipeline de pyannote que usa `_reagrupar_completo`
+_INTERNOS_PYANNOTE = ("_segmentation", "segmentation", "clustering", "set_num_speakers", "reconstruct",
+                      "to_annotation", "classes")
+
+def _guardar(carpeta, **arreglos):
+    ruta = os.path.join(carpeta, ALMACEN_HABLANTES)
+    temporal = ruta + ".tmp.npz"
+    np.savez_compressed(temporal, **arreglos)
+    os.replace(temporal, ruta)
+    return ruta
+
+def _ventana_deslizante(swf):
+    ventana = swf.sliding_window
+    return np.array([ventana.start, ventana.duration, ventana.step], dtype=np.float64)
+
+def _perfiles(centroides):
+    # Un centroide (normalizado) por hablante global, ordenado por etiqueta
+    hablantes = sorted(centroides)
+    dimension = max((len(v) for v in centroides.values()), default=0)
+    matriz = np.array([centroides[h] for h in hablantes], dtype=np.float32).reshape(len(hablantes), dimension)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return np.array(hablantes), matriz / np.where(normas > 0, normas, 1)
+
+def guardar_almacen_completo(carpeta, segmentaciones, conteo, embeddings, centroides):
+    """
+    Guarda las salidas de las etapas neuronales de pyannote (puntajes de segmentación por chunk,
+    conteo de hablantes por frame y embedding de cada hablante local de cada chunk) y el centroide de
+    cada hablante. Con esto `reagrupar` recalcula los turnos sin volver a correr los modelos.
+
+    Args:
+        carpeta (str): Carpeta de resultados.
+        segmentaciones (SlidingWindowFeature): Puntajes de segmentación (chunks x frames x hablantes locales).
+        conteo (SlidingWindowFeature): Hablantes simultáneos por frame.
+        embeddings (np.ndarray): Embeddings (chunks x hablantes locales x dimensión).
+        centroides (dict): Embedding centroide de cada hablante ("SPEAKER_00": vector).
+
+    Returns:
+        str: Ruta del almacén.
+    """
+    hablantes, perfiles = _perfiles(centroides)
+    return _guardar(
+        carpeta, modo=np.array("completo"),
+        segmentaciones=segmentaciones.data.astype(np.float16),   # Puntajes en [0, 1]: float16 basta
+        segmentaciones_ventana=_ventana_deslizante(segmentaciones),
+        conteo=conteo.data.astype(np.int8), conteo_ventana=_ventana_deslizante(conteo),
+        embeddings=np.asarray(embeddings, dtype=np.float32),
+        hablantes=hablantes, centroides=perfiles,
+    )
+
+def guardar_almacen_ventanas(carpeta, resultados_ventanas, centroides):
+    """
+    Guarda los turnos locales y los centroides de los hablantes locales de cada ventana de la
+    diarización por ventanas, y el centroide de cada hablante global.
+
+    Args:
+        carpeta (str): Carpeta de resultados.
+        resultados_ventanas (list): Resultados de `diarizar_ventana`.
+        centroides (dict): Embedding centroide de cada hablante global.
+
+    Returns:
+        str: Ruta del almacén.
+    """
+    turnos, turnos_local, locales, locales_ventana, locales_etiqueta = [], [], [], [], []
+    for k, r in enumerate(resultados_ventanas):
+        indice = {etiqueta: len(locales_etiqueta) + j for j, etiqueta in enumerate(r["etiquetas"])}
+        for j, etiqueta in enumerate(r["etiquetas"]):
+            locales.append(r["centroides"][j] if j < len(r["centroides"]) else None)
+            locales_ventana.append(k)
+            locales_etiqueta.append(etiqueta)
+        for inicio, fin, etiqueta in r["turnos"]:
+            turnos.append((inicio, fin))
+            turnos_local.append(indice[etiqueta])
+    dimension = max((len(c) for c in locales if c is not None), default=0)
+    locales = np.array([c if c is not None and len(c) == dimension else np.full(dimension, np.nan) for c in locales],
+                       dtype=np.float32).reshape(len(locales), dimension)
+    hablantes, perfiles = _perfiles(centroides)
+    return _guardar(
+        carpeta, modo=np.array("ventanas"),
+        ventanas=np.array([(r["inicio"], r["fin"]) for r in resultados_ventanas], dtype=np.float64).reshape(-1, 2),
+        turnos=np.array(turnos, dtype=np.float64).reshape(-1, 2), turnos_local=np.array(turnos_local, dtype=np.int32),
+        locales=locales, locales_ventana=np.array(locales_ventana, dtype=np.int32),
+        locales_etiqueta=np.array(locales_etiqueta),
+        hablantes=hablantes, centroides=perfiles,
+    )
+
+def cargar_almacen(carpeta):
+    """
+    Lee el almacén de embeddings de una carpeta de resultados.
+
+    Returns:
+        dict: Arreglos del almacén ("modo" es "completo" o "ventanas").
+    """
+    with np.load(os.path.join(carpeta, ALMACEN_HABLANTES), allow_pickle=False) as datos:
+        almacen = {clave: datos[clave] for clave in datos.files}
+    almacen["modo"] = str(almacen["modo"])
+    return almacen
+
+def _resultados_de_ventanas(almacen):
+    resultados = []
+    for k, (inicio, fin) in enumerate(almacen["ventanas"]):
+        locales = np.flatnonzero(almacen["locales_ventana"] == k)
+        etiquetas = [str(almacen["locales_etiqueta"][i]) for i in locales]
+        turnos = [(float(a), float(b), str(almacen["locales_etiqueta"][i]))
+                  for (a, b), i in zip(almacen["turnos"], almacen["turnos_local"]) if almacen["locales_ventana"][i] == k]
+        resultados.append({"inicio": float(inicio), "fin": float(fin), "turnos": turnos,
+                           "etiquetas": etiquetas, "centroides": almacen["locales"][locales]})
+    return resultados
+
+def _escribir_json(datos, ruta):
+    # Escritura atómica, igual que los demás archivos de resultados
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=4)
+    os.replace(temporal, ruta)
+
+def _verificar_pyannote(pipeline):
+    """Lanza RuntimeError si el pipeline no tiene los métodos internos que usa `_reagrupar_completo`."""
+    faltantes = [nombre for nombre in _INTERNOS_PYANNOTE if not hasattr(pipeline, nombre)]
+    if faltantes:
+        try:
+            from pyannote.audio import __version__ as version
+        except ImportError:
+            version = "desconocida"
+        raise RuntimeError(
+            f"El re-agrupamiento requiere pyannote.audio {PYANNOTE_PROBADO}.x (ver requirements.txt); la versión "
+            f"instalada ({version}) no tiene: {', '.join(faltantes)}"
+        )
+
+def _reagrupar_completo(almacen, pipeline, umbral, num_hablantes, min_hablantes, max_hablantes):
+    """Repite el agrupamiento y la reconstrucción de pyannote sobre las salidas guardadas."""
+    _verificar_pyannote(pipeline)
+    from pyannote.core import SlidingWindow, SlidingWindowFeature
+    from pyannote.audio.utils.signal import binarize
+
+    def ventana(clave):
+        inicio, duracion, paso = almacen[clave]
+        return SlidingWindow(start=inicio, duration=duracion, step=paso)
+
+    segmentaciones = SlidingWindowFeature(almacen["segmentaciones"].astype(np.float32), ventana("segmentaciones_ventana"))
+    conteo = SlidingWindowFeature(almacen["conteo"].copy(), ventana("conteo_ventana"))
+    num_hablantes, min_hablantes, max_hablantes = pipeline.set_num_speakers(
+        num_speakers=num_hablantes, min_speakers=min_hablantes, max_speakers=max_hablantes
+    )
+    # Mismos pasos que SpeakerDiarization.apply después de calcular los embeddings
+    if pipeline._segmentation.model.specifications.powerset:
+        binarizadas = segmentaciones
+    else:
+        binarizadas = binarize(segmentaciones, onset=pipeline.segmentation.threshold, initial_state=False)
+    # El pipeline puede ser compartido (modo por lotes o servicio): el umbral se restaura al terminar
+    umbral_anterior = pipeline.clustering.threshold
+    try:
+        if umbral is not None:
+            pipeline.clustering.threshold = umbral
+        hard_clusters, _, centroides = pipeline.clustering(
+            embeddings=almacen["embeddings"], segmentations=binarizadas, num_clusters=num_hablantes,
+            min_clusters=min_hablantes, max_clusters=max_hablantes, file={},
+            frames=getattr(pipeline, "_frames", None) or getattr(pipeline._segmentation.model, "receptive_field", None)
+        )
+    finally:
+        pipeline.clustering.threshold = umbral_anterior
+    conteo.data = np.minimum(conteo.data, max_hablantes).astype(np.int8)
+    hard_clusters[np.sum(binarizadas.data, axis=1) == 0] = -2
+    discreta = pipeline.reconstruct(segmentaciones, hard_clusters, conteo)
+    diarization = pipeline.to_annotation(discreta, min_duration_on=0.0,
+                                         min_duration_off=pipeline.segmentation.min_duration_off)
+    mapeo = dict(zip(diarization.labels(), pipeline.classes()))
+    diarization = diarization.rename_labels(mapping=mapeo)
+
+    turnos = [{"start_time": round(turn.start, 2), "end_time": round(turn.end, 2), "speaker": speaker}
+              for turn, _, speaker in diarization.itertracks(yield_label=True)]
+    return turnos, {mapeo[k]: centroides[k] for k in mapeo if k < len(centroides)}
+
+def reagrupar(carpeta, umbral=None, num_hablantes=None, min_hablantes=None, max_hablantes=None, pipeline=None):
+    """
+    Recalcula los turnos de una carpeta de resultados con otros parámetros de agrupamiento, a partir del
+    almacén de embeddings (sin volver a correr los modelos de segmentación ni de embeddings), y
+    reescribe `diarization_results.json` y los centroides del almacén. Los parámetros se guardan en
+    `reagrupamiento.json` para que `post_partum.py` los vuelva a aplicar en las siguientes ejecuciones.
+
+    Args:
+        carpeta (str): Carpeta de resultados con `diarization_embeddings.npz`.
+        umbral (float, opcional): Umbral de agrupamiento (por defecto el del pipeline o `UMBRAL_HABLANTES`).
+        num_hablantes (int, opcional): Número exacto de hablantes.
+        min_hablantes (int, opcional): Número mínimo de hablantes.
+        max_hablantes (int, opcional): Número máximo de hablantes.
+        pipeline (Pipeline, opcional): Pipeline de pyannote (modo completo); por defecto el del registro.
+            Solo se usan su agrupamiento y su reconstrucción.
+
+    Returns:
+        list: Turnos nuevos (formato de `diarization_results.json`).
+    """
+    almacen = cargar_almacen(carpeta)
+    if almacen["modo"] == "ventanas":
+        minimo = num_hablantes or min_hablantes or 1
+        maximo = num_hablantes or max_hablantes
+        resultados = _resultados_de_ventanas(almacen)
+        turnos, centroides = unir_ventanas(resultados, UMBRAL_HABLANTES if umbral is None else umbral, minimo, maximo)
+        guardar_almacen_ventanas(carpeta, resultados, centroides)
+    else:
+        if pipeline is None:
+            from funciones.diarizacion import cargar_pipeline_diarizacion
+            pipeline = cargar_pipeline_diarizacion()
+        turnos, centroides = _reagrupar_completo(almacen, pipeline, umbral, num_hablantes, min_hablantes, max_hablantes)
+        hablantes, perfiles = _perfiles(centroides)
+        _guardar(carpeta, **{**almacen, "hablantes": hablantes, "centroides": perfiles})
+
+    # Con VAD los embeddings están en el tiempo del audio condensado; el JSON va en el tiempo original
+    mapa = MapaTiempo.cargar(carpeta)
+    if mapa is not None:
+        turnos = mapa.turnos_a_original(turnos)
+
+    ruta = os.path.join(carpeta, "diarization_results.json")
+    _escribir_json(turnos, ruta)
+    _escribir_json({"umbral": umbral, "num_hablantes": num_hablantes, "min_hablantes": min_hablantes,
+                    "max_hablantes": max_hablantes}, os.path.join(carpeta, REAGRUPAMIENTO))
+    print(f"✅ {len(turnos)} turno(s) de {len({t['speaker'] for t in turnos})} hablante(s) guardados en '{ruta}'")
+    return turnos
+
+def cargar_reagrupamiento(carpeta):
+    """Parámetros del último `reagrupar` de una carpeta de resultados, o None si nunca se re-agrupó."""
+    try:
+        with open(os.path.join(carpeta, REAGRUPAMIENTO), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def perfiles_de_sesiones(carpetas):
+    """
+    Junta en una sola matriz los centroides normalizados de los hablantes de varias sesiones.
+
+    Args:
+        carpetas (list): Carpetas de resultados (se omiten las que no tienen almacén).
+
+    Returns:
+        tuple: (matriz N x D de centroides normalizados, lista de (carpeta, hablante) por fila).
+    """
+    matrices, claves = [], []
+    for carpeta in carpetas:
+        try:
+            almacen = cargar_almacen(carpeta)
+        except (OSError, ValueError, KeyError):
+            continue
+        if len(almacen["hablantes"]) == 0:
+            continue
+        matrices.append(almacen["centroides"].astype(np.float32))
+        claves.extend((carpeta, str(h)) for h in almacen["hablantes"])
+    dimensiones = {m.shape[1] for m in matrices}
+    if len(dimensiones) > 1:
+        raise ValueError(f"Los almacenes tienen embeddings de distinta dimensión: {sorted(dimensiones)}")
+    return (np.concatenate(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)), claves
+
+def buscar_hablante(embedding, carpetas, umbral=UMBRAL_HABLANTES, limite=20):
+    """
+    Busca un hablante (por ejemplo, la misma clínica en todas sus sesiones) comparando su embedding con
+    los centroides de todas las sesiones en una sola multiplicación de matrices.
+
+    Args:
+        embedding (np.ndarray): Embedding del hablante buscado.
+        carpetas (list): Carpetas de resultados donde buscar.
+        umbral (float): Distancia coseno máxima para reportar una coincidencia.
+        limite (int): Número máximo de coincidencias.
+
+    Returns:
+        list: (carpeta, hablante, distancia coseno), de la más parecida a la menos.
+    """
+    matriz, claves = perfiles_de_sesiones(carpetas)
+    if not claves:
+        return []
+    referencia = np.asarray(embedding, dtype=np.float32)
+    distancias = np.clip(1 - matriz @ (referencia / np.linalg.norm(referencia)), 0.0, 2.0)
+    orden = np.argsort(distancias)[:limite]
+    return [(claves[i][0], claves[i][1], round(float(distancias[i]), 4)) for i in orden if distancias[i] < umbral]
+
+def embedding_de_hablante(carpeta, hablante):
+    """Regresa el centroide normalizado de un hablante de una carpeta de resultados."""
+    almacen = cargar_almacen(carpeta)
+    hablantes = [str(h) for h in almacen["hablantes"]]
+    if hablante not in hablantes:
+        raise ValueError(f"'{hablante}' no está en '{carpeta}'. Hablantes: {', '.join(hablantes)}")
+    return almacen["centroides"][hablantes.index(hablante)]
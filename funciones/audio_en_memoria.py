@@ -0,0 +1,68 @@
+import os                 # Para manejo de rutas
+from dataclasses import dataclass  # Para definir el contenedor de audio
+import numpy as np        # Para el buffer de muestras
+import soundfile as sf    # Para guardar el audio como WAV
+
+SAMPLE_RATE = 16000       # Frecuencia de muestreo usada por pyannote y Whisper
+
+@dataclass
+class AudioEnMemoria:
+    """
+    Audio mono en float32 que se pasa entre etapas del pipeline sin escribirse a disco.
+
+    Attributes:
+        datos (np.ndarray): Muestras mono en float32.
+        sample_rate (int): Frecuencia de muestreo (16 kHz por defecto).
+        origen (str): Ruta del archivo del que se decodificó (se usa para nombrar salidas).
+        ruta (str): Ruta en disco si además se guardó como WAV, o None.
+    """
+    datos: np.ndarray
+    sample_rate: int = SAMPLE_RATE
+    origen: str = ""
+    ruta: str = None
+
+    @property
+    def duracion(self):
+        """Duración del audio en segundos."""
+        return len(self.datos) / self.sample_rate
+
+    @property
+    def nombre_base(self):
+        """Nombre del archivo de origen sin carpeta ni extensión."""
+        return os.path.splitext(os.path.basename(self.origen))[0]
+
+    def guardar_wav(self, ruta):
+        """
+        Guarda el audio como WAV PCM_16 y recuerda la ruta.
+
+        Args:
+            ruta (str): Ruta del archivo WAV de salida.
+
+        Returns:
+            str: La misma ruta.
+        """
+        sf.write(ruta, self.datos, self.sample_rate, subtype='PCM_16')
+        self.ruta = ruta
+        return ruta
+
+    def __str__(self):
+        # Al imprimirlo se muestra la ruta en disco si existe, igual que cuando las etapas pasaban rutas
+        if self.ruta:
+            return self.ruta
+        return f"<audio en memoria: {self.nombre_base}, {self.duracion:.1f} s>"
+
+def decodificar_audio(ruta, sample_rate=SAMPLE_RATE):
+    """
+    Decodifica cualquier archivo de audio o video directamente a mono float32 con ffmpeg,
+    leyendo las muestras desde un pipe (sin archivos intermedios ni re-codificación a MP3).
+    Los archivos largos se decodifican por rangos en paralelo (ver `funciones/extraccion_audio.py`).
+
+    Args:
+        ruta (str): Ruta al archivo de audio o video.
+        sample_rate (int): Frecuencia de muestreo de salida.
+
+    Returns:
+        AudioEnMemoria: Audio decodificado.
+    """
+    from funciones.extraccion_audio import extraer_audio  # Importa este módulo (AudioEnMemoria)
+    return extraer_audio(ruta, sample_rate=sample_rate)
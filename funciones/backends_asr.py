@@ -0,0 +1,174 @@
+import os                 # Para rutas y variables de entorno
+import json               # Para los metadatos de cada backend construido
+import time               # Para medir el rendimiento al validar
+from funciones.modelos import obtener_registro, clave_modelo  # Registro de modelos compartido
+
+# Backends de inferencia disponibles para el modelo Whisper en CPU
+BACKENDS_ASR = ("eager", "int8", "onnx", "compile")
+# Backend por defecto
+ASR_BACKEND = os.getenv("ASR_BACKEND", "eager")
+# Carpeta donde se guardan los backends construidos (se construyen una sola vez)
+BACKENDS_ASR_DIR = os.getenv("BACKENDS_ASR_DIR", os.path.join("resultados", ".backends_asr"))
+
+def _carpeta_backend(model_id, revision, backend):
+    nombre = model_id.strip("/").replace("/", "__") + f"@{revision or 'main'}"
+    return os.path.join(BACKENDS_ASR_DIR, nombre, backend)
+
+def _versiones():
+    import torch
+    import transformers
+    return {"torch": torch.__version__, "transformers": transformers.__version__}
+
+def _leer_meta(carpeta):
+    # Un backend solo se reutiliza si se construyó completo y con las mismas versiones
+    try:
+        with open(os.path.join(carpeta, "backend.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("versiones") == _versiones() else None
+
+def _escribir_meta(carpeta, backend, model_id, revision):
+    meta = {"backend": backend, "modelo": model_id, "revision": revision,
+            "versiones": _versiones(), "creado": time.time()}
+    temporal = os.path.join(carpeta, "backend.json.tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4)
+    os.replace(temporal, os.path.join(carpeta, "backend.json"))
+
+def _construir_int8(model_id, revision):
+    """Whisper con las capas Linear cuantizadas dinámicamente a int8 (pesos int8, activaciones float32)."""
+    import torch
+    from transformers import AutoConfig, AutoModelForSpeechSeq2Seq, GenerationConfig
+
+    carpeta = _carpeta_backend(model_id, revision, "int8")
+    ruta = os.path.join(carpeta, "modelo_int8.pt")
+    if _leer_meta(carpeta) is not None and os.path.exists(ruta):
+        # Se crea la estructura sin pesos, se cuantiza igual y se cargan los pesos int8 guardados
+        model = AutoModelForSpeechSeq2Seq.from_config(AutoConfig.from_pretrained(model_id, revision=revision))
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.load_state_dict(torch.load(ruta))
+        model.generation_config = GenerationConfig.from_pretrained(model_id, revision=revision)
+        print(f"♻️ Backend int8 cargado de '{carpeta}'")
+        return model.eval()
+
+    print("🔧 Construyendo backend int8 (cuantización dinámica)...")
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(model_id, revision=revision, torch_dtype=torch.float32)
+    model = torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(carpeta, exist_ok=True)
+    torch.save(model.state_dict(), ruta)
+    _escribir_meta(carpeta, "int8", model_id, revision)
+    print(f"✅ Backend int8 guardado en '{carpeta}'")
+    return model
+
+def _construir_onnx(model_id, revision):
+    """Whisper exportado a ONNX y ejecutado con ONNX Runtime (requiere `optimum[onnxruntime]`)."""
+    try:
+        from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+    except ImportError:
+        raise RuntimeError("El backend 'onnx' requiere optimum con ONNX Runtime: pip install optimum[onnxruntime]")
+
+    carpeta = _carpeta_backend(model_id, revision, "onnx")
+    if _leer_meta(carpeta) is not None:
+        print(f"♻️ Backend ONNX cargado de '{carpeta}'")
+        return ORTModelForSpeechSeq2Seq.from_pretrained(carpeta)
+
+    print("🔧 Exportando el modelo a ONNX (solo la primera vez)...")
+    model = ORTModelForSpeechSeq2Seq.from_pretrained(model_id, revision=revision, export=True)
+    model.save_pretrained(carpeta)
+    _escribir_meta(carpeta, "onnx", model_id, revision)
+    print(f"✅ Backend ONNX guardado en '{carpeta}'")
+    return model
+
+def _construir_compile(model_id, revision):
+    """Whisper con el encoder compilado con torch.compile (siempre recibe 30 s, así que su forma es fija)."""
+    import torch
+    from transformers import AutoModelForSpeechSeq2Seq
+
+    # Los kernels compilados se guardan en disco y se reutilizan en las siguientes ejecuciones
+    carpeta = _carpeta_backend(model_id, revision, "compile")
+    os.makedirs(carpeta, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.abspath(carpeta))
+    if hasattr(torch, "_inductor") and hasattr(torch._inductor.config, "fx_graph_cache"):
+        torch._inductor.config.fx_graph_cache = True
+
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(model_id, revision=revision, torch_dtype=torch.float32).eval()
+    model.model.encoder = torch.compile(model.model.encoder)
+    _escribir_meta(carpeta, "compile", model_id, revision)
+    return model
+
+_CONSTRUCTORES = {"int8": _construir_int8, "onnx": _construir_onnx, "compile": _construir_compile}
+
+def cargar_modelo_backend(backend, model_id, revision=None):
+    """
+    Obtiene el modelo Whisper para un backend optimizado de CPU y su procesador, desde el registro de
+    modelos (se construye o se lee de disco la primera vez).
+
+    Args:
+        backend (str): "int8", "onnx" o "compile".
+        model_id (str): Nombre del modelo en HuggingFace o ruta local.
+        revision (str, opcional): Revisión del modelo.
+
+    Returns:
+        tuple: (modelo, procesador).
+    """
+    if backend not in _CONSTRUCTORES:
+        raise ValueError(f"Backend ASR desconocido '{backend}'. Opciones: {', '.join(BACKENDS_ASR)}")
+
+    def construir():
+        from transformers import AutoProcessor
+        model = _CONSTRUCTORES[backend](model_id, revision)
+        return model, AutoProcessor.from_pretrained(model_id, revision=revision)
+
+    clave = clave_modelo(model_id, revision, "cpu", backend)
+    return obtener_registro().obtener(clave, construir)
+
+def evaluar_backend(backend, segmentos_audio, referencias=None, model_id=None, revision=None, sample_rate=16000):
+    """
+    Transcribe los mismos segmentos con el backend eager y con `backend`, y mide la diferencia con WER
+    (jiwer, igual que en el fine-tuning) y el rendimiento de cada uno.
+
+    Args:
+        backend (str): Backend a evaluar.
+        segmentos_audio (list): Audio (float32, 16 kHz) de cada segmento.
+        referencias (list, opcional): Transcripción de referencia de cada segmento.
+        model_id (str, opcional): Modelo Whisper (por defecto MODEL_PATH).
+        revision (str, opcional): Revisión del modelo.
+        sample_rate (int): Frecuencia de muestreo.
+
+    Returns:
+        dict: WER contra eager y contra las referencias (en %), segundos y aceleración.
+    """
+    from jiwer import wer
+    from funciones.transcripcion import cargar_pipeline_asr, MODEL_PATH
+    from funciones.transcripcion_por_lotes import transcribir_por_lotes
+
+    model_id = model_id or MODEL_PATH
+    audio_s = sum(len(a) for a in segmentos_audio) / sample_rate
+    resultado = {"backend": backend, "modelo": model_id, "segmentos": len(segmentos_audio), "audio_s": round(audio_s, 2)}
+    textos = {}
+    for nombre in ("eager", backend):
+        if nombre in textos:
+            continue
+        asr_pipeline = cargar_pipeline_asr(model_id, revision, backend=nombre)
+        inicio = time.perf_counter()
+        textos[nombre] = transcribir_por_lotes(segmentos_audio, asr_pipeline, sample_rate=sample_rate)
+        segundos = time.perf_counter() - inicio
+        resultado[f"segundos_{nombre}"] = round(segundos, 2)
+        resultado[f"rtf_{nombre}"] = round(segundos / audio_s, 4) if audio_s else None
+
+    # jiwer no acepta referencias vacías; esos segmentos se omiten del WER
+    def wer_pct(referencia, hipotesis):
+        pares = [(r, h) for r, h in zip(referencia, hipotesis) if r.strip()]
+        if not pares:
+            return None
+        return round(wer([r for r, _ in pares], [h for _, h in pares]) * 100, 2)
+
+    resultado["wer_vs_eager"] = wer_pct(textos["eager"], textos[backend])
+    if referencias is not None:
+        referencias = [r.lower() for r in referencias]
+        resultado["wer_eager"] = wer_pct(referencias, textos["eager"])
+        resultado["wer_backend"] = wer_pct(referencias, textos[backend])
+    resultado["aceleracion"] = round(resultado["segundos_eager"] / resultado[f"segundos_{backend}"], 2) \
+        if resultado[f"segundos_{backend}"] else None
+    return resultado
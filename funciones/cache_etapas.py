@@ -0,0 +1,215 @@
+import os                 # Para manejo de rutas y variables de entorno
+import json               # Para los metadatos de cada entrada
+import time               # Para registrar creación y último uso
+import shutil             # Para copiar artefactos y borrar entradas
+import hashlib            # Para las claves por contenido
+import threading          # Para el memo de hashes compartido entre hilos
+
+# Carpeta donde se guardan los artefactos cacheados de cada etapa
+CACHE_ETAPAS_DIR = os.getenv("CACHE_ETAPAS_DIR", os.path.join("resultados", ".cache_etapas"))
+
+# Versión del formato de las claves; cambiarla invalida todo el caché
+VERSION_CACHE = 1
+
+_hashes = {}              # (ruta, tamaño, mtime) -> sha256, para no releer el mismo archivo
+_hashes_lock = threading.Lock()
+
+def hash_archivo(ruta):
+    """
+    Calcula el sha256 del contenido de un archivo (leyendo por bloques).
+
+    Args:
+        ruta (str): Ruta al archivo.
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    info = os.stat(ruta)
+    memo = (os.path.abspath(ruta), info.st_size, info.st_mtime_ns)
+    with _hashes_lock:
+        if memo in _hashes:
+            return _hashes[memo]
+
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    with _hashes_lock:
+        _hashes[memo] = h.hexdigest()
+    return _hashes[memo]
+
+def clave_etapa(etapa, entradas, parametros):
+    """
+    Construye la clave de una etapa a partir de sus entradas y parámetros.
+
+    Las entradas son hashes de contenido o claves de etapas anteriores, así que un cambio en
+    cualquier etapa previa invalida en cadena solo las etapas que dependen de ella.
+
+    Args:
+        etapa (str): Nombre de la etapa.
+        entradas (list): Hashes/claves de las que depende.
+        parametros (dict): Parámetros que afectan el resultado (filtros, modelo, revisión...).
+
+    Returns:
+        str: Clave hexadecimal.
+    """
+    contenido = json.dumps(
+        {"version": VERSION_CACHE, "etapa": etapa, "entradas": list(entradas), "parametros": parametros},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+def _carpeta_entrada(etapa, clave):
+    return os.path.join(CACHE_ETAPAS_DIR, etapa, clave)
+
+def buscar(etapa, clave):
+    """
+    Busca una entrada válida del caché.
+
+    Args:
+        etapa (str): Nombre de la etapa.
+        clave (str): Clave de la etapa (ver `clave_etapa`).
+
+    Returns:
+        dict | None: Rutas de los artefactos ({nombre: ruta}) o None si no hay entrada válida.
+    """
+    carpeta = _carpeta_entrada(etapa, clave)
+    meta_path = os.path.join(carpeta, "entrada.json")
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    artefactos = {nombre: os.path.join(carpeta, nombre) for nombre in meta.get("archivos", [])}
+    if not artefactos or not all(os.path.exists(r) for r in artefactos.values()):
+        return None
+
+    # Actualiza el último uso (lo usa la limpieza LRU)
+    meta["ultimo_uso"] = time.time()
+    _escribir_meta(meta_path, meta)
+    return artefactos
+
+def guardar(etapa, clave, archivos, parametros=None, origen=None):
+    """
+    Guarda artefactos de una etapa en el caché (se copian a la carpeta de la entrada).
+
+    Args:
+        etapa (str): Nombre de la etapa.
+        clave (str): Clave de la etapa.
+        archivos (dict): {nombre en el caché: ruta del archivo a copiar}.
+        parametros (dict, opcional): Parámetros de la etapa (solo informativo, para `listar_entradas`).
+        origen (str, opcional): Archivo de entrada original (solo informativo).
+
+    Returns:
+        dict: Rutas de los artefactos dentro del caché.
+    """
+    carpeta = _carpeta_entrada(etapa, clave)
+    os.makedirs(carpeta, exist_ok=True)
+    artefactos = {}
+    for nombre, ruta in archivos.items():
+        destino = os.path.join(carpeta, nombre)
+        if os.path.abspath(ruta) != os.path.abspath(destino):
+            shutil.copyfile(ruta, destino)
+        artefactos[nombre] = destino
+
+    ahora = time.time()
+    meta = {
+        "etapa": etapa,
+        "clave": clave,
+        "origen": origen,
+        "parametros": parametros or {},
+        "archivos": sorted(archivos),
+        "creado": ahora,
+        "ultimo_uso": ahora,
+    }
+    # Los metadatos se escriben al final: una entrada sin entrada.json no se considera válida
+    _escribir_meta(os.path.join(carpeta, "entrada.json"), meta)
+    return artefactos
+
+def ruta_para_guardar(etapa, clave, nombre):
+    """Regresa la ruta dentro del caché donde se puede escribir directamente un artefacto."""
+    carpeta = _carpeta_entrada(etapa, clave)
+    os.makedirs(carpeta, exist_ok=True)
+    return os.path.join(carpeta, nombre)
+
+def _escribir_meta(meta_path, meta):
+    # Escritura atómica para que una interrupción no deje metadatos a medias
+    temporal = meta_path + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4, default=str)
+    os.replace(temporal, meta_path)
+
+def _tamano_carpeta(carpeta):
+    return sum(
+        os.path.getsize(os.path.join(carpeta, nombre))
+        for nombre in os.listdir(carpeta)
+        if os.path.isfile(os.path.join(carpeta, nombre))
+    )
+
+def listar_entradas():
+    """
+    Lista todas las entradas del caché.
+
+    Returns:
+        list: Por entrada: etapa, clave, origen, tamaño (bytes), creado, último uso, carpeta y si es válida
+            (metadatos legibles y todos sus artefactos presentes).
+    """
+    entradas = []
+    if not os.path.isdir(CACHE_ETAPAS_DIR):
+        return entradas
+    for etapa in sorted(os.listdir(CACHE_ETAPAS_DIR)):
+        carpeta_etapa = os.path.join(CACHE_ETAPAS_DIR, etapa)
+        if not os.path.isdir(carpeta_etapa):
+            continue
+        for clave in sorted(os.listdir(carpeta_etapa)):
+            carpeta = os.path.join(carpeta_etapa, clave)
+            meta = {}
+            try:
+                with open(os.path.join(carpeta, "entrada.json"), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            archivos = meta.get("archivos", [])
+            entradas.append({
+                "etapa": etapa,
+                "clave": clave,
+                "origen": meta.get("origen"),
+                "bytes": _tamano_carpeta(carpeta),
+                "creado": meta.get("creado"),
+                "ultimo_uso": meta.get("ultimo_uso", 0),
+                "carpeta": carpeta,
+                "valida": bool(archivos) and all(os.path.exists(os.path.join(carpeta, a)) for a in archivos),
+            })
+    return entradas
+
+def limpiar(max_dias=None, max_mb=None):
+    """
+    Borra entradas obsoletas del caché.
+
+    Se borran siempre las entradas inválidas (incompletas o sin metadatos); además, las que no se
+    han usado en `max_dias` días y, si el caché sigue pesando más de `max_mb`, las usadas hace más
+    tiempo (LRU) hasta quedar por debajo del límite.
+
+    Args:
+        max_dias (float, opcional): Antigüedad máxima desde el último uso.
+        max_mb (float, opcional): Tamaño máximo del caché en MB.
+
+    Returns:
+        list: Entradas borradas.
+    """
+    entradas = listar_entradas()
+    limite = time.time() - max_dias * 86400 if max_dias is not None else None
+
+    borrar = [e for e in entradas if not e["valida"] or (limite is not None and e["ultimo_uso"] < limite)]
+    restantes = sorted((e for e in entradas if e not in borrar), key=lambda e: e["ultimo_uso"])
+    if max_mb is not None:
+        total = sum(e["bytes"] for e in restantes)
+        while restantes and total > max_mb * 1024 * 1024:
+            entrada = restantes.pop(0)
+            total -= entrada["bytes"]
+            borrar.append(entrada)
+
+    for entrada in borrar:
+        shutil.rmtree(entrada["carpeta"], ignore_errors=True)
+    return borrar
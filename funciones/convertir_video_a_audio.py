@@ -44,3 +44,30 @@ def convertir_video_a_mp3(video_path, output_dir="resultados"):
         # Captura cualquier error de ejecución de ffmpeg e informa al usuario
         print(f"❌ Error al convertir con ffmpeg: {e}")
         return None
+
+def convertir_video_a_wav(video_path, output_dir="resultados", sample_rate=16000):
+    """
+    Extrae el audio de un video directo a WAV PCM_16 mono a 16 kHz (sin pasar por MP3).
+
+    El audio se decodifica con `extraer_audio`: los videos largos se decodifican por rangos con
+    varios procesos de ffmpeg y los errores de ffmpeg se reportan en lugar de ocultarse.
+
+    Args:
+        video_path (str): Ruta al archivo de video de entrada.
+        output_dir (str): Carpeta donde se guardará el archivo WAV.
+        sample_rate (int): Frecuencia de muestreo de salida.
+
+    Returns:
+        str: Ruta al archivo WAV generado, o None si hubo error.
+    """
+    from funciones.extraccion_audio import extraer_audio  # Decodificación por rangos en paralelo
+
+    nombre_base = os.path.splitext(os.path.basename(video_path))[0]
+    wav_path = os.path.join(output_dir, f"{nombre_base}.wav")
+    print(f"🎬 Extrayendo audio del video con ffmpeg: {video_path}")
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        return extraer_audio(video_path, sample_rate=sample_rate).guardar_wav(wav_path)
+    except (RuntimeError, OSError) as e:
+        print(f"❌ Error al extraer el audio con ffmpeg: {e}")
+        return None
@@ -0,0 +1,151 @@
+import os                 # Para manejo de rutas y fsync
+import json               # Para las líneas del diario y el JSON final
+import hashlib            # Para la huella de los segmentos
+
+def huella_segmentos(segmentos, modelo=None, revision=None, backend=None):
+    """
+    Calcula una huella de los segmentos a transcribir (tiempos y hablante), del modelo y de cómo se ejecuta.
+
+    Un diario solo se reanuda si su huella coincide; si cambió la diarización, el planificador, el modelo
+    o el backend, los índices ya no corresponden (o los textos no son comparables) y se empieza de nuevo.
+
+    Args:
+        segmentos (list): Segmentos con "start_time", "end_time" y "speaker".
+        modelo (str, opcional): Modelo ASR usado.
+        revision (str, opcional): Revisión del modelo.
+        backend (str, opcional): Backend de inferencia (ver `funciones/backends_asr.py`).
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    contenido = json.dumps(
+        {
+            "modelo": modelo,
+            "revision": revision,
+            "backend": backend,
+            "segmentos": [[s["start_time"], s["end_time"], s["speaker"]] for s in segmentos],
+        },
+        ensure_ascii=False
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+class DiarioTranscripcion:
+    """
+    Diario JSONL de la transcripción: una línea por segmento terminado.
+
+    La primera línea es un encabezado con la huella de los segmentos y el total; cada línea
+    siguiente es un segmento ya transcrito con su índice. Cada línea se escribe completa y se
+    sincroniza a disco, así que si el proceso se interrumpe (p. ej. lo mata el OOM killer) se
+    pierde como mucho el segmento en curso.
+    """
+
+    def __init__(self, ruta, huella, total):
+        """
+        Args:
+            ruta (str): Ruta del archivo `.jsonl`.
+            huella (str): Huella de los segmentos (ver `huella_segmentos`).
+            total (int): Número de segmentos a transcribir.
+        """
+        self.ruta = ruta
+        self.huella = huella
+        self.total = total
+        self.completados = {}     # índice -> registro del segmento ya transcrito
+        self._archivo = None
+
+    def _leer_existente(self):
+        """
+        Lee un diario previo. Regresa (encabezado, registros, bytes válidos); una última línea
+        incompleta (escritura interrumpida) se ignora y se recorta al reabrir.
+        """
+        encabezado, registros, validos = None, {}, 0
+        with open(self.ruta, "rb") as f:
+            for linea in f:
+                try:
+                    dato = json.loads(linea.decode("utf-8"))
+                except ValueError:
+                    break
+                if not linea.endswith(b"\n"):
+                    break
+                if encabezado is None:
+                    encabezado = dato
+                else:
+                    registros[dato["indice"]] = dato
+                validos += len(linea)
+        return encabezado, registros, validos
+
+    def abrir(self, reanudar=False):
+        """
+        Abre el diario para agregar segmentos.
+
+        Args:
+            reanudar (bool): Si es True y existe un diario con la misma huella, conserva sus segmentos
+                (quedan en `completados`). Si es False o la huella no coincide, lo reinicia.
+
+        Returns:
+            DiarioTranscripcion: El mismo diario.
+        """
+        if reanudar and os.path.exists(self.ruta):
+            encabezado, registros, validos = self._leer_existente()
+            if encabezado is not None and encabezado.get("huella") == self.huella:
+                self.completados = registros
+                self._archivo = open(self.ruta, "r+b")
+                self._archivo.truncate(validos)  # Descarta una última línea a medias
+                self._archivo.seek(validos)
+                print(f"♻️ Reanudando transcripción: {len(registros)}/{self.total} segmento(s) ya en '{self.ruta}'")
+                return self
+            print(f"⚠️ El diario '{self.ruta}' corresponde a otros segmentos o modelo; se empieza de nuevo.")
+
+        self.completados = {}
+        self._archivo = open(self.ruta, "wb")
+        self._escribir({"huella": self.huella, "total": self.total})
+        return self
+
+    def _escribir(self, dato):
+        self._archivo.write((json.dumps(dato, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+    def agregar(self, indice, segmento):
+        """
+        Agrega un segmento terminado al diario.
+
+        Args:
+            indice (int): Índice del segmento en la lista de segmentos.
+            segmento (dict): Segmento con su transcripción.
+        """
+        registro = {"indice": indice, **segmento}
+        self._escribir(registro)
+        self.completados[indice] = registro
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+    def compactar(self, segmentos, ruta_json, borrar_diario=True):
+        """
+        Escribe el JSON final a partir del diario y, si todo salió bien, borra el diario.
+
+        Args:
+            segmentos (list): Segmentos (se les asigna la transcripción del diario).
+            ruta_json (str): Ruta del JSON final (`aligned_transcription.json`).
+            borrar_diario (bool): Borra el `.jsonl` después de escribir el JSON.
+
+        Returns:
+            list: Los segmentos con su transcripción.
+        """
+        self.cerrar()
+        faltantes = [i for i in range(len(segmentos)) if i not in self.completados]
+        if faltantes:
+            raise RuntimeError(f"El diario '{self.ruta}' no tiene {len(faltantes)} segmento(s); no se puede compactar.")
+        for i, segmento in enumerate(segmentos):
+            segmento["transcript"] = self.completados[i]["transcript"]
+
+        # Escritura atómica: el JSON final nunca queda a medias
+        temporal = ruta_json + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(segmentos, f, ensure_ascii=False, indent=4)
+        os.replace(temporal, ruta_json)
+        if borrar_diario:
+            os.remove(self.ruta)
+        return segmentos
@@ -1,43 +1,100 @@
-import torch              # Para detectar y usar GPU si está disponible
 import json               # Para guardar resultados en formato JSON
 import os                 # Para manejo de archivos y variables de entorno
-from dotenv import load_dotenv   # Para cargar variables del archivo .env
-from pyannote.audio import Pipeline  # Modelo de diarización
+import numpy as np        # Para preparar la forma de onda en memoria
+from funciones.entorno import huggingface_token  # Token de HuggingFace (del .env)
+from funciones.audio_en_memoria import AudioEnMemoria  # Audio compartido entre etapas
+from funciones.modelos import obtener_registro, clave_modelo  # Registro de modelos compartido
+from funciones.diarizacion_por_ventanas import diarizar_por_ventanas, DIARIZACION_PROCESOS  # Archivos largos en CPU
+from funciones.almacen_hablantes import guardar_almacen_completo, guardar_almacen_ventanas  # Embeddings reutilizables
 
-# Cargar variables del archivo .env, especialmente el token de HuggingFace
-load_dotenv()
-HUGGINGFACE_TOKEN = os.getenv("HUGGINGFACE_TOKEN", "")
+# torch y pyannote se importan dentro de las funciones: tardan varios segundos y solo los necesita
+# la etapa de diarización (no el mensaje de uso, la validación ni la conversión de video)
 
-def realizar_diarizacion(audio_path, output_dir="."):
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"  # Modelo de diarización en HuggingFace
+
+def cargar_pipeline_diarizacion(model_id=DIARIZATION_MODEL, revision=None):
+    """
+    Obtiene el pipeline de diarización de pyannote desde el registro de modelos del proceso.
+    Solo se construye la primera vez; las siguientes llamadas reutilizan el mismo pipeline.
+    
+    Args:
+        model_id (str): Nombre del pipeline en HuggingFace.
+        revision (str, opcional): Revisión del pipeline.
+    
+    Returns:
+        Pipeline: Pipeline de diarización listo para usarse.
+    """
+    import torch                          # Para detectar y usar GPU si está disponible
+    from pyannote.audio import Pipeline   # Modelo de diarización
+
+    # Selecciona el dispositivo: GPU (cuda) si está disponible, si no CPU
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    def construir():
+        # Inicializa el pipeline de diarización con el modelo preentrenado y tu token de HuggingFace
+        pipeline = Pipeline.from_pretrained(
+            model_id if revision is None else f"{model_id}@{revision}",
+            use_auth_token=huggingface_token()
+        )
+        pipeline.to(device)  # Asigna el pipeline al dispositivo adecuado
+        return pipeline
+
+    clave = clave_modelo(model_id, revision, device, torch.float32)
+    return obtener_registro().obtener(clave, construir)
+
+def realizar_diarizacion(audio_path, output_dir=".", pipeline=None, por_ventanas=False, procesos=None):
     """
     Ejecuta la diarización de hablantes sobre un archivo de audio usando pyannote.
     
     Args:
-        audio_path (str): Ruta al archivo de audio.
+        audio_path (str | AudioEnMemoria): Ruta al archivo de audio, o audio ya decodificado en memoria.
         output_dir (str): Carpeta donde se guardarán los resultados.
+        pipeline (Pipeline, opcional): Pipeline ya cargado (modo por lotes). Si es None, se toma del registro de modelos.
+        por_ventanas (bool): Diariza por ventanas sobrepuestas en varios procesos y une los hablantes con un
+            agrupamiento global (ver `funciones/diarizacion_por_ventanas.py`). Para archivos largos en CPU.
+        procesos (int, opcional): Procesos para `por_ventanas` (por defecto `DIARIZACION_PROCESOS`).
         
     Returns:
         list: Lista de diccionarios con los turnos y hablantes detectados.
     """
     # Mensaje inicial para indicar que comienza la diarización
-    print("🔄 Ejecutando diarización con pyannote/speaker-diarization-3.1...")
+    print(f"🔄 Ejecutando diarización con {DIARIZATION_MODEL}...")
 
     # Convierte la ruta de salida a absoluta y crea el directorio si no existe
     output_dir = os.path.abspath(output_dir)
     os.makedirs(output_dir, exist_ok=True)
 
-    # Selecciona el dispositivo: GPU (cuda) si está disponible, si no CPU
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if por_ventanas:
+        diarization_results, ventanas, centroides = diarizar_por_ventanas(
+            audio_path, procesos=procesos or DIARIZACION_PROCESOS, pipeline=pipeline
+        )
+        _guardar_almacen(guardar_almacen_ventanas, output_dir, ventanas, centroides)
+        return _guardar_resultados(diarization_results, output_dir)
 
-    # Inicializa el pipeline de diarización con el modelo preentrenado y tu token de HuggingFace
-    pipeline = Pipeline.from_pretrained(
-        "pyannote/speaker-diarization-3.1",
-        use_auth_token=HUGGINGFACE_TOKEN
-    )
-    pipeline.to(device)  # Asigna el pipeline al dispositivo adecuado
+    # Reutiliza el pipeline recibido o lo toma del registro de modelos
+    if pipeline is None:
+        pipeline = cargar_pipeline_diarizacion()
 
-    # Ejecuta la diarización sobre el audio
-    diarization = pipeline(audio_path)
+    # Guarda las salidas de segmentación y de embeddings para poder re-agrupar sin volver a correr los modelos
+    capturas = {}
+
+    def capturar(etapa, artefacto, file=None, total=None, completed=None):
+        if completed is None:  # Solo el resultado final de cada etapa (no el avance por lotes)
+            capturas[etapa] = artefacto
+
+    # Ejecuta la diarización sobre el audio (en memoria se pasa la forma de onda sin volver a decodificar)
+    if isinstance(audio_path, AudioEnMemoria):
+        import torch
+        waveform = torch.from_numpy(np.ascontiguousarray(audio_path.datos, dtype=np.float32))[None]
+        entrada = {"waveform": waveform, "sample_rate": audio_path.sample_rate}
+    else:
+        entrada = audio_path
+    diarization, centroides = pipeline(entrada, hook=capturar, return_embeddings=True)
+    if {"segmentation", "speaker_counting", "embeddings"} <= set(capturas):
+        _guardar_almacen(
+            guardar_almacen_completo, output_dir, capturas["segmentation"], capturas["speaker_counting"],
+            capturas["embeddings"], dict(zip(diarization.labels(), centroides))
+        )
     diarization_results = []
 
     # Itera sobre los segmentos detectados y los agrega a la lista de resultados
@@ -48,6 +105,17 @@ def realizar_diarizacion(audio_path, output_dir="."):
             "speaker": speaker                   # Identificador del hablante
         })
 
+    return _guardar_resultados(diarization_results, output_dir)
+
+def _guardar_almacen(guardar, output_dir, *args):
+    # El almacén es opcional: si falla, la diarización sigue siendo válida
+    try:
+        ruta = guardar(output_dir, *args)
+        print(f"🧬 Embeddings de hablantes guardados en '{ruta}'")
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠️ No se pudo guardar el almacén de embeddings: {e}")
+
+def _guardar_resultados(diarization_results, output_dir):
     # Guarda los resultados en un archivo JSON dentro del output_dir
     output_path = os.path.join(output_dir, "diarization_results.json")
     with open(output_path, "w", encoding="utf-8") as f:
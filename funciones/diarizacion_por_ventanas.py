@@ -0,0 +1,244 @@
+import os                 # Para leer la configuración desde variables de entorno
+import multiprocessing    # Para crear los procesos con "spawn" (seguro con torch)
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np        # Para los embeddings y el agrupamiento
+import soundfile as sf    # Para que cada proceso lea solo su ventana del WAV
+from funciones.audio_en_memoria import AudioEnMemoria  # Audio compartido entre etapas
+
+# Duración de cada ventana de diarización y sobreposición entre ventanas consecutivas
+VENTANA_DIARIZACION_S = float(os.getenv("DIARIZACION_VENTANA_S", "600"))
+SOLAPE_DIARIZACION_S = float(os.getenv("DIARIZACION_SOLAPE_S", "30"))
+# Procesos que diarizan ventanas a la vez (cada uno carga su propio pipeline de pyannote)
+DIARIZACION_PROCESOS = int(os.getenv("DIARIZACION_PROCESOS", str(max(1, (os.cpu_count() or 1) // 4))))
+# Distancia coseno máxima entre centroides para considerarlos el mismo hablante (como el umbral de
+# agrupamiento de pyannote/speaker-diarization-3.1)
+UMBRAL_HABLANTES = float(os.getenv("DIARIZACION_UMBRAL_HABLANTES", "0.7"))
+
+def ventanas_de_diarizacion(duracion_s, ventana_s=VENTANA_DIARIZACION_S, solape_s=SOLAPE_DIARIZACION_S):
+    """
+    Divide la duración del audio en ventanas que se sobreponen `solape_s`.
+
+    Returns:
+        list: (inicio, fin) en segundos de cada ventana.
+    """
+    if duracion_s <= ventana_s:
+        return [(0.0, duracion_s)]
+    paso = ventana_s - solape_s
+    ventanas, inicio = [], 0.0
+    while inicio + ventana_s < duracion_s:
+        ventanas.append((inicio, inicio + ventana_s))
+        inicio += paso
+    ventanas.append((inicio, duracion_s))
+    return ventanas
+
+def _iniciar_proceso(hilos):
+    # Reparte los núcleos entre los procesos para que no compitan entre sí
+    import torch
+    torch.set_num_threads(max(1, hilos))
+
+def diarizar_ventana(fuente, inicio_s, fin_s, sample_rate, pipeline=None):
+    """
+    Diariza una ventana y regresa sus turnos (con etiquetas locales) y el embedding centroide de cada
+    hablante local. Se ejecuta dentro de los procesos de trabajo.
+
+    Args:
+        fuente (str | np.ndarray): Ruta del WAV (se lee solo la ventana) o muestras de la ventana.
+        inicio_s (float): Inicio de la ventana en el audio completo.
+        fin_s (float): Fin de la ventana.
+        sample_rate (int): Frecuencia de muestreo.
+        pipeline (Pipeline, opcional): Pipeline de pyannote; por defecto el del registro del proceso.
+
+    Returns:
+        dict: "inicio", "fin", "turnos" [(inicio, fin, etiqueta local)] en tiempo absoluto,
+            "etiquetas" y "centroides" (un embedding por etiqueta local).
+    """
+    import torch
+    from funciones.diarizacion import cargar_pipeline_diarizacion
+
+    if isinstance(fuente, str):
+        datos, sample_rate = sf.read(fuente, start=int(inicio_s * sample_rate), stop=int(fin_s * sample_rate),
+                                     dtype="float32", always_2d=True)
+        datos = datos.mean(axis=1)
+    else:
+        datos = fuente
+    pipeline = pipeline or cargar_pipeline_diarizacion()
+    waveform = torch.from_numpy(np.ascontiguousarray(datos, dtype=np.float32))[None]
+    diarization, embeddings = pipeline({"waveform": waveform, "sample_rate": sample_rate}, return_embeddings=True)
+
+    etiquetas = list(diarization.labels())
+    turnos = [(inicio_s + turn.start, inicio_s + turn.end, speaker)
+              for turn, _, speaker in diarization.itertracks(yield_label=True)]
+    centroides = np.asarray(embeddings, dtype=np.float32)[:len(etiquetas)] if len(etiquetas) else \
+        np.zeros((0, 0), dtype=np.float32)
+    return {"inicio": inicio_s, "fin": fin_s, "turnos": turnos, "etiquetas": etiquetas, "centroides": centroides}
+
+def agrupar_hablantes(centroides, grupos, pesos=None, umbral=UMBRAL_HABLANTES, min_hablantes=1, max_hablantes=None):
+    """
+    Agrupamiento aglomerativo de los centroides de todos los hablantes locales.
+
+    En cada paso se unen los dos grupos con centroides (promedio ponderado de embeddings normalizados)
+    más parecidos, mientras su distancia coseno sea menor que `umbral`. Dos hablantes del mismo
+    `grupo` (la misma ventana) nunca se unen: pyannote ya los separó.
+
+    Args:
+        centroides (np.ndarray): Un embedding por hablante local (N x D). Filas no finitas quedan solas.
+        grupos (list): Grupo (ventana) de cada hablante local.
+        pesos (list, opcional): Peso de cada hablante (p. ej. segundos de habla).
+        umbral (float): Distancia coseno máxima para unir.
+        min_hablantes (int): No se une por debajo de este número de hablantes.
+        max_hablantes (int, opcional): Se sigue uniendo (aunque se pase el umbral) hasta no exceder este número.
+
+    Returns:
+        list: Índice de hablante global de cada hablante local (0..K-1).
+    """
+    n = len(centroides)
+    pesos = np.ones(n) if pesos is None else np.asarray(pesos, dtype=np.float64)
+    validos = np.all(np.isfinite(centroides), axis=1) if n else np.zeros(0, dtype=bool)
+    normas = np.linalg.norm(np.where(validos[:, None], centroides, 0), axis=1, keepdims=True) if n else None
+
+    # Estado por grupo activo: suma ponderada de embeddings, miembros y ventanas que contiene
+    sumas = {i: centroides[i] / normas[i] * max(pesos[i], 1e-3) for i in range(n) if validos[i] and normas[i] > 0}
+    miembros = {i: [i] for i in range(n)}
+    ventanas = {i: {grupos[i]} for i in range(n)}
+
+    while len(sumas) > 1:
+        activos = list(sumas)
+        matriz = np.stack([sumas[i] for i in activos])
+        matriz /= np.linalg.norm(matriz, axis=1, keepdims=True)
+        similitud = matriz @ matriz.T
+        np.fill_diagonal(similitud, -np.inf)
+        for a in range(len(activos)):
+            for b in range(a + 1, len(activos)):
+                if ventanas[activos[a]] & ventanas[activos[b]]:
+                    similitud[a, b] = similitud[b, a] = -np.inf
+        a, b = np.unravel_index(int(np.argmax(similitud)), similitud.shape)
+        if not np.isfinite(similitud[a, b]) or len(sumas) <= min_hablantes:
+            break
+        if 1 - similitud[a, b] >= umbral and (max_hablantes is None or len(sumas) <= max_hablantes):
+            break
+        i, j = activos[a], activos[b]
+        sumas[i] = sumas[i] + sumas.pop(j)
+        miembros[i] += miembros.pop(j)
+        ventanas[i] |= ventanas.pop(j)
+
+    asignacion = [0] * n
+    for k, lista in enumerate(sorted(miembros.values(), key=min)):
+        for i in lista:
+            asignacion[i] = k
+    return asignacion
+
+def unir_ventanas(resultados_ventanas, umbral=UMBRAL_HABLANTES, min_hablantes=1, max_hablantes=None):
+    """
+    Une los resultados de las ventanas en una sola diarización con etiquetas globales.
+
+    Los hablantes locales se agrupan con `agrupar_hablantes` y, en cada sobreposición, cada ventana
+    aporta los turnos de su mitad (el corte es el punto medio del solape). Los turnos consecutivos del
+    mismo hablante que quedan pegados en un corte se unen.
+
+    Args:
+        resultados_ventanas (list): Resultados de `diarizar_ventana`, en orden.
+        umbral (float): Distancia coseno máxima para considerar a dos hablantes el mismo.
+        min_hablantes (int): Número mínimo de hablantes globales.
+        max_hablantes (int, opcional): Número máximo de hablantes globales.
+
+    Returns:
+        tuple: (turnos con "start_time", "end_time" y "speaker" en el formato de `diarization_results.json`,
+            dict con el embedding centroide de cada hablante global).
+    """
+    centroides, grupos, pesos, claves = [], [], [], []
+    for k, r in enumerate(resultados_ventanas):
+        for j, etiqueta in enumerate(r["etiquetas"]):
+            habla = sum(fin - inicio for inicio, fin, e in r["turnos"] if e == etiqueta)
+            centroides.append(r["centroides"][j] if j < len(r["centroides"]) else None)
+            grupos.append(k)
+            pesos.append(habla)
+            claves.append((k, etiqueta))
+    dimension = max((len(c) for c in centroides if c is not None), default=0)
+    matriz = np.array([c if c is not None and len(c) == dimension else np.full(dimension, np.nan)
+                       for c in centroides], dtype=np.float64).reshape(len(centroides), dimension)
+    asignacion = agrupar_hablantes(matriz, grupos, pesos, umbral, min_hablantes, max_hablantes)
+    globales = dict(zip(claves, asignacion))
+
+    # Centroide de cada hablante global: promedio de sus embeddings locales normalizados, ponderado por su habla
+    centroides_globales = {}
+    for hablante in set(asignacion):
+        filas = [i for i, k in enumerate(asignacion) if k == hablante and np.all(np.isfinite(matriz[i]))]
+        if filas:
+            normalizados = matriz[filas] / np.linalg.norm(matriz[filas], axis=1, keepdims=True)
+            centroide = (normalizados * np.maximum(np.asarray(pesos)[filas], 1e-3)[:, None]).sum(axis=0)
+            centroides_globales[f"SPEAKER_{hablante:02d}"] = (centroide / np.linalg.norm(centroide)).astype(np.float32)
+
+    turnos = []
+    for k, r in enumerate(resultados_ventanas):
+        # Límites de la parte de esta ventana: puntos medios de los solapes con sus vecinas
+        desde = (resultados_ventanas[k - 1]["fin"] + r["inicio"]) / 2 if k > 0 else r["inicio"]
+        hasta = (r["fin"] + resultados_ventanas[k + 1]["inicio"]) / 2 if k + 1 < len(resultados_ventanas) else r["fin"]
+        for inicio, fin, etiqueta in r["turnos"]:
+            inicio, fin = max(inicio, desde), min(fin, hasta)
+            if fin > inicio:
+                turnos.append([inicio, fin, globales[(k, etiqueta)]])
+
+    turnos.sort(key=lambda t: (t[0], t[1]))
+    unidos = []
+    for inicio, fin, hablante in turnos:
+        # Un turno partido en el corte entre ventanas vuelve a ser uno solo
+        previo = next((t for t in reversed(unidos[-4:]) if t[2] == hablante), None)
+        if previo is not None and inicio - previo[1] <= 0.01:
+            previo[1] = max(previo[1], fin)
+            continue
+        unidos.append([inicio, fin, hablante])
+
+    turnos = [
+        {"start_time": round(float(inicio), 2), "end_time": round(float(fin), 2), "speaker": f"SPEAKER_{hablante:02d}"}
+        for inicio, fin, hablante in unidos
+    ]
+    return turnos, centroides_globales
+
+def diarizar_por_ventanas(audio, procesos=DIARIZACION_PROCESOS, pipeline=None,
+                          ventana_s=VENTANA_DIARIZACION_S, solape_s=SOLAPE_DIARIZACION_S, umbral=UMBRAL_HABLANTES):
+    """
+    Diariza un audio largo por ventanas sobrepuestas en varios procesos y une los hablantes de todas
+    las ventanas con un agrupamiento global de sus embeddings, para que las etiquetas sean las mismas
+    en todo el archivo.
+
+    Args:
+        audio (str | AudioEnMemoria): WAV preprocesado o audio en memoria.
+        procesos (int): Procesos de trabajo. Con 1 las ventanas se diarizan en este proceso con `pipeline`.
+        pipeline (Pipeline, opcional): Pipeline ya cargado (solo se usa con un proceso).
+        ventana_s (float): Duración de cada ventana.
+        solape_s (float): Sobreposición entre ventanas.
+        umbral (float): Distancia coseno máxima para unir hablantes de ventanas distintas.
+
+    Returns:
+        tuple: (turnos en formato de `diarization_results.json`, resultados por ventana, centroide de cada
+            hablante global).
+    """
+    if isinstance(audio, AudioEnMemoria):
+        sample_rate, duracion = audio.sample_rate, audio.duracion
+        fuente = audio.ruta  # Si ya se guardó el WAV, cada proceso lee su ventana del disco
+    else:
+        info = sf.info(audio)
+        sample_rate, duracion, fuente = info.samplerate, info.duration, audio
+
+    ventanas = ventanas_de_diarizacion(duracion, ventana_s, solape_s)
+
+    def argumentos(inicio, fin):
+        if fuente is not None:
+            return fuente, inicio, fin, sample_rate
+        return audio.datos[int(inicio * sample_rate):int(fin * sample_rate)], inicio, fin, sample_rate
+
+    procesos = max(1, min(procesos, len(ventanas)))
+    print(f"🪟 Diarización por ventanas: {len(ventanas)} ventana(s) de {ventana_s:.0f} s en {procesos} proceso(s)")
+    if procesos == 1:
+        resultados = [diarizar_ventana(*argumentos(inicio, fin), pipeline=pipeline) for inicio, fin in ventanas]
+    else:
+        hilos = max(1, (os.cpu_count() or 1) // procesos)
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_iniciar_proceso, initargs=(hilos,)) as pool:
+            futuros = [pool.submit(diarizar_ventana, *argumentos(inicio, fin)) for inicio, fin in ventanas]
+            resultados = [futuro.result() for futuro in futuros]
+
+    turnos, centroides = unir_ventanas(resultados, umbral)
+    locales = sum(len(r["etiquetas"]) for r in resultados)
+    print(f"🧮 {locales} hablante(s) local(es) agrupados en {len({t['speaker'] for t in turnos})} hablante(s)")
+    return turnos, resultados, centroides
@@ -0,0 +1,165 @@
+import time               # Para medir tiempos de cada etapa
+import queue              # Colas acotadas entre etapas
+import threading          # Un grupo de hilos por etapa
+
+# Marca que indica a los hilos de una etapa que ya no hay más trabajos
+_FIN = object()
+
+class Etapa:
+    """
+    Etapa del pipeline escalonado.
+
+    Attributes:
+        nombre (str): Nombre de la etapa (para el reporte).
+        funcion (callable): Recibe el contexto del trabajo (dict) y lo modifica/regresa.
+        hilos (int): Número de trabajos que la etapa puede procesar al mismo tiempo.
+    """
+
+    def __init__(self, nombre, funcion, hilos=1):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.hilos = max(1, int(hilos))
+        self.ocupado_s = 0.0      # Tiempo total trabajando (sumado entre hilos)
+        self.procesados = 0
+        self._lock = threading.Lock()
+
+    def _registrar(self, segundos):
+        with self._lock:
+            self.ocupado_s += segundos
+            self.procesados += 1
+
+class PipelineEscalonado:
+    """
+    Ejecuta varias etapas en cadena sobre muchos trabajos, traslapando etapas de trabajos distintos.
+
+    Cada etapa tiene su propio grupo de hilos y recibe los trabajos por una cola acotada, así
+    que el archivo N+1 puede estar convirtiéndose o diarizándose mientras el archivo N se
+    transcribe. Las colas acotadas limitan cuántos audios hay en memoria a la vez. Se usan hilos
+    porque el trabajo pesado (ffmpeg, numpy/scipy y torch) libera el GIL.
+
+    Si una etapa lanza una excepción, el trabajo se marca con error y se salta el resto de etapas.
+    """
+
+    def __init__(self, etapas, capacidad_cola=2):
+        """
+        Args:
+            etapas (list): Lista de `Etapa` en el orden en que se ejecutan.
+            capacidad_cola (int): Trabajos que pueden esperar entre una etapa y la siguiente.
+        """
+        self.etapas = etapas
+        self.capacidad_cola = capacidad_cola
+        self.duracion_s = 0.0
+
+    def _trabajador(self, etapa, entrada, salida, terminados, al_terminar):
+        """Bucle de un hilo: toma trabajos de su cola, ejecuta la etapa y los pasa a la siguiente."""
+        while True:
+            contexto = entrada.get()
+            if contexto is _FIN:
+                return
+            if "error" not in contexto:
+                inicio = time.perf_counter()
+                try:
+                    contexto = etapa.funcion(contexto)
+                except Exception as e:
+                    print(f"❌ Error en etapa '{etapa.nombre}' ({contexto.get('archivo')}): {e}")
+                    contexto["error"] = f"{type(e).__name__}: {e}"
+                    contexto["etapa_con_error"] = etapa.nombre
+                segundos = time.perf_counter() - inicio
+                contexto.setdefault("tiempos", {})[etapa.nombre] = round(segundos, 2)
+                etapa._registrar(segundos)
+            # Los trabajos con error (o que completaron la última etapa) pasan a la cola final
+            if "error" in contexto or salida is terminados:
+                if al_terminar is not None:
+                    # Un error del callback no debe matar el hilo: `ejecutar` esperaría a este trabajo para siempre
+                    try:
+                        al_terminar(contexto)
+                    except Exception as e:
+                        print(f"❌ Error al terminar ({contexto.get('archivo')}): {e}")
+                        # El trabajo queda como un resumen de error consistente y suelta sus datos pesados
+                        tiempos = contexto.get("tiempos", {})
+                        resumen = {"archivo": contexto.get("archivo"), "estado": "error",
+                                   "error": f"{type(e).__name__}: {e}", "etapa": "al_terminar",
+                                   "segundos": round(sum(tiempos.values()), 2), "tiempos": tiempos}
+                        contexto.clear()
+                        contexto.update(resumen)
+                terminados.put(contexto)
+            else:
+                salida.put(contexto)
+
+    def ejecutar(self, contextos, al_terminar=None):
+        """
+        Procesa todos los trabajos a través de las etapas.
+
+        Args:
+            contextos (list): Un dict por trabajo; se pasa (y se va completando) de etapa en etapa.
+            al_terminar (callable, opcional): Se llama con el contexto de cada trabajo en cuanto termina
+                (con o sin error), por ejemplo para reportar avance o soltar datos pesados. Si lanza una
+                excepción, el contexto se reemplaza por un resumen con "estado": "error" y "etapa": "al_terminar".
+
+        Returns:
+            list: Los contextos terminados, en el orden original.
+        """
+        inicio = time.perf_counter()
+        colas = [queue.Queue(maxsize=self.capacidad_cola) for _ in self.etapas]
+        terminados = queue.Queue()  # Sin límite para que ninguna etapa se bloquee al terminar
+        colas.append(terminados)
+
+        grupos = []
+        for k, etapa in enumerate(self.etapas):
+            hilos = [
+                threading.Thread(
+                    target=self._trabajador,
+                    args=(etapa, colas[k], colas[k + 1], terminados, al_terminar),
+                    name=f"{etapa.nombre}-{h}",
+                    daemon=True
+                )
+                for h in range(etapa.hilos)
+            ]
+            for hilo in hilos:
+                hilo.start()
+            grupos.append(hilos)
+
+        # Alimenta la primera etapa desde otro hilo (la cola acotada puede bloquear)
+        orden = {id(contexto): i for i, contexto in enumerate(contextos)}
+        def alimentar():
+            for contexto in contextos:
+                colas[0].put(contexto)
+            for _ in range(self.etapas[0].hilos):
+                colas[0].put(_FIN)
+        threading.Thread(target=alimentar, daemon=True).start()
+
+        # Cuando todos los hilos de una etapa terminan, avisa a la siguiente
+        for k, hilos in enumerate(grupos):
+            for hilo in hilos:
+                hilo.join()
+            if k + 1 < len(self.etapas):
+                for _ in range(self.etapas[k + 1].hilos):
+                    colas[k + 1].put(_FIN)
+
+        resultados = []
+        while not terminados.empty():
+            resultados.append(terminados.get())
+        resultados.sort(key=lambda c: orden[id(c)])
+        self.duracion_s = time.perf_counter() - inicio
+        return resultados
+
+    def utilizacion(self):
+        """
+        Regresa la utilización de cada etapa durante la última ejecución.
+
+        Returns:
+            list: Por etapa: nombre, hilos, trabajos procesados, segundos ocupados, segundos promedio
+                por trabajo y utilización (tiempo ocupado / (hilos × duración total)).
+        """
+        reporte = []
+        for etapa in self.etapas:
+            capacidad = etapa.hilos * self.duracion_s
+            reporte.append({
+                "etapa": etapa.nombre,
+                "hilos": etapa.hilos,
+                "procesados": etapa.procesados,
+                "ocupado_s": round(etapa.ocupado_s, 2),
+                "promedio_s": round(etapa.ocupado_s / etapa.procesados, 2) if etapa.procesados else 0.0,
+                "utilizacion": round(etapa.ocupado_s / capacidad, 3) if capacidad else 0.0,
+            })
+        return reporte
@@ -0,0 +1,23 @@
+import os                 # Para leer variables de entorno
+
+_cargado = False
+
+def cargar_entorno():
+    """
+    Carga las variables del archivo `.env` (p. ej. HUGGINGFACE_TOKEN) una sola vez por proceso.
+
+    Se llama al arrancar `post_partum.py`, antes de importar los módulos que leen su configuración
+    de variables de entorno (MODELOS_RAM_MB, ASR_BATCH_SIZE...), y de nuevo (sin costo) antes de
+    usar el token, por si el módulo se usa como librería.
+    """
+    global _cargado
+    if _cargado:
+        return
+    from dotenv import load_dotenv  # Para cargar variables del archivo .env
+    load_dotenv()
+    _cargado = True
+
+def huggingface_token():
+    """Regresa el token de HuggingFace del entorno (o del `.env`)."""
+    cargar_entorno()
+    return os.getenv("HUGGINGFACE_TOKEN", "")
@@ -0,0 +1,189 @@
+import os                 # Para leer la configuración desde variables de entorno
+import subprocess         # Para ejecutar ffmpeg y ffprobe
+import threading          # Para leer stderr en paralelo y limitar procesos de ffmpeg
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np        # Para unir los rangos decodificados
+from funciones.audio_en_memoria import AudioEnMemoria, SAMPLE_RATE
+
+# Procesos de ffmpeg que decodifican rangos de un mismo archivo a la vez
+EXTRACCION_HILOS = int(os.getenv("EXTRACCION_HILOS", str(min(4, os.cpu_count() or 1))))
+# Máximo de procesos de ffmpeg simultáneos en todo el proceso (rangos de todos los archivos)
+EXTRACCION_PROCESOS = int(os.getenv("EXTRACCION_PROCESOS", str(os.cpu_count() or 1)))
+# Duración mínima de cada rango: los archivos más cortos que dos rangos se decodifican con un solo proceso
+RANGO_MIN_S = float(os.getenv("EXTRACCION_RANGO_MIN_S", "600"))
+# Audio extra que se decodifica a cada lado de un rango para alinear la unión con el rango vecino
+MARGEN_S = 1.0
+# Ventana de audio que se compara en cada unión y desfase máximo que se corrige
+VENTANA_ALINEACION_S = 0.25
+MAX_DESFASE_S = 0.05
+
+_procesos = threading.BoundedSemaphore(max(1, EXTRACCION_PROCESOS))
+
+def duracion_de_entrada(ruta):
+    """
+    Duración de un archivo de audio o video según ffprobe (sin decodificarlo).
+
+    Returns:
+        float | None: Duración en segundos, o None si ffprobe no la reporta.
+    """
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", ruta]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return float(result.stdout.decode().strip())
+    except (subprocess.CalledProcessError, ValueError, OSError):
+        return None
+
+class ProgresoExtraccion:
+    """Suma el avance de los procesos de ffmpeg de un archivo e imprime cada 25 %."""
+
+    def __init__(self, nombre, total_s):
+        self.nombre = nombre
+        self.total_s = total_s
+        self.por_rango = {}
+        self.reportado = 0
+        self._lock = threading.Lock()
+
+    def actualizar(self, rango, segundos):
+        if not self.total_s:
+            return
+        with self._lock:
+            self.por_rango[rango] = segundos
+            porcentaje = int(min(100, 100 * sum(self.por_rango.values()) / self.total_s)) // 25 * 25
+            if porcentaje > self.reportado:
+                self.reportado = porcentaje
+                print(f"⏳ Extracción de '{self.nombre}': {porcentaje} %")
+
+def _ffmpeg_rango(ruta, inicio_s, duracion_s, sample_rate, progreso=None, rango=0):
+    """
+    Decodifica un rango de un archivo a mono float32 con un proceso de ffmpeg.
+
+    ffmpeg reporta su avance en stderr (`-progress`); esas líneas se pasan a `progreso` y el resto
+    se conserva como mensajes de error.
+
+    Returns:
+        np.ndarray: Muestras del rango.
+    """
+    command = ["ffmpeg", "-nostdin", "-v", "error", "-nostats", "-progress", "pipe:2"]
+    if inicio_s > 0:
+        command += ["-ss", f"{inicio_s:.6f}"]      # Búsqueda en la entrada (rápida)
+    command += ["-i", ruta]
+    if duracion_s is not None:
+        command += ["-t", f"{duracion_s:.6f}"]
+    command += ["-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "-"]
+
+    errores = []
+
+    def leer_stderr(stream):
+        for linea in stream:
+            linea = linea.decode(errors="replace").strip()
+            clave, _, valor = linea.partition("=")
+            if clave in ("out_time_us", "out_time_ms") and valor.lstrip("-").isdigit():
+                if progreso is not None:
+                    progreso.actualizar(rango, max(0, int(valor)) / 1e6)
+            elif clave in ("progress", "frame", "fps", "bitrate", "total_size", "out_time", "speed",
+                           "dup_frames", "drop_frames") or clave.startswith("stream_"):
+                continue
+            elif linea:
+                errores.append(linea)
+
+    with _procesos:
+        proceso = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        lector = threading.Thread(target=leer_stderr, args=(proceso.stderr,), daemon=True)
+        lector.start()
+        datos = proceso.stdout.read()
+        proceso.wait()
+        lector.join()
+
+    if proceso.returncode != 0:
+        raise RuntimeError(f"ffmpeg no pudo decodificar '{ruta}' desde {inicio_s:.1f} s: {' | '.join(errores[-5:])}")
+    if errores:
+        print(f"⚠️ ffmpeg reportó {len(errores)} mensaje(s) en '{os.path.basename(ruta)}': {errores[0]}")
+    return np.frombuffer(datos, dtype=np.float32)
+
+def _desfase(previo, pos_previo, siguiente, pos_siguiente, sample_rate):
+    """
+    Desfase (en muestras) del rango `siguiente` respecto a su posición esperada, buscando en una
+    ventana de ±MAX_DESFASE_S el punto donde su audio coincide con el final del rango `previo`
+    (correlación normalizada). La búsqueda en la entrada de ffmpeg puede caer unas muestras antes o
+    después del tiempo pedido según el formato; en silencio no hay nada que alinear y se regresa 0.
+    """
+    n = int(VENTANA_ALINEACION_S * sample_rate)
+    d = int(MAX_DESFASE_S * sample_rate)
+    referencia = previo[pos_previo:pos_previo + n].astype(np.float64)
+    if pos_siguiente - d < 0 or len(referencia) < n or pos_siguiente + d + n > len(siguiente):
+        return 0
+    energia_ref = float(np.dot(referencia, referencia))
+    if energia_ref < 1e-8:
+        return 0
+    candidato = siguiente[pos_siguiente - d:pos_siguiente + d + n].astype(np.float64)
+    correlacion = np.correlate(candidato, referencia, mode="valid")
+    acumulada = np.concatenate(([0.0], np.cumsum(candidato ** 2)))
+    energia = acumulada[n:] - acumulada[:-n]
+    similitud = correlacion / np.sqrt(energia * energia_ref + 1e-12)
+    return int(np.argmax(similitud)) - d
+
+def _unir_rangos(piezas, cortes, sample_rate):
+    """
+    Une los rangos decodificados con precisión de muestra.
+
+    Args:
+        piezas (list): (inicio decodificado en s, muestras) de cada rango, incluyendo sus márgenes.
+        cortes (list): Tiempos de unión entre rangos (uno menos que `piezas`).
+
+    Returns:
+        np.ndarray: Audio completo.
+    """
+    partes = []
+    inicio_actual = 0          # Posición, dentro de la pieza actual, de su primera muestra útil
+    for k, (inicio_s, muestras) in enumerate(piezas):
+        if k == len(piezas) - 1:
+            partes.append(muestras[inicio_actual:])
+            break
+        # Fin de la pieza actual: el corte, medido desde su primera muestra útil
+        inicio_util_s = inicio_s if k == 0 else cortes[k - 1]
+        fin = inicio_actual + int(round((cortes[k] - inicio_util_s) * sample_rate))
+        partes.append(muestras[inicio_actual:fin])
+        # Primera muestra útil de la siguiente pieza, corregida con el audio que ambas comparten
+        siguiente_inicio_s, siguiente = piezas[k + 1]
+        esperado = int(round((cortes[k] - siguiente_inicio_s) * sample_rate))
+        inicio_actual = max(0, esperado + _desfase(muestras, fin, siguiente, esperado, sample_rate))
+    return np.concatenate(partes) if len(partes) > 1 else partes[0]
+
+def extraer_audio(ruta, sample_rate=SAMPLE_RATE, hilos=EXTRACCION_HILOS, rango_min_s=RANGO_MIN_S):
+    """
+    Decodifica un archivo de audio o video directo a mono float32 (sin MP3 ni WAV intermedios).
+
+    Los archivos largos se dividen en rangos de tiempo que decodifican varios procesos de ffmpeg a la
+    vez; cada rango se decodifica con un margen extra y las uniones se alinean comparando el audio que
+    comparten, así que el resultado es continuo. El número total de procesos de ffmpeg del programa
+    se limita con `EXTRACCION_PROCESOS`.
+
+    Args:
+        ruta (str): Ruta al archivo.
+        sample_rate (int): Frecuencia de muestreo de salida.
+        hilos (int): Procesos de ffmpeg para este archivo.
+        rango_min_s (float): Duración mínima de cada rango.
+
+    Returns:
+        AudioEnMemoria: Audio decodificado.
+    """
+    duracion = duracion_de_entrada(ruta)
+    progreso = ProgresoExtraccion(os.path.basename(ruta), duracion)
+    n_rangos = min(max(1, hilos), int(duracion // rango_min_s)) if duracion else 1
+    if n_rangos <= 1:
+        datos = _ffmpeg_rango(ruta, 0.0, None, sample_rate, progreso)
+        return AudioEnMemoria(datos=datos, sample_rate=sample_rate, origen=ruta)
+
+    cortes = [duracion * k / n_rangos for k in range(1, n_rangos)]
+    limites = [0.0] + cortes + [None]
+    print(f"🧵 Decodificando '{os.path.basename(ruta)}' en {n_rangos} rangos en paralelo")
+    with ThreadPoolExecutor(max_workers=n_rangos) as pool:
+        futuros = []
+        for k in range(n_rangos):
+            inicio_s = max(0.0, limites[k] - MARGEN_S) if k > 0 else 0.0
+            fin_s = limites[k + 1] + MARGEN_S if limites[k + 1] is not None else None
+            futuros.append((inicio_s, pool.submit(
+                _ffmpeg_rango, ruta, inicio_s, None if fin_s is None else fin_s - inicio_s, sample_rate, progreso, k
+            )))
+        piezas = [(inicio_s, futuro.result()) for inicio_s, futuro in futuros]
+    return AudioEnMemoria(datos=_unir_rangos(piezas, cortes, sample_rate), sample_rate=sample_rate, origen=ruta)
@@ -0,0 +1,176 @@
+import os                 # Para leer la configuración desde variables de entorno
+import sys                # Para usar torch solo si ya está cargado
+import gc                 # Para liberar memoria después de una falta de memoria
+from funciones.instrumentacion import MuestreadorRSS  # Pico de RSS de cada lote
+from funciones.modelos import _rss_bytes  # RSS actual del proceso
+
+# Memoria (MB) que puede usar la transcripción: RAM en CPU o memoria del dispositivo en GPU.
+# 0 = automático (90 % de la memoria disponible al empezar)
+ASR_MEMORIA_MB = int(os.getenv("ASR_MEMORIA_MB", "0"))
+# Ajusta el tamaño de lote según la memoria y la latencia observadas (0 = lote fijo, solo reintenta al faltar memoria)
+ASR_LOTE_ADAPTATIVO = os.getenv("ASR_LOTE_ADAPTATIVO", "1") != "0"
+# Tamaño máximo de lote que puede alcanzar el gobernador
+ASR_BATCH_MAX = int(os.getenv("ASR_BATCH_MAX", "32"))
+# Latencia máxima por lote (s); los lotes más lentos se achican. 0 = sin límite
+ASR_LATENCIA_LOTE_S = float(os.getenv("ASR_LATENCIA_LOTE_S", "0"))
+# Fracción del margen de memoria que se planea usar (el resto cubre segmentos más largos que los medidos)
+FRACCION_SEGURA = 0.8
+# Mejora mínima de rendimiento (audio/s) para seguir creciendo el lote
+MEJORA_MINIMA = 1.05
+
+def es_falta_de_memoria(error):
+    """True si la excepción es una falta de memoria de torch (CPU o GPU)."""
+    if isinstance(error, MemoryError):
+        return True
+    torch = sys.modules.get("torch")
+    if torch is not None and isinstance(error, getattr(torch.cuda, "OutOfMemoryError", ())):
+        return True
+    return isinstance(error, RuntimeError) and "out of memory" in str(error).lower()
+
+def liberar_memoria():
+    """Recolección de basura y liberación de la caché de CUDA (solo se usa tras una falta de memoria)."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+        torch.cuda.ipc_collect()
+
+def _memoria_disponible_bytes():
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for linea in f:
+                if linea.startswith("MemAvailable:"):
+                    return int(linea.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+class _MedicionCuda:
+    """Pico de memoria del allocator de torch durante un lote."""
+
+    def __init__(self, torch, device):
+        self.torch, self.device = torch, device
+        self.inicial = self.pico = 0
+
+    def __enter__(self):
+        self.torch.cuda.reset_peak_memory_stats(self.device)
+        self.inicial = self.torch.cuda.memory_allocated(self.device)
+        return self
+
+    def __exit__(self, *exc):
+        self.pico = self.torch.cuda.max_memory_allocated(self.device)
+
+class GobernadorLotes:
+    """
+    Decide el tamaño de cada lote de la transcripción según la memoria y la latencia observadas.
+
+    Después de cada lote se estima la memoria por segmento (pico del lote menos la memoria base, medida una
+    sola vez antes del primer lote, con el modelo ya cargado) y se calcula cuántos segmentos caben en el
+    presupuesto; el lote crece (al doble) mientras quepa, no se exceda la latencia objetivo y el rendimiento
+    siga mejorando. Si un lote se queda sin memoria, se libera la caché, el lote se reduce a la mitad y se
+    reintenta; ese tamaño ya no se vuelve a intentar. En GPU se mide el allocator de torch; en CPU, el RSS
+    del proceso. El RSS no baja cuando un lote libera sus tensores (el allocator se queda con la memoria),
+    así que medir desde la base y no desde el inicio de cada lote evita subestimar el costo por segmento.
+
+    En CPU el reintento es el último recurso: al agotarse la RAM el sistema suele terminar el proceso (OOM
+    killer) en lugar de lanzar un error que se pueda atrapar, así que el presupuesto es lo que realmente
+    protege la ejecución.
+
+    Args:
+        device: Dispositivo del modelo ("cpu", "cuda:0"...).
+        batch_inicial (int): Tamaño del primer lote.
+        batch_max (int): Tamaño máximo.
+        presupuesto_mb (int): Memoria disponible para la transcripción (0 = automático).
+        latencia_objetivo_s (float): Latencia máxima por lote (0 = sin límite).
+        adaptativo (bool): Si es False el tamaño solo cambia al faltar memoria.
+    """
+
+    def __init__(self, device="cpu", batch_inicial=8, batch_max=ASR_BATCH_MAX, presupuesto_mb=ASR_MEMORIA_MB,
+                 latencia_objetivo_s=ASR_LATENCIA_LOTE_S, adaptativo=ASR_LOTE_ADAPTATIVO):
+        self.device = str(device)
+        self.batch_max = max(1, batch_max if adaptativo else max(batch_max, batch_inicial))
+        self.tamano = max(1, min(batch_inicial, self.batch_max))
+        self.inicial = self.tamano
+        self.latencia_objetivo_s = latencia_objetivo_s
+        self.adaptativo = adaptativo
+        self.techo = self.batch_max        # Baja al primer tamaño que no cupo en memoria
+        self.reintentos = 0
+        self.base = None                   # Memoria antes del primer lote (se mide en el primer `medir`)
+        self._rendimiento = {}             # Tamaño de lote -> mejor audio/s observado
+
+        self._torch = sys.modules.get("torch") if self.device.startswith("cuda") else None
+        if self._torch is not None:
+            total = self._torch.cuda.get_device_properties(self._torch.device(self.device)).total_memory
+        else:
+            total = _rss_bytes() + _memoria_disponible_bytes()
+        self.presupuesto = int(total * 0.9)
+        if presupuesto_mb:
+            # El presupuesto configurado no puede exceder la memoria que realmente hay
+            self.presupuesto = min(presupuesto_mb * 1024 * 1024, self.presupuesto or presupuesto_mb * 1024 * 1024)
+
+    def medir(self):
+        """Context manager que mide la memoria de un lote (usar con `observar`)."""
+        if self._torch is not None:
+            device = self._torch.device(self.device)
+            if self.base is None:
+                self.base = self._torch.cuda.memory_allocated(device)
+            return _MedicionCuda(self._torch, device)
+        if self.base is None:
+            self.base = _rss_bytes()
+        return MuestreadorRSS()
+
+    def observar(self, medicion, segmentos, pared_s, audio_s):
+        """
+        Ajusta el tamaño del siguiente lote con lo medido en un lote exitoso.
+
+        Args:
+            medicion: Resultado de `medir()` (ya cerrado).
+            segmentos (int): Segmentos del lote.
+            pared_s (float): Tiempo de pared del lote.
+            audio_s (float): Segundos de audio del lote.
+        """
+        if not self.adaptativo or segmentos == 0:
+            return
+        base = medicion.inicial if self.base is None else self.base
+        por_segmento = max(medicion.pico - base, 1024 * 1024) / segmentos
+        caben = int(max(0, self.presupuesto - base) * FRACCION_SEGURA / por_segmento)
+        limite = max(1, min(self.techo, caben))
+
+        rendimiento = audio_s / pared_s if pared_s > 0 else 0.0
+        self._rendimiento[segmentos] = max(rendimiento, self._rendimiento.get(segmentos, 0.0))
+        if self.latencia_objetivo_s and pared_s > self.latencia_objetivo_s:
+            # Lote demasiado lento: se reduce en proporción
+            self.tamano = max(1, min(limite, int(segmentos * self.latencia_objetivo_s / pared_s)))
+            return
+        anterior = self._rendimiento.get(segmentos // 2)
+        if anterior and rendimiento < anterior * MEJORA_MINIMA:
+            # Duplicar el lote ya no mejora el rendimiento: no se sigue creciendo
+            self.techo = min(self.techo, segmentos)
+            limite = min(limite, segmentos)
+        crecer = segmentos >= self.tamano  # Solo un lote completo indica si cabe uno más grande
+        self.tamano = max(1, min(limite, self.tamano * 2 if crecer else self.tamano))
+
+    def al_faltar_memoria(self, segmentos):
+        """
+        Reduce el lote tras una falta de memoria con un lote de `segmentos` (> 1). Llamar fuera del bloque
+        `except`, para que el traceback ya no retenga los tensores del lote que falló.
+
+        Returns:
+            int: Nuevo tamaño de lote.
+        """
+        liberar_memoria()
+        self.reintentos += 1
+        self.techo = max(1, min(self.techo, segmentos - 1))
+        self.tamano = max(1, segmentos // 2)
+        print(f"⚠️ Falta de memoria con un lote de {segmentos}; se reintenta con {self.tamano}")
+        return self.tamano
+
+    def resumen(self):
+        return {"lote_inicial": self.inicial, "lote_final": self.tamano, "techo": self.techo,
+                "presupuesto_mb": round(self.presupuesto / 1024 / 1024),
+                "base_mb": round((self.base or 0) / 1024 / 1024), "reintentos_memoria": self.reintentos}
@@ -0,0 +1,205 @@
+import os                 # Para manejo de rutas y variables de entorno
+import json               # Para leer las transcripciones alineadas
+import sqlite3            # Índice del corpus (con búsqueda de texto completo FTS5)
+
+# Base de datos del índice del corpus (todas las carpetas de resultados)
+CORPUS_DB = os.getenv("CORPUS_DB", os.path.join("resultados", "corpus.sqlite"))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS archivos (
+    id INTEGER PRIMARY KEY,
+    carpeta TEXT UNIQUE NOT NULL,
+    nombre TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    segmentos INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segmentos (
+    id INTEGER PRIMARY KEY,
+    archivo_id INTEGER NOT NULL REFERENCES archivos(id) ON DELETE CASCADE,
+    indice INTEGER NOT NULL,
+    inicio REAL NOT NULL,
+    fin REAL NOT NULL,
+    hablante TEXT NOT NULL,
+    texto TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segmentos_hablante ON segmentos (hablante, archivo_id);
+CREATE INDEX IF NOT EXISTS segmentos_tiempo ON segmentos (archivo_id, inicio, fin);
+CREATE VIRTUAL TABLE IF NOT EXISTS segmentos_fts USING fts5(
+    texto, content='segmentos', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS segmentos_ai AFTER INSERT ON segmentos BEGIN
+    INSERT INTO segmentos_fts (rowid, texto) VALUES (new.id, new.texto);
+END;
+CREATE TRIGGER IF NOT EXISTS segmentos_ad AFTER DELETE ON segmentos BEGIN
+    INSERT INTO segmentos_fts (segmentos_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+END;
+"""
+
+def conectar(db=CORPUS_DB):
+    """
+    Abre (y crea si hace falta) la base de datos del índice.
+
+    Args:
+        db (str): Ruta del archivo SQLite.
+
+    Returns:
+        sqlite3.Connection: Conexión con el esquema creado.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+    conexion = sqlite3.connect(db, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    # WAL permite consultar mientras otro proceso/hilo indexa
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA foreign_keys=ON")
+    conexion.executescript(_ESQUEMA)
+    return conexion
+
+def _indexar(conexion, carpeta, segmentos, mtime):
+    carpeta = os.path.abspath(carpeta)
+    conexion.execute("DELETE FROM archivos WHERE carpeta = ?", (carpeta,))
+    cursor = conexion.execute(
+        "INSERT INTO archivos (carpeta, nombre, mtime, segmentos) VALUES (?, ?, ?, ?)",
+        (carpeta, os.path.basename(carpeta), mtime, len(segmentos))
+    )
+    conexion.executemany(
+        "INSERT INTO segmentos (archivo_id, indice, inicio, fin, hablante, texto) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (cursor.lastrowid, i, s["start_time"], s["end_time"], s["speaker"], s.get("transcript", ""))
+            for i, s in enumerate(segmentos)
+        ]
+    )
+
+def indexar_transcripcion(carpeta, segmentos=None, db=CORPUS_DB):
+    """
+    Agrega (o reemplaza) en el índice los segmentos de una carpeta de resultados.
+
+    Args:
+        carpeta (str): Carpeta de resultados con `aligned_transcription.json`.
+        segmentos (list, opcional): Segmentos ya cargados; si es None se leen del JSON.
+        db (str): Ruta del índice.
+
+    Returns:
+        int: Número de segmentos indexados.
+    """
+    ruta = os.path.join(carpeta, "aligned_transcription.json")
+    if segmentos is None:
+        with open(ruta, "r", encoding="utf-8") as f:
+            segmentos = json.load(f)
+    mtime = os.path.getmtime(ruta) if os.path.exists(ruta) else 0.0
+
+    conexion = conectar(db)
+    try:
+        with conexion:  # Una sola transacción: el archivo queda completo o sin cambios
+            _indexar(conexion, carpeta, segmentos, mtime)
+    finally:
+        conexion.close()
+    return len(segmentos)
+
+def reindexar(resultados_dir="resultados", db=CORPUS_DB, forzar=False):
+    """
+    Sincroniza el índice con las carpetas de resultados.
+
+    Solo se vuelven a leer las transcripciones cuya fecha de modificación cambió (o todas si
+    `forzar`), y se quitan del índice las carpetas que ya no existen.
+
+    Args:
+        resultados_dir (str): Carpeta que contiene una subcarpeta por archivo procesado.
+        db (str): Ruta del índice.
+        forzar (bool): Re-indexa todas las transcripciones.
+
+    Returns:
+        dict: Número de carpetas indexadas, sin cambios y eliminadas del índice.
+    """
+    conexion = conectar(db)
+    resumen = {"indexadas": 0, "sin_cambios": 0, "eliminadas": 0}
+    try:
+        indexadas = {r["carpeta"]: r["mtime"] for r in conexion.execute("SELECT carpeta, mtime FROM archivos")}
+        encontradas = set()
+        for nombre in sorted(os.listdir(resultados_dir)) if os.path.isdir(resultados_dir) else []:
+            carpeta = os.path.abspath(os.path.join(resultados_dir, nombre))
+            ruta = os.path.join(carpeta, "aligned_transcription.json")
+            if not os.path.isfile(ruta):
+                continue
+            encontradas.add(carpeta)
+            mtime = os.path.getmtime(ruta)
+            if not forzar and indexadas.get(carpeta) == mtime:
+                resumen["sin_cambios"] += 1
+                continue
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    segmentos = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ No se pudo leer '{ruta}': {e}")
+                continue
+            with conexion:
+                _indexar(conexion, carpeta, segmentos, mtime)
+            resumen["indexadas"] += 1
+
+        with conexion:
+            for carpeta in set(indexadas) - encontradas:
+                conexion.execute("DELETE FROM archivos WHERE carpeta = ?", (carpeta,))
+                resumen["eliminadas"] += 1
+    finally:
+        conexion.close()
+    return resumen
+
+def _consulta_fts(texto):
+    # Cada palabra se busca como término literal (todas deben aparecer); "lact*" busca por prefijo
+    terminos = []
+    for palabra in texto.split():
+        prefijo = palabra.endswith("*")
+        palabra = palabra.rstrip("*").replace('"', '""')
+        if palabra:
+            terminos.append(f'"{palabra}"' + ("*" if prefijo else ""))
+    return " ".join(terminos)
+
+def buscar(texto=None, hablante=None, archivo=None, desde=None, hasta=None, limite=100, db=CORPUS_DB):
+    """
+    Busca segmentos en el índice del corpus.
+
+    Args:
+        texto (str, opcional): Palabras que deben aparecer en la transcripción (sin distinguir acentos
+            ni mayúsculas; "palabra*" busca por prefijo).
+        hablante (str, opcional): Hablante exacto (p. ej. "SPEAKER_01").
+        archivo (str, opcional): Parte del nombre de la carpeta de resultados.
+        desde (float, opcional): Solo segmentos que terminan después de este tiempo (s).
+        hasta (float, opcional): Solo segmentos que empiezan antes de este tiempo (s).
+        limite (int): Número máximo de resultados.
+        db (str): Ruta del índice.
+
+    Returns:
+        list: Por segmento: archivo, carpeta, índice, inicio, fin, hablante y texto.
+    """
+    condiciones, valores = [], []
+    desde_sql = "segmentos s JOIN archivos a ON a.id = s.archivo_id"
+    orden = "a.nombre, s.inicio"
+    if texto:
+        consulta = _consulta_fts(texto)
+        if consulta:
+            desde_sql = "segmentos_fts f JOIN segmentos s ON s.id = f.rowid JOIN archivos a ON a.id = s.archivo_id"
+            condiciones.append("segmentos_fts MATCH ?")
+            valores.append(consulta)
+            orden = "f.rank"
+    if hablante:
+        condiciones.append("s.hablante = ?")
+        valores.append(hablante)
+    if archivo:
+        condiciones.append("a.nombre LIKE ?")
+        valores.append(f"%{archivo}%")
+    if desde is not None:
+        condiciones.append("s.fin > ?")
+        valores.append(desde)
+    if hasta is not None:
+        condiciones.append("s.inicio < ?")
+        valores.append(hasta)
+
+    sql = (
+        f"SELECT a.nombre AS archivo, a.carpeta, s.indice, s.inicio, s.fin, s.hablante, s.texto FROM {desde_sql}"
+        + (" WHERE " + " AND ".join(condiciones) if condiciones else "")
+        + f" ORDER BY {orden} LIMIT ?"
+    )
+    conexion = conectar(db)
+    try:
+        return [dict(r) for r in conexion.execute(sql, valores + [limite])]
+    finally:
+        conexion.close()
@@ -0,0 +1,221 @@
+import os                 # Para rutas y variables de entorno
+import sys                # Para usar torch solo si ya está cargado
+import json               # Para escribir metrics.json
+import time               # Para tiempos de pared y de CPU
+import threading          # Para el muestreo de memoria y el registro compartido
+from contextlib import contextmanager
+import soundfile as sf    # Para la duración de un WAV sin cargarlo
+from funciones.modelos import _rss_bytes  # RSS actual del proceso
+
+try:
+    import resource       # CPU de procesos hijos (ffmpeg); solo existe en Unix
+except ImportError:
+    resource = None
+
+# Intervalo de muestreo del RSS durante una etapa
+INTERVALO_RSS_S = float(os.getenv("METRICAS_INTERVALO_RSS_S", "0.05"))
+
+class MuestreadorRSS:
+    """
+    Hilo que muestrea el RSS del proceso mientras está activo, para obtener el pico de una etapa.
+    El RSS es del proceso completo: en modo por lotes incluye las etapas que corren en paralelo.
+    """
+
+    def __init__(self, intervalo_s=INTERVALO_RSS_S):
+        self.intervalo_s = intervalo_s
+        self.inicial = 0
+        self.pico = 0
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def __enter__(self):
+        self.inicial = self.pico = _rss_bytes()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo_s):
+            self.pico = max(self.pico, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+        self.pico = max(self.pico, _rss_bytes())
+
+def _cpu_hijos_s():
+    if resource is None:
+        return 0.0
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+def _torch_cuda():
+    # No importa torch: si el proceso no lo cargó, no hay memoria de torch que medir
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        return torch
+    return None
+
+def duracion_de_audio(audio):
+    """
+    Duración en segundos de un audio en memoria o de un archivo de audio (sin decodificarlo).
+
+    Args:
+        audio (AudioEnMemoria | str): Audio.
+
+    Returns:
+        float | None: Duración, o None si no se puede leer.
+    """
+    if hasattr(audio, "duracion"):
+        return audio.duracion
+    try:
+        return sf.info(audio).duration
+    except (RuntimeError, TypeError, OSError):
+        return None
+
+class MetricasEjecucion:
+    """
+    Métricas de la ejecución del pipeline sobre un archivo: una entrada por etapa (tiempo de pared,
+    tiempo de CPU, segundos de audio, factor de tiempo real, pico de RSS y memoria de torch) y una por
+    cada lote de la transcripción.
+    """
+
+    def __init__(self, archivo=None):
+        self.archivo = archivo
+        self.audio_s = None       # Duración del audio (se completa cuando se conoce)
+        self.etapas = []
+        self.lotes_asr = []
+        self.vad = None           # Resumen de la detección de voz (si se usó)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nombre, audio_s=None):
+        """
+        Mide un bloque de código como una etapa.
+
+        Args:
+            nombre (str): Nombre de la etapa.
+            audio_s (float, opcional): Segundos de audio que procesa (por defecto, la duración del archivo).
+
+        Yields:
+            dict: Registro de la etapa; se pueden agregar campos (p. ej. "segmentos") dentro del bloque.
+        """
+        registro = {"etapa": nombre, "audio_s": audio_s}
+        torch = _torch_cuda()
+        if torch is not None:
+            torch.cuda.reset_peak_memory_stats()
+        cpu_hijos0 = _cpu_hijos_s()
+        rss = MuestreadorRSS()
+        try:
+            with rss:
+                cpu0, pared0 = time.process_time(), time.perf_counter()
+                try:
+                    yield registro
+                except Exception as e:
+                    registro["error"] = f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    registro["pared_s"] = round(time.perf_counter() - pared0, 3)
+                    registro["cpu_s"] = round(time.process_time() - cpu0, 3)
+                    registro["cpu_hijos_s"] = round(_cpu_hijos_s() - cpu_hijos0, 3)
+        finally:
+            # Se registra también si la etapa falló
+            registro["rss_pico_mb"] = round(rss.pico / 1024 / 1024, 1)
+            registro["rss_delta_mb"] = round((rss.pico - rss.inicial) / 1024 / 1024, 1)
+            if torch is not None:
+                registro["torch_pico_mb"] = round(torch.cuda.max_memory_allocated() / 1024 / 1024, 1)
+                registro["torch_reservada_mb"] = round(torch.cuda.memory_reserved() / 1024 / 1024, 1)
+            with self._lock:
+                self.etapas.append(registro)
+
+    def registrar_lote(self, tipo, segmentos, audio_s, pared_s):
+        """
+        Registra un lote de la transcripción.
+
+        Args:
+            tipo (str): "lote" (una llamada a generate), "chunks" (segmento largo por el pipeline),
+                "bloque" (bloque de la transcripción de forma larga) o "tarea" (tarea de un proceso de transcripción).
+            segmentos (int): Segmentos del lote.
+            audio_s (float): Segundos de audio del lote.
+            pared_s (float): Tiempo de pared del lote.
+        """
+        with self._lock:
+            self.lotes_asr.append({
+                "tipo": tipo,
+                "segmentos": segmentos,
+                "audio_s": round(audio_s, 2),
+                "pared_s": round(pared_s, 3),
+                "rtf": round(pared_s / audio_s, 4) if audio_s else None,
+            })
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Archivo, duración del audio, métricas por etapa (con RTF), por lote de la transcripción y, con
+                VAD, la voz detectada y la aceleración esperada.
+        """
+        etapas = []
+        for registro in self.etapas:
+            registro = dict(registro)
+            if registro["audio_s"] is None:
+                registro["audio_s"] = round(self.audio_s, 2) if self.audio_s else None
+            audio_s = registro["audio_s"]
+            registro["rtf"] = round(registro["pared_s"] / audio_s, 4) if audio_s else None
+            etapas.append(registro)
+        return {
+            "archivo": self.archivo,
+            "audio_s": round(self.audio_s, 2) if self.audio_s else None,
+            "pared_s": round(sum(e["pared_s"] for e in etapas), 3),
+            "etapas": etapas,
+            "lotes_asr": list(self.lotes_asr),
+            **({"vad": self.vad} if self.vad is not None else {}),
+        }
+
+    def guardar(self, carpeta):
+        """
+        Escribe `metrics.json` en la carpeta de resultados.
+
+        Returns:
+            str: Ruta del archivo.
+        """
+        ruta = os.path.join(carpeta, "metrics.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(self.resumen(), f, ensure_ascii=False, indent=4)
+        return ruta
+
+def _etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def escribir_prometheus(resumenes, ruta):
+    """
+    Escribe las métricas por etapa en formato de texto de Prometheus (para el textfile collector de
+    node_exporter). El archivo se reemplaza de forma atómica.
+
+    Args:
+        resumenes (list): Resúmenes de `MetricasEjecucion.resumen()` (uno por archivo).
+        ruta (str): Ruta del archivo `.prom`.
+    """
+    metricas = [
+        ("parra_etapa_segundos", "pared_s", "Tiempo de pared de la etapa"),
+        ("parra_etapa_cpu_segundos", "cpu_s", "Tiempo de CPU del proceso durante la etapa"),
+        ("parra_etapa_audio_segundos", "audio_s", "Segundos de audio procesados por la etapa"),
+        ("parra_etapa_rtf", "rtf", "Factor de tiempo real de la etapa (pared / audio)"),
+        ("parra_etapa_rss_pico_megabytes", "rss_pico_mb", "Pico de RSS del proceso durante la etapa"),
+        ("parra_etapa_torch_pico_megabytes", "torch_pico_mb", "Pico de memoria CUDA de torch durante la etapa"),
+    ]
+    lineas = []
+    for nombre, campo, ayuda in metricas:
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} gauge")
+        for resumen in resumenes:
+            archivo = os.path.basename(resumen["archivo"] or "")
+            for etapa in resumen["etapas"]:
+                if etapa.get(campo) is None:
+                    continue
+                lineas.append(f'{nombre}{{archivo="{_etiqueta(archivo)}",etapa="{_etiqueta(etapa["etapa"])}"}} {etapa[campo]}')
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write("\n".join(lineas) + "\n")
+    os.replace(temporal, ruta)
@@ -0,0 +1,93 @@
+import struct             # Para leer el encabezado RIFF/WAVE
+import numpy as np        # Para mapear las muestras en memoria
+
+class LectorWavMapeado:
+    """
+    Lector de archivos WAV PCM de 16 bits mapeados en memoria (np.memmap).
+
+    Los segmentos se obtienen como vistas int16 sin copia del archivo; solo se convierten a
+    float32 cuando se van a pasar al modelo, así que leer un WAV de varias horas cuesta unos
+    pocos MB de memoria residente en lugar de cargarlo completo.
+    """
+
+    def __init__(self, ruta):
+        """
+        Args:
+            ruta (str): Ruta al archivo WAV (PCM_16, como el `*_processed.wav` del preprocesamiento).
+
+        Raises:
+            ValueError: Si el archivo no es WAV o no es PCM de 16 bits.
+        """
+        self.ruta = ruta
+        offset, n_bytes, canales, sample_rate = self._leer_encabezado(ruta)
+        self.sample_rate = sample_rate
+        self.canales = canales
+        n_frames = n_bytes // (2 * canales)
+        forma = (n_frames,) if canales == 1 else (n_frames, canales)
+        self.muestras = np.memmap(ruta, dtype="<i2", mode="r", offset=offset, shape=forma)
+
+    @staticmethod
+    def _leer_encabezado(ruta):
+        """Recorre los chunks RIFF y regresa (offset de datos, bytes de datos, canales, frecuencia)."""
+        with open(ruta, "rb") as f:
+            riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave != b"WAVE":
+                raise ValueError(f"No es un archivo WAV: {ruta}")
+            formato = None
+            while True:
+                encabezado = f.read(8)
+                if len(encabezado) < 8:
+                    raise ValueError(f"WAV sin chunk de datos: {ruta}")
+                chunk_id, chunk_size = struct.unpack("<4sI", encabezado)
+                if chunk_id == b"fmt ":
+                    formato = struct.unpack("<HHIIHH", f.read(16))
+                    f.seek(chunk_size - 16 + (chunk_size % 2), 1)
+                elif chunk_id == b"data":
+                    if formato is None:
+                        raise ValueError(f"WAV sin chunk de formato: {ruta}")
+                    codec, canales, sample_rate, _, _, bits = formato
+                    # 1 = PCM; 0xFFFE = WAVE_FORMAT_EXTENSIBLE (lo usa soundfile con más de 2 canales)
+                    if codec not in (1, 0xFFFE) or bits != 16:
+                        raise ValueError(f"El WAV no es PCM de 16 bits: {ruta}")
+                    return f.tell(), chunk_size, canales, sample_rate
+                else:
+                    # Los chunks tienen tamaño par; se salta el byte de relleno si lo hay
+                    f.seek(chunk_size + (chunk_size % 2), 1)
+
+    def __len__(self):
+        return self.muestras.shape[0]
+
+    @property
+    def duracion(self):
+        """Duración del audio en segundos."""
+        return len(self) / self.sample_rate
+
+    def segmento(self, inicio_s, fin_s):
+        """
+        Regresa la vista int16 (sin copia) de las muestras entre dos tiempos.
+
+        Args:
+            inicio_s (float): Inicio del segmento en segundos.
+            fin_s (float): Fin del segmento en segundos.
+
+        Returns:
+            np.ndarray: Vista de las muestras int16 del segmento.
+        """
+        return self.muestras[int(inicio_s * self.sample_rate):int(fin_s * self.sample_rate)]
+
+    @staticmethod
+    def a_float32(vista):
+        """
+        Convierte una vista int16 a float32 mono en [-1, 1) (aquí sí se copia).
+
+        Args:
+            vista (np.ndarray): Muestras int16 (mono o multicanal).
+
+        Returns:
+            np.ndarray: Muestras mono en float32.
+        """
+        audio = vista.astype(np.float32) / 32768.0
+        if audio.ndim > 1:
+            # Si es multicanal, lo convierte a mono promediando canales
+            audio = audio.mean(axis=1)
+        return audio
@@ -0,0 +1,168 @@
+import os                 # Para leer la configuración desde variables de entorno
+import sys                # Para consultar si torch ya fue importado
+import gc                 # Para liberar memoria al desalojar modelos
+import threading          # Para proteger el registro cuando se usa desde varios hilos
+from collections import OrderedDict  # Para llevar el orden de uso (LRU)
+
+# Presupuesto de RAM (en MB) para los modelos cargados en el proceso. 0 = sin límite
+MODELOS_RAM_MB = int(os.getenv("MODELOS_RAM_MB", "0"))
+
+def _rss_bytes():
+    """Regresa la memoria residente (RSS) actual del proceso en bytes, o 0 si no se puede medir."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        pass
+    try:
+        # Alternativa en Linux sin psutil
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _bytes_de_parametros(obj, vistos=None):
+    """
+    Estima los bytes que ocupan los pesos de un modelo (torch, pipeline de transformers o de pyannote).
+
+    Args:
+        obj: Modelo, pipeline o tupla de ellos.
+        vistos (set): Ids de objetos ya contados (evita contar dos veces el mismo modelo).
+
+    Returns:
+        int: Bytes estimados (0 si no se reconoce el objeto).
+    """
+    vistos = set() if vistos is None else vistos
+    if obj is None or id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+
+    if isinstance(obj, (tuple, list)):
+        return sum(_bytes_de_parametros(o, vistos) for o in obj)
+
+    # Módulos de torch: suma parámetros y buffers
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        total = 0
+        for tensor in list(obj.parameters()) + list(obj.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
+
+    # Pipeline de transformers (.model) y pipeline de pyannote (._models)
+    total = _bytes_de_parametros(getattr(obj, "model", None), vistos)
+    for modelo in getattr(obj, "_models", {}).values():
+        total += _bytes_de_parametros(modelo, vistos)
+    return total
+
+class RegistroDeModelos:
+    """
+    Registro de modelos compartido por todo el proceso.
+
+    Cada modelo se construye una sola vez por clave (modelo, revisión, dispositivo, dtype) y se
+    reutiliza en llamadas posteriores. Si la suma de los tamaños supera el presupuesto de RAM,
+    se desalojan los modelos usados hace más tiempo (LRU).
+    """
+
+    def __init__(self, presupuesto_mb=MODELOS_RAM_MB):
+        self.presupuesto_mb = presupuesto_mb
+        self._modelos = OrderedDict()   # clave -> (modelo, bytes)
+        self._lock = threading.RLock()
+
+    def obtener(self, clave, constructor):
+        """
+        Regresa el modelo asociado a la clave, construyéndolo si no está en el registro.
+
+        Args:
+            clave (tuple): Identificador del modelo (ver `clave_modelo`).
+            constructor (callable): Función sin argumentos que construye el modelo.
+
+        Returns:
+            Modelo cacheado o recién construido.
+        """
+        with self._lock:
+            if clave in self._modelos:
+                # Marca el modelo como usado recientemente
+                self._modelos.move_to_end(clave)
+                return self._modelos[clave][0]
+
+            print(f"📦 Cargando modelo {clave[0]} (revisión={clave[1]}, dispositivo={clave[2]}, dtype={clave[3]})...")
+            rss_antes = _rss_bytes()
+            modelo = constructor()
+            # Si no se reconocen los pesos, usa el crecimiento del RSS como estimación
+            tamano = _bytes_de_parametros(modelo) or max(_rss_bytes() - rss_antes, 0)
+            self._modelos[clave] = (modelo, tamano)
+            print(f"✅ Modelo cargado (~{tamano / 1024 / 1024:.0f} MB, total en registro: {self.total_mb():.0f} MB)")
+
+            self._desalojar(conservar=clave)
+            return modelo
+
+    def total_mb(self):
+        """Regresa la memoria estimada (MB) de todos los modelos cargados."""
+        with self._lock:
+            return sum(tamano for _, tamano in self._modelos.values()) / 1024 / 1024
+
+    def configurar_presupuesto(self, presupuesto_mb):
+        """Cambia el presupuesto de RAM (MB) y desaloja lo necesario para respetarlo."""
+        with self._lock:
+            self.presupuesto_mb = presupuesto_mb
+            self._desalojar()
+
+    def liberar(self, clave=None):
+        """
+        Libera un modelo del registro, o todos si no se indica clave.
+
+        Args:
+            clave (tuple, opcional): Clave del modelo a liberar.
+        """
+        with self._lock:
+            claves = [clave] if clave is not None else list(self._modelos)
+            for c in claves:
+                if self._modelos.pop(c, None) is not None:
+                    print(f"🪛 Modelo liberado: {c[0]} ({c[2]}, {c[3]})")
+            _liberar_memoria()
+
+    def _desalojar(self, conservar=None):
+        """Desaloja modelos en orden LRU hasta respetar el presupuesto (nunca el de la clave `conservar`)."""
+        if not self.presupuesto_mb:
+            return
+        desalojados = False
+        while self.total_mb() > self.presupuesto_mb:
+            candidatos = [c for c in self._modelos if c != conservar]
+            if not candidatos:
+                print(f"⚠️ El modelo {conservar[0]} por sí solo excede el presupuesto de {self.presupuesto_mb} MB")
+                break
+            # El primero del OrderedDict es el usado hace más tiempo
+            clave = candidatos[0]
+            self._modelos.pop(clave)
+            desalojados = True
+            print(f"♻️ Modelo desalojado por presupuesto de RAM: {clave[0]} ({clave[2]}, {clave[3]})")
+        if desalojados:
+            _liberar_memoria()
+
+def _liberar_memoria():
+    """Fuerza la recolección de basura y libera la caché de CUDA si torch ya está cargado."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+def clave_modelo(model_id, revision=None, device=None, dtype=None):
+    """
+    Construye la clave con la que se guarda un modelo en el registro.
+
+    Args:
+        model_id (str): Nombre del modelo en HuggingFace o ruta local.
+        revision (str, opcional): Revisión/commit del modelo.
+        device: Dispositivo (cpu, cuda...).
+        dtype: Tipo de dato de los pesos.
+
+    Returns:
+        tuple: Clave (model_id, revision, device, dtype) como cadenas.
+    """
+    return (model_id, revision or "main", str(device), str(dtype).replace("torch.", ""))
+
+# Registro único del proceso
+_REGISTRO = RegistroDeModelos()
+
+def obtener_registro():
+    """Regresa el registro de modelos compartido por el proceso."""
+    return _REGISTRO
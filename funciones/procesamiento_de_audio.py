@@ -2,8 +2,12 @@ import numpy as np                    # Para operaciones numéricas
 import soundfile as sf                # Para guardar archivos de audio
 import os                             # Para manejo de rutas y archivos
 import subprocess                     # Para ejecutar comandos del sistema (ffmpeg)
-import librosa                        # Para cargar y procesar archivos de audio
-from scipy.signal import butter, sosfiltfilt   # Para filtros de audio
+from funciones.audio_en_memoria import AudioEnMemoria, decodificar_audio  # Audio compartido entre etapas
+
+# Parámetros del filtro pasa-banda de voz humana usados por el preprocesamiento
+EQ_LOW = 300       # Frecuencia mínima (Hz)
+EQ_HIGH = 3400     # Frecuencia máxima (Hz)
+EQ_ORDEN = 4       # Orden del filtro Butterworth
 
 def convert_mp3_to_wav(mp3_path, wav_path):
     """
@@ -41,25 +45,40 @@ def ecualizar_audio(audio, sr, low=300, high=3400, orden=4):
     Returns:
         np.array: Señal de audio filtrada.
     """
+    from scipy.signal import butter, sosfiltfilt  # Importación diferida: scipy.signal tarda ~1 s en cargar
+
     # Define el filtro pasa-banda usando Butterworth
     sos = butter(N=orden, Wn=[low, high], btype='bandpass', fs=sr, output='sos')
     # Aplica el filtro al audio
     audio_filtrado = sosfiltfilt(sos, audio)
     return audio_filtrado
 
-def procesamiento_de_audio(audio_file, output_dir="."):
+def _ecualizar_y_normalizar(audio_data, sr):
+    """Filtra la banda de voz humana y normaliza al pico; regresa float32."""
+    # Filtra el audio para dejar solo la banda de voz humana (300–3400 Hz)
+    audio_eq = ecualizar_audio(audio_data, sr, low=EQ_LOW, high=EQ_HIGH, orden=EQ_ORDEN)
+
+    # Normaliza el audio para evitar saturación o clipping
+    audio_eq = audio_eq / (np.max(np.abs(audio_eq)) + 1e-8)
+    return audio_eq.astype(np.float32)
+
+def procesamiento_de_audio(audio_file, output_dir=".", en_memoria=False, guardar_wav=True):
     """
     Preprocesa un archivo de audio:
-    - Convierte mp3 a wav si es necesario.
+    - Convierte mp3 a wav si es necesario (o decodifica directo a memoria con ffmpeg).
     - Ecualiza para resaltar voz humana.
     - Normaliza y guarda resultado en wav limpio.
     
     Args:
-        audio_file (str): Ruta al archivo de audio de entrada.
+        audio_file (str | AudioEnMemoria): Ruta al archivo de audio/video de entrada, o audio ya decodificado.
         output_dir (str): Carpeta donde se guardará el resultado.
+        en_memoria (bool): Si es True (o si `audio_file` ya es AudioEnMemoria), decodifica con un pipe de ffmpeg
+            y regresa el audio procesado en memoria en lugar de una ruta.
+        guardar_wav (bool): Si es True, guarda también el WAV procesado (PCM_16) en `output_dir`.
     
     Returns:
-        str: Ruta al archivo wav procesado.
+        str | AudioEnMemoria: Ruta al archivo wav procesado, o el audio procesado en memoria (con `ruta`
+            apuntando al WAV si se guardó).
     """
     print(f"🔄 Procesando: {audio_file}...")
 
@@ -67,6 +86,19 @@ def procesamiento_de_audio(audio_file, output_dir="."):
     output_dir = os.path.abspath(output_dir)
     os.makedirs(output_dir, exist_ok=True)
 
+    if isinstance(audio_file, AudioEnMemoria) or en_memoria:
+        # Decodifica una sola vez, directo a 16 kHz mono float32, sin archivos intermedios
+        audio = audio_file if isinstance(audio_file, AudioEnMemoria) else decodificar_audio(audio_file, sample_rate=16000)
+        audio_eq = _ecualizar_y_normalizar(audio.datos, audio.sample_rate)
+
+        procesado = AudioEnMemoria(datos=audio_eq, sample_rate=audio.sample_rate, origen=audio.origen)
+        if guardar_wav:
+            procesado.guardar_wav(os.path.join(output_dir, f"{procesado.nombre_base}_processed.wav"))
+            print(f"✅ Audio ecualizado y guardado en WAV: '{procesado.ruta}'\n")
+        else:
+            print(f"✅ Audio ecualizado en memoria ({procesado.duracion:.1f} s)\n")
+        return procesado
+
     # Si el archivo es mp3, conviértelo a wav para procesamiento posterior
     if audio_file.lower().endswith(".mp3"):
         wav_file = os.path.join(
@@ -77,14 +109,13 @@ def procesamiento_de_audio(audio_file, output_dir="."):
         if not audio_file or not os.path.exists(audio_file):
             raise ValueError("No se pudo convertir MP3 a WAV")
 
+    import librosa  # Para cargar y re-muestrear (solo en el flujo con archivos intermedios)
+
     # Carga el audio en mono y fuerza la frecuencia a 16 kHz
     audio_data, sr = librosa.load(audio_file, sr=16000, mono=True)
 
-    # Filtra el audio para dejar solo la banda de voz humana (300–3400 Hz)
-    audio_eq = ecualizar_audio(audio_data, sr, low=300, high=3400, orden=4)
-
-    # Normaliza el audio para evitar saturación o clipping
-    audio_eq = audio_eq / (np.max(np.abs(audio_eq)) + 1e-8)
+    # Filtra el audio (300–3400 Hz) y normaliza
+    audio_eq = _ecualizar_y_normalizar(audio_data, sr)
 
     # Genera el nombre de salida y guarda el archivo como WAV (PCM_16)
     nombre_base = os.path.splitext(os.path.basename(audio_file))[0]
@@ -93,3 +124,128 @@ def procesamiento_de_audio(audio_file, output_dir="."):
 
     print(f"✅ Audio convertido y ecualizado a WAV: '{output_path}'\n")
     return output_path
+
+def _leer_bloques_ffmpeg(audio_file, sample_rate, muestras_por_bloque):
+    """
+    Decodifica un archivo de audio/video con ffmpeg y entrega bloques mono float32 de tamaño fijo.
+
+    Args:
+        audio_file (str): Ruta al archivo de entrada.
+        sample_rate (int): Frecuencia de muestreo de salida.
+        muestras_por_bloque (int): Número de muestras por bloque (el último puede ser más corto).
+
+    Yields:
+        np.ndarray: Bloque de muestras float32.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-v", "error",
+        "-i", audio_file,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "f32le", "-"
+    ]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            buf = proc.stdout.read(muestras_por_bloque * 4)
+            if not buf:
+                break
+            # Descarta bytes sueltos si el pipe se corta a mitad de una muestra
+            yield np.frombuffer(buf[:len(buf) - len(buf) % 4], dtype=np.float32)
+    finally:
+        proc.stdout.close()
+        errores = proc.stderr.read().decode(errors="replace").strip()
+        proc.stderr.close()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg no pudo decodificar '{audio_file}': {errores}")
+
+def procesamiento_de_audio_por_bloques(audio_file, output_dir=".", bloque_s=60, fase_cero=True,
+                                       low=EQ_LOW, high=EQ_HIGH, orden=EQ_ORDEN):
+    """
+    Preprocesa un archivo largo por bloques, con memoria constante sin importar su duración:
+    - Decodifica con ffmpeg en bloques de `bloque_s` segundos (16 kHz mono).
+    - Aplica el pasa-banda Butterworth arrastrando el estado del filtro entre bloques. Con
+      `fase_cero=True` se hace una segunda pasada hacia atrás (equivalente a `sosfiltfilt`).
+    - Normaliza al pico global (medido en la pasada anterior) y escribe el WAV PCM_16 por bloques.
+
+    La señal filtrada intermedia vive en un archivo float32 temporal dentro de `output_dir`
+    (4 bytes por muestra) y se borra al terminar.
+
+    Args:
+        audio_file (str): Ruta al archivo de audio o video de entrada.
+        output_dir (str): Carpeta donde se guardará el resultado.
+        bloque_s (float): Duración de cada bloque en segundos.
+        fase_cero (bool): Si es True, filtra hacia adelante y hacia atrás (sin desfase).
+        low (int): Frecuencia mínima (Hz).
+        high (int): Frecuencia máxima (Hz).
+        orden (int): Orden del filtro.
+
+    Returns:
+        str: Ruta al archivo wav procesado.
+    """
+    print(f"🔄 Procesando por bloques de {bloque_s} s: {audio_file}...")
+
+    # Convierte la ruta de salida a absoluta y crea el directorio si no existe
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    sr = 16000
+    n_bloque = int(bloque_s * sr)
+    nombre_base = os.path.splitext(os.path.basename(audio_file))[0]
+    temp_path = os.path.join(output_dir, f".{nombre_base}_filtrado.f32")
+    output_path = os.path.join(output_dir, f"{nombre_base}_processed.wav")
+
+    from scipy.signal import butter, sosfilt, sosfilt_zi
+
+    # Mismo filtro que ecualizar_audio
+    sos = butter(N=orden, Wn=[low, high], btype='bandpass', fs=sr, output='sos')
+    zi_base = sosfilt_zi(sos)
+
+    try:
+        # Pasada 1: filtro hacia adelante con estado arrastrado entre bloques
+        total, pico = 0, 0.0
+        zi = None
+        with open(temp_path, "wb") as f:
+            for bloque in _leer_bloques_ffmpeg(audio_file, sr, n_bloque):
+                if zi is None:
+                    # Arranca el filtro en estado estacionario para evitar el transitorio inicial
+                    zi = zi_base * bloque[0]
+                filtrado, zi = sosfilt(sos, bloque, zi=zi)
+                filtrado = filtrado.astype(np.float32)
+                pico = max(pico, float(np.max(np.abs(filtrado))))
+                f.write(filtrado.tobytes())
+                total += len(filtrado)
+
+        if total == 0:
+            raise ValueError(f"No se pudo decodificar audio de: {audio_file}")
+
+        # Pasada 2 (fase cero): filtro hacia atrás, recorriendo los bloques del final al inicio
+        if fase_cero:
+            pico = 0.0
+            zi = None
+            with open(temp_path, "r+b") as f:
+                for fin in range(total, 0, -n_bloque):
+                    inicio = max(fin - n_bloque, 0)
+                    f.seek(inicio * 4)
+                    bloque = np.fromfile(f, dtype=np.float32, count=fin - inicio)[::-1]
+                    if zi is None:
+                        zi = zi_base * bloque[0]
+                    filtrado, zi = sosfilt(sos, bloque, zi=zi)
+                    filtrado = filtrado[::-1].astype(np.float32)
+                    pico = max(pico, float(np.max(np.abs(filtrado))))
+                    f.seek(inicio * 4)
+                    f.write(filtrado.tobytes())
+
+        # Pasada final: normaliza con el pico global y escribe el WAV (PCM_16) por bloques
+        escala = 1.0 / (pico + 1e-8)
+        with open(temp_path, "rb") as f, sf.SoundFile(output_path, "w", samplerate=sr, channels=1, subtype='PCM_16') as salida:
+            while True:
+                bloque = np.fromfile(f, dtype=np.float32, count=n_bloque)
+                if len(bloque) == 0:
+                    break
+                salida.write(bloque * escala)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    print(f"✅ Audio ecualizado por bloques ({total / sr:.1f} s) y guardado en WAV: '{output_path}'\n")
+    return output_path
@@ -0,0 +1,127 @@
+import numpy as np        # Para el cálculo de energía por frames
+
+# Parámetros por defecto del planificador de segmentos
+DURACION_OBJETIVO_S = 20.0   # Duración máxima al unir turnos del mismo hablante
+DURACION_MINIMA_S = 0.5      # Turnos más cortos se absorben o se descartan
+DURACION_MAXIMA_S = 30.0     # Ventana de Whisper: los turnos más largos se dividen
+MAX_PAUSA_S = 1.0            # Silencio máximo entre turnos que se pueden unir
+FRAME_ENERGIA_S = 0.02       # Tamaño de frame para buscar puntos de baja energía
+
+def _punto_de_corte(muestras, convertir, sample_rate, inicio_s, fin_s):
+    """
+    Busca el instante de menor energía entre dos tiempos (para dividir un turno largo).
+
+    Args:
+        muestras (np.ndarray): Audio completo (o None para cortar en el punto medio).
+        convertir (callable): Convierte un tramo de `muestras` a float32 mono.
+        sample_rate (int): Frecuencia de muestreo.
+        inicio_s (float): Inicio del rango de búsqueda.
+        fin_s (float): Fin del rango de búsqueda.
+
+    Returns:
+        float: Tiempo (s) del corte.
+    """
+    if muestras is None:
+        return (inicio_s + fin_s) / 2
+    frame = max(1, int(FRAME_ENERGIA_S * sample_rate))
+    tramo = convertir(muestras[int(inicio_s * sample_rate):int(fin_s * sample_rate)])
+    n_frames = len(tramo) // frame
+    if n_frames == 0:
+        return (inicio_s + fin_s) / 2
+    # Energía RMS por frame, vectorizada
+    energia = np.sqrt(np.mean(tramo[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    return inicio_s + (int(np.argmin(energia)) + 0.5) * frame / sample_rate
+
+def planificar_segmentos(diarization_results, muestras=None, sample_rate=16000, convertir=None,
+                         duracion_objetivo=DURACION_OBJETIVO_S, duracion_minima=DURACION_MINIMA_S,
+                         duracion_maxima=DURACION_MAXIMA_S, max_pausa=MAX_PAUSA_S):
+    """
+    Convierte los turnos de la diarización en los segmentos que se mandan a Whisper.
+
+    - Une turnos consecutivos del mismo hablante (separados por menos de `max_pausa`) hasta
+      `duracion_objetivo`.
+    - Los turnos más cortos que `duracion_minima` se absorben en un segmento vecino del mismo
+      hablante o, si no hay, se descartan.
+    - Los segmentos de más de `duracion_maxima` se dividen en el punto de menor energía.
+
+    Cada segmento conserva en "turnos" los índices de los turnos originales que cubre, para
+    poder atribuir la transcripción a la diarización original.
+
+    Args:
+        diarization_results (list): Turnos con "start_time", "end_time" y "speaker".
+        muestras (np.ndarray, opcional): Audio completo, para buscar puntos de corte de baja energía.
+        sample_rate (int): Frecuencia de muestreo de `muestras`.
+        convertir (callable, opcional): Convierte un tramo de `muestras` a float32 mono.
+        duracion_objetivo (float): Duración máxima (s) al unir turnos.
+        duracion_minima (float): Duración mínima (s) de un turno.
+        duracion_maxima (float): Duración máxima (s) de un segmento.
+        max_pausa (float): Pausa máxima (s) entre turnos que se unen.
+
+    Returns:
+        tuple: (segmentos planificados, índices de los turnos descartados).
+    """
+    convertir = convertir or (lambda tramo: np.asarray(tramo, dtype=np.float32))
+    orden = sorted(range(len(diarization_results)), key=lambda i: diarization_results[i]["start_time"])
+
+    # 1) Une turnos consecutivos del mismo hablante
+    unidos = []
+    for i in orden:
+        turno = diarization_results[i]
+        previo = unidos[-1] if unidos else None
+        if (previo is not None
+                and previo["speaker"] == turno["speaker"]
+                and turno["start_time"] - previo["end_time"] <= max_pausa
+                and max(turno["end_time"], previo["end_time"]) - previo["start_time"] <= duracion_objetivo):
+            previo["end_time"] = max(previo["end_time"], turno["end_time"])
+            previo["turnos"].append(i)
+        else:
+            unidos.append({
+                "start_time": turno["start_time"],
+                "end_time": turno["end_time"],
+                "speaker": turno["speaker"],
+                "turnos": [i],
+            })
+
+    # 2) Absorbe o descarta los segmentos demasiado cortos
+    descartados = []
+    planificados = []
+    for k, segmento in enumerate(unidos):
+        if segmento["end_time"] - segmento["start_time"] >= duracion_minima:
+            planificados.append(segmento)
+            continue
+        # Busca un vecino cercano del mismo hablante (el anterior ya planificado o el siguiente)
+        anterior = planificados[-1] if planificados else None
+        siguiente = unidos[k + 1] if k + 1 < len(unidos) else None
+        if (anterior is not None and anterior["speaker"] == segmento["speaker"]
+                and segmento["start_time"] - anterior["end_time"] <= max_pausa):
+            anterior["end_time"] = max(anterior["end_time"], segmento["end_time"])
+            anterior["turnos"].extend(segmento["turnos"])
+        elif (siguiente is not None and siguiente["speaker"] == segmento["speaker"]
+                and siguiente["start_time"] - segmento["end_time"] <= max_pausa):
+            siguiente["start_time"] = min(siguiente["start_time"], segmento["start_time"])
+            siguiente["turnos"] = segmento["turnos"] + siguiente["turnos"]
+        else:
+            descartados.extend(segmento["turnos"])
+
+    def pieza(segmento, inicio, fin):
+        # Solo se atribuyen a la pieza los turnos originales que se traslapan con ella
+        turnos = [
+            t for t in segmento["turnos"]
+            if diarization_results[t]["start_time"] < fin and diarization_results[t]["end_time"] > inicio
+        ]
+        return {**segmento, "start_time": round(inicio, 2), "end_time": round(fin, 2),
+                "turnos": turnos or list(segmento["turnos"])}
+
+    # 3) Divide los segmentos largos en puntos de baja energía
+    resultado = []
+    for segmento in planificados:
+        inicio, fin = segmento["start_time"], segmento["end_time"]
+        while fin - inicio > duracion_maxima:
+            # El corte se busca en la segunda mitad de la ventana para no dejar piezas muy cortas
+            corte = _punto_de_corte(muestras, convertir, sample_rate,
+                                    inicio + duracion_maxima / 2, inicio + duracion_maxima)
+            resultado.append(pieza(segmento, inicio, corte))
+            inicio = corte
+        resultado.append(pieza(segmento, inicio, fin))
+
+    return resultado, sorted(descartados)
@@ -0,0 +1,267 @@
+import os                 # Para rutas y el socket Unix
+import json               # Para las peticiones y respuestas
+import time               # Para registrar tiempos de los trabajos
+import uuid               # Para los identificadores de trabajo
+import queue              # Cola de trabajos pendientes
+import socketserver       # Servidor sobre socket Unix
+import threading          # Hilos de trabajo y candado del registro
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Opciones de procesamiento que un cliente puede mandar con un trabajo
+OPCIONES_PERMITIDAS = ("en_memoria", "guardar_wav", "por_bloques", "usar_cache", "planificar", "reanudar", "larga", "ventanas", "vad",
+                       "procesos_asr")
+
+# Trabajos terminados que se conservan en memoria para consultar su estado
+MAX_TRABAJOS_TERMINADOS = 1000
+
+class ServicioTranscripcion:
+    """
+    Cola de trabajos con modelos precargados.
+
+    Los trabajos se procesan con `concurrencia` hilos que comparten los mismos modelos. La función
+    `procesar` recibe (archivo, opciones) y regresa la carpeta de resultados; la provee quien crea el
+    servicio (post_partum.py), así que aquí no se cargan modelos.
+    """
+
+    def __init__(self, procesar, concurrencia=1, validar=None):
+        """
+        Args:
+            procesar (callable): procesar(archivo, **opciones) -> carpeta de resultados.
+            concurrencia (int): Trabajos que se procesan al mismo tiempo.
+            validar (callable, opcional): validar(archivo) lanza ValueError si el archivo no se puede procesar.
+        """
+        self.procesar = procesar
+        self.concurrencia = max(1, int(concurrencia))
+        self.validar = validar
+        self.trabajos = {}        # id -> estado del trabajo
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._hilos = []
+
+    def iniciar(self):
+        for i in range(self.concurrencia):
+            hilo = threading.Thread(target=self._trabajador, name=f"servicio-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self):
+        """Cancela los trabajos en cola y espera a que terminen los que están en proceso."""
+        with self._lock:
+            for trabajo in self.trabajos.values():
+                if trabajo["estado"] == "en_cola":
+                    trabajo.update(estado="cancelado", fin=time.time())
+        for _ in self._hilos:
+            self._cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
+
+    def encolar(self, archivo, opciones=None):
+        """
+        Agrega un trabajo a la cola.
+
+        Args:
+            archivo (str): Ruta al archivo de audio o video (en esta máquina).
+            opciones (dict, opcional): Opciones de procesamiento (ver `OPCIONES_PERMITIDAS`).
+
+        Returns:
+            dict: Estado inicial del trabajo.
+        """
+        opciones = opciones or {}
+        desconocidas = set(opciones) - set(OPCIONES_PERMITIDAS)
+        if desconocidas:
+            raise ValueError(f"Opciones no permitidas: {', '.join(sorted(desconocidas))}")
+        procesos = opciones.get("procesos_asr", 0)
+        if isinstance(procesos, bool) or not isinstance(procesos, int) or procesos < 0:
+            raise ValueError(f"'procesos_asr' debe ser un entero mayor o igual a 0: {procesos!r}")
+        archivo = os.path.abspath(archivo)
+        if not os.path.isfile(archivo):
+            raise ValueError(f"Archivo no encontrado: {archivo}")
+        if self.validar is not None:
+            self.validar(archivo)
+
+        trabajo = {
+            "id": uuid.uuid4().hex[:12],
+            "archivo": archivo,
+            "opciones": opciones,
+            "estado": "en_cola",
+            "creado": time.time(),
+        }
+        with self._lock:
+            self.trabajos[trabajo["id"]] = trabajo
+            self._podar()
+        self._cola.put(trabajo["id"])
+        return dict(trabajo)
+
+    def cancelar(self, id_trabajo):
+        """Cancela un trabajo que todavía está en cola. Regresa su estado, o None si no existe."""
+        with self._lock:
+            trabajo = self.trabajos.get(id_trabajo)
+            if trabajo is not None and trabajo["estado"] == "en_cola":
+                trabajo["estado"] = "cancelado"
+                trabajo["fin"] = time.time()
+            return dict(trabajo) if trabajo is not None else None
+
+    def estado(self, id_trabajo=None):
+        """Regresa el estado de un trabajo (o de todos si `id_trabajo` es None)."""
+        with self._lock:
+            if id_trabajo is None:
+                return [dict(t) for t in self.trabajos.values()]
+            trabajo = self.trabajos.get(id_trabajo)
+            return dict(trabajo) if trabajo is not None else None
+
+    def resumen(self):
+        with self._lock:
+            conteo = {}
+            for t in self.trabajos.values():
+                conteo[t["estado"]] = conteo.get(t["estado"], 0) + 1
+        return {"estado": "ok", "concurrencia": self.concurrencia, "trabajos": conteo}
+
+    def _podar(self):
+        # Olvida los trabajos terminados más antiguos para que el registro no crezca sin límite
+        terminados = [t for t in self.trabajos.values() if t["estado"] in ("terminado", "error", "cancelado")]
+        for t in sorted(terminados, key=lambda t: t["creado"])[:max(0, len(terminados) - MAX_TRABAJOS_TERMINADOS)]:
+            del self.trabajos[t["id"]]
+
+    def _trabajador(self):
+        while True:
+            id_trabajo = self._cola.get()
+            if id_trabajo is None:
+                return
+            with self._lock:
+                trabajo = self.trabajos.get(id_trabajo)
+                if trabajo is None or trabajo["estado"] != "en_cola":
+                    continue  # Cancelado mientras esperaba
+                trabajo["estado"] = "procesando"
+                trabajo["inicio"] = time.time()
+            print(f"\n🧾 Trabajo {id_trabajo}: {trabajo['archivo']}")
+            try:
+                carpeta = self.procesar(trabajo["archivo"], **trabajo["opciones"])
+                actualizacion = {"estado": "terminado", "carpeta": os.path.abspath(carpeta)}
+            except Exception as e:
+                print(f"❌ Trabajo {id_trabajo} con error: {e}")
+                actualizacion = {"estado": "error", "error": f"{type(e).__name__}: {e}"}
+            with self._lock:
+                trabajo.update(actualizacion, fin=time.time())
+                trabajo["segundos"] = round(trabajo["fin"] - trabajo["inicio"], 2)
+
+class _ManejadorHTTP(BaseHTTPRequestHandler):
+    """
+    API del servicio:
+
+    - POST   /trabajos                      {"archivo": "...", "opciones": {...}} -> 202 con el trabajo
+    - GET    /trabajos                      lista de trabajos
+    - GET    /trabajos/<id>                 estado de un trabajo
+    - GET    /trabajos/<id>/transcripcion   aligned_transcription.json del trabajo terminado
+    - DELETE /trabajos/<id>                 cancela un trabajo en cola
+    - GET    /salud                         estado del servicio
+    """
+    servicio = None               # Se asigna al crear el servidor
+    protocol_version = "HTTP/1.1"
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _partes(self):
+        return [p for p in self.path.split("?")[0].split("/") if p]
+
+    def do_GET(self):
+        partes = self._partes()
+        if partes == ["salud"]:
+            return self._responder(200, self.servicio.resumen())
+        if partes == ["trabajos"]:
+            return self._responder(200, self.servicio.estado())
+        if len(partes) in (2, 3) and partes[0] == "trabajos":
+            trabajo = self.servicio.estado(partes[1])
+            if trabajo is None:
+                return self._responder(404, {"error": "Trabajo no encontrado"})
+            if len(partes) == 2:
+                return self._responder(200, trabajo)
+            if partes[2] == "transcripcion":
+                if trabajo["estado"] != "terminado":
+                    return self._responder(409, {"error": f"El trabajo está '{trabajo['estado']}'"})
+                ruta = os.path.join(trabajo["carpeta"], "aligned_transcription.json")
+                try:
+                    with open(ruta, "r", encoding="utf-8") as f:
+                        return self._responder(200, json.load(f))
+                except (OSError, ValueError) as e:
+                    return self._responder(500, {"error": f"No se pudo leer '{ruta}': {e}"})
+        self._responder(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        if self._partes() != ["trabajos"]:
+            return self._responder(404, {"error": "Ruta no encontrada"})
+        try:
+            longitud = int(self.headers.get("Content-Length", "0"))
+            datos = json.loads(self.rfile.read(longitud) or b"{}")
+            if not isinstance(datos, dict) or not isinstance(datos.get("opciones", {}), dict):
+                raise ValueError("Se espera un objeto JSON con 'archivo' y, opcionalmente, 'opciones' (objeto)")
+            trabajo = self.servicio.encolar(datos["archivo"], datos.get("opciones"))
+        except KeyError:
+            return self._responder(400, {"error": "Falta el campo 'archivo'"})
+        except ValueError as e:
+            return self._responder(400, {"error": str(e)})
+        self._responder(202, trabajo)
+
+    def do_DELETE(self):
+        partes = self._partes()
+        if len(partes) != 2 or partes[0] != "trabajos":
+            return self._responder(404, {"error": "Ruta no encontrada"})
+        trabajo = self.servicio.cancelar(partes[1])
+        if trabajo is None:
+            return self._responder(404, {"error": "Trabajo no encontrado"})
+        if trabajo["estado"] != "cancelado":
+            return self._responder(409, {"error": f"El trabajo está '{trabajo['estado']}'", "trabajo": trabajo})
+        self._responder(200, trabajo)
+
+    def address_string(self):
+        # En un socket Unix no hay dirección del cliente
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, formato, *args):
+        print(f"🌐 {self.address_string()} {formato % args}")
+
+class _ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def crear_servidor(servicio, host="127.0.0.1", puerto=8765, socket_unix=None):
+    """
+    Crea el servidor HTTP del servicio, en TCP local o en un socket Unix.
+
+    Args:
+        servicio (ServicioTranscripcion): Servicio con la cola de trabajos.
+        host (str): Interfaz TCP (por defecto solo local).
+        puerto (int): Puerto TCP.
+        socket_unix (str, opcional): Ruta de un socket Unix; si se indica, se usa en lugar de TCP.
+
+    Returns:
+        socketserver.BaseServer: Servidor listo para `serve_forever()`.
+    """
+    manejador = type("ManejadorServicio", (_ManejadorHTTP,), {"servicio": servicio})
+    if socket_unix:
+        if os.path.exists(socket_unix):
+            os.remove(socket_unix)  # Socket de una ejecución anterior
+        servidor = _ServidorUnix(socket_unix, manejador)
+        os.chmod(socket_unix, 0o660)  # Solo el usuario y su grupo pueden mandar trabajos
+        return servidor
+    return ThreadingHTTPServer((host, puerto), manejador)
+
+def ejecutar_servicio(servicio, host="127.0.0.1", puerto=8765, socket_unix=None):
+    """Inicia los hilos de trabajo y atiende peticiones hasta Ctrl+C (termina los trabajos en proceso)."""
+    servidor = crear_servidor(servicio, host, puerto, socket_unix)
+    servicio.iniciar()
+    direccion = f"unix:{socket_unix}" if socket_unix else f"http://{host}:{puerto}"
+    print(f"🟢 Servicio escuchando en {direccion} (concurrencia {servicio.concurrencia})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Deteniendo servicio; esperando los trabajos en proceso...")
+    finally:
+        servidor.server_close()
+        servicio.detener()
+        if socket_unix and os.path.exists(socket_unix):
+            os.remove(socket_unix)
@@ -1,44 +1,85 @@
-import torch                                    # Para manejo de GPU y memoria
-import json                                     # Para guardar resultados como JSON
 import os                                       # Para manejo de rutas y archivos
+import json                                     # Para guardar la transcripción de forma larga
+import sqlite3                                  # Para reportar errores del índice del corpus
 import numpy as np                              # Para operaciones numéricas
 import soundfile as sf                          # Para leer archivos de audio
-import gc                                       # Para liberar memoria durante el proceso
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+from funciones.audio_en_memoria import AudioEnMemoria  # Audio compartido entre etapas
+from funciones.lector_wav import LectorWavMapeado  # Lectura del WAV procesado sin cargarlo completo
+from funciones.diario_transcripcion import DiarioTranscripcion, huella_segmentos  # Salida incremental reanudable
+from funciones.indice_corpus import indexar_transcripcion  # Índice de búsqueda del corpus
+from funciones.segmentacion import planificar_segmentos  # Une micro-turnos y divide turnos largos
+from funciones.modelos import obtener_registro, clave_modelo  # Registro de modelos compartido
+from funciones.backends_asr import cargar_modelo_backend, ASR_BACKEND  # Backends optimizados de CPU
+from funciones.transcripcion_por_lotes import transcribir_por_lotes, ASR_BATCH_SIZE, ASR_MAX_RELLENO
+from funciones.transcripcion_larga import transcripcion_larga  # Audio completo con tiempos por palabra
+from funciones.transcripcion_multiproceso import obtener_transcriptor, ASR_PROCESOS  # Varios procesos de CPU
 
 MODEL_PATH = "RebecaLeyva/whisper-finetuned-parra-v2"  # Ruta o nombre del modelo en HuggingFace
+CHUNK_LENGTH_S = 30       # Duración de los chunks del pipeline para segmentos largos
+STRIDE_LENGTH_S = 5       # Sobreposición entre chunks
 
-def transcripcion_de_audio(audio_path, diarization_results, output_dir="."):
+# torch y transformers se importan dentro de las funciones que cargan el modelo: tardan varios
+# segundos y solo los necesita la etapa de transcripción
+
+def cargar_modelo_asr(model_id=MODEL_PATH, revision=None, dtype=None):
     """
-    Transcribe segmentos de audio (por turnos de hablante) usando un modelo Whisper fine-tuneado.
+    Obtiene el modelo Whisper y su procesador desde el registro de modelos del proceso.
+    Solo se cargan la primera vez para cada (modelo, revisión, dispositivo, dtype).
     
     Args:
-        audio_path (str): Ruta al archivo de audio preprocesado.
-        diarization_results (list): Lista de segmentos/turnos con tiempos y hablantes detectados.
-        output_dir (str): Carpeta donde guardar la transcripción alineada.
+        model_id (str): Nombre del modelo en HuggingFace o ruta local.
+        revision (str, opcional): Revisión del modelo.
+        dtype (torch.dtype, opcional): Tipo de dato de los pesos (por defecto torch.float32).
     
     Returns:
-        list: Lista de segmentos con la transcripción añadida.
+        tuple: (modelo, procesador).
     """
-    print("🔄 Ejecutando transcripción con whisper-finetuned-parra-v2 en español...")
-
-    # Convierte la ruta de salida a absoluta y crea el directorio si no existe
-    output_dir = os.path.abspath(output_dir)
-    os.makedirs(output_dir, exist_ok=True)
+    import torch                                  # Para manejo de GPU y memoria
+    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
 
+    dtype = dtype or torch.float32
     # Selecciona GPU si está disponible, si no CPU
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    # Carga el modelo de transcripción desde HuggingFace (formato seq2seq)
-    model = AutoModelForSpeechSeq2Seq.from_pretrained(
-        MODEL_PATH,
-        torch_dtype=torch.float32,   # Forzar tipo de dato por compatibilidad
-        low_cpu_mem_usage=True       # Para optimizar el uso de memoria
-    ).to(device)
+    def construir():
+        # Carga el modelo de transcripción desde HuggingFace (formato seq2seq)
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            model_id,
+            revision=revision,
+            torch_dtype=dtype,           # Forzar tipo de dato por compatibilidad
+            low_cpu_mem_usage=True       # Para optimizar el uso de memoria
+        ).to(device)
+
+        # Carga el procesador (tokenizer y extractor) asociado al modelo
+        processor = AutoProcessor.from_pretrained(model_id, revision=revision)
+        return model, processor
 
-    # Carga el procesador (tokenizer y extractor) asociado al modelo
-    processor = AutoProcessor.from_pretrained(MODEL_PATH)
+    clave = clave_modelo(model_id, revision, device, dtype)
+    return obtener_registro().obtener(clave, construir)
+
+def cargar_pipeline_asr(model_id=MODEL_PATH, revision=None, backend=ASR_BACKEND):
+    """
+    Construye el pipeline ASR sobre el modelo Whisper cacheado en el registro.
     
+    Args:
+        model_id (str): Nombre del modelo en HuggingFace o ruta local.
+        revision (str, opcional): Revisión del modelo.
+        backend (str): "eager" (PyTorch float32, GPU si hay) o un backend optimizado de CPU: "int8"
+            (cuantización dinámica), "onnx" (ONNX Runtime) o "compile" (torch.compile). Ver `funciones/backends_asr.py`.
+    
+    Returns:
+        Pipeline: Pipeline de transformers para reconocimiento automático de voz.
+    """
+    import torch
+    from transformers import pipeline
+
+    if backend == "eager":
+        model, processor = cargar_modelo_asr(model_id, revision)
+        device = 0 if torch.cuda.is_available() else -1  # Usa GPU si está, si no CPU
+    else:
+        model, processor = cargar_modelo_backend(backend, model_id, revision)
+        device = -1  # Los backends optimizados son para CPU
+
     # Construye el pipeline ASR (Automatic Speech Recognition)
     asr_pipeline = pipeline(
         "automatic-speech-recognition",
@@ -46,53 +87,214 @@ def transcripcion_de_audio(audio_path, diarization_results, output_dir="."):
         tokenizer=processor.tokenizer,
         feature_extractor=processor.feature_extractor,
         return_timestamps=False,     # No regresa timestamps, ya se tiene la segmentación
-        chunk_length_s=30,           # Divide en chunks de 30s para evitar errores de memoria
-        stride_length_s=5,           # Sobreposición de 5s entre chunks
+        chunk_length_s=CHUNK_LENGTH_S,    # Divide en chunks de 30s para evitar errores de memoria
+        stride_length_s=STRIDE_LENGTH_S,  # Sobreposición de 5s entre chunks
         batch_size=2,                # Procesa 2 segmentos por batch
-        device=0 if torch.cuda.is_available() else -1  # Usa GPU si está, si no CPU
+        device=device
     )
+    return asr_pipeline
+
+def nombre_modelo(asr_pipeline, por_defecto=MODEL_PATH):
+    """Regresa el nombre del modelo de un pipeline ASR (también para modelos de ONNX Runtime)."""
+    modelo = asr_pipeline.model
+    return getattr(modelo, "name_or_path", None) or getattr(modelo.config, "_name_or_path", None) or por_defecto
+
+def abrir_audio(audio_path):
+    """
+    Obtiene las muestras del audio preprocesado sin copiarlo cuando es posible.
+
+    Si el audio es un WAV PCM_16 (como el `*_processed.wav`), se mapea en memoria (int16, sin copia)
+    y la conversión a float32 se hace después, solo para lo que se va a usar. El audio en memoria
+    se usa directamente y cualquier otro formato se carga completo en float32.
+
+    Args:
+        audio_path (str | AudioEnMemoria): Audio preprocesado.
 
-    # Carga el audio (puede ser mono o estéreo)
-    audio_data, sample_rate = sf.read(audio_path)
+    Returns:
+        tuple: (muestras, frecuencia de muestreo, función para convertir un tramo a float32 mono o None).
+    """
+    if isinstance(audio_path, AudioEnMemoria):
+        return audio_path.datos, audio_path.sample_rate, None
+
+    try:
+        lector = LectorWavMapeado(audio_path)
+        print(f"🗺️ Audio mapeado en memoria ({lector.duracion:.1f} s, PCM_16)")
+        return lector.muestras, lector.sample_rate, lector.a_float32
+    except ValueError:
+        pass
+
+    # Carga el audio en float32 (puede ser mono o estéreo)
+    audio_data, sample_rate = sf.read(audio_path, dtype="float32")
     if len(audio_data.shape) > 1:
         # Si es multicanal, lo convierte a mono promediando canales
         audio_data = np.mean(audio_data, axis=1)
+    return audio_data, sample_rate, None
+
+def extraer_segmentos(muestras, sample_rate, segmentos):
+    """
+    Recorta el audio de cada segmento (vistas sin copia de `muestras`).
+
+    Args:
+        muestras (np.ndarray): Audio completo (ver `abrir_audio`).
+        sample_rate (int): Frecuencia de muestreo.
+        segmentos (list): Segmentos con "start_time" y "end_time" en segundos.
 
-    transcriptions = []
-    # Procesa cada segmento generado por la diarización
-    for i, segment in enumerate(diarization_results):
+    Returns:
+        list: Audio de cada segmento.
+    """
+    segmentos_audio = []
+    for segment in segmentos:
         # Calcula los índices de inicio y fin en muestras (samples)
         start_sample = int(segment["start_time"] * sample_rate)
         end_sample = int(segment["end_time"] * sample_rate)
-        segment_audio = audio_data[start_sample:end_sample]
+        segmentos_audio.append(muestras[start_sample:end_sample])
+    return segmentos_audio
 
-        if len(segment_audio) == 0:
-            # Si el segmento está vacío, agrega string vacío
-            transcriptions.append("")
-            continue
+def actualizar_indice(output_dir, segmentos=None):
+    """
+    Agrega la transcripción de una carpeta de resultados al índice del corpus. Un error del índice
+    no debe perder la transcripción (ya está en el JSON), así que solo se reporta.
 
-        # Llama al pipeline para obtener la transcripción del segmento
-        result = asr_pipeline(
-            {"raw": segment_audio, "sampling_rate": sample_rate},
-           
-        )
-        transcriptions.append(result["text"].lower())  # Agrega la transcripción en minúsculas
+    Args:
+        output_dir (str): Carpeta con `aligned_transcription.json`.
+        segmentos (list, opcional): Segmentos ya cargados.
+    """
+    try:
+        n = indexar_transcripcion(output_dir, segmentos)
+        print(f"🔎 {n} segmento(s) agregados al índice del corpus")
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"⚠️ No se pudo actualizar el índice del corpus: {e}")
 
-        # Limpia memoria de vez en cuando para evitar saturar la RAM/GPU
-        if i % 3 == 0:
-            gc.collect()
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                torch.cuda.ipc_collect()
+def transcripcion_de_audio(audio_path, diarization_results, output_dir=".", asr_pipeline=None,
+                           model_id=MODEL_PATH, revision=None,
+                           batch_size=ASR_BATCH_SIZE, max_relleno=ASR_MAX_RELLENO,
+                           planificar=True, opciones_planificador=None, reanudar=False,
+                           indexar=True, metricas=None, backend=ASR_BACKEND, larga=False, procesos=ASR_PROCESOS):
+    """
+    Transcribe segmentos de audio (por turnos de hablante) usando un modelo Whisper fine-tuneado.
+    
+    Args:
+        audio_path (str | AudioEnMemoria): Ruta al archivo de audio preprocesado, o audio preprocesado en memoria.
+        diarization_results (list): Lista de segmentos/turnos con tiempos y hablantes detectados.
+        output_dir (str): Carpeta donde guardar la transcripción alineada.
+        asr_pipeline (Pipeline, opcional): Pipeline ASR ya cargado (modo por lotes). Si es None, se construye
+            sobre el modelo del registro compartido.
+        model_id (str): Modelo Whisper a usar cuando no se recibe `asr_pipeline`.
+        revision (str, opcional): Revisión del modelo.
+        batch_size (int): Número máximo de segmentos por llamada a `generate`.
+        max_relleno (float): Relación máxima de relleno (duración rellenada / real) dentro de un lote.
+        planificar (bool): Si es True (por defecto), une turnos cortos/consecutivos del mismo hablante y divide
+            los largos antes de transcribir (ver `planificar_segmentos`). Cada segmento de la salida incluye en
+            "turnos" los índices de los turnos de `diarization_results` que cubre. Si es False, se transcribe
+            cada turno por separado.
+        opciones_planificador (dict, opcional): Parámetros para `planificar_segmentos`.
+        reanudar (bool): Si existe un `aligned_transcription.jsonl` de una ejecución interrumpida con los mismos
+            segmentos y modelo, se saltan los segmentos que ya tiene.
+        indexar (bool): Agrega el resultado al índice del corpus (`resultados/corpus.sqlite`).
+        metricas (MetricasEjecucion, opcional): Registra el tiempo y los segundos de audio de cada lote.
+        backend (str): Backend de inferencia cuando no se recibe `asr_pipeline` (ver `cargar_pipeline_asr`).
+        larga (bool): Transcribe el audio completo una sola vez con tiempos por palabra y asigna las palabras
+            a los turnos (ver `funciones/transcripcion_larga.py`). Cada segmento incluye además "palabras".
+            No usa el planificador ni el diario.
+        procesos (int): Con 2 o más, los segmentos se transcriben en ese número de procesos de CPU, cada uno
+            con su copia del modelo y su parte de los núcleos (ver `funciones/transcripcion_multiproceso.py`).
+            `asr_pipeline` solo se usa para saber el modelo.
+    
+    Returns:
+        list: Lista de segmentos con la transcripción añadida.
+    """
+    print(f"🔄 Ejecutando transcripción con {model_id} en español...")
+
+    # Convierte la ruta de salida a absoluta y crea el directorio si no existe
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    if larga and procesos > 1:
+        print("⚠️ La transcripción de forma larga corre en un solo proceso")
+    multiproceso = procesos > 1 and not larga
 
-    # Asigna la transcripción resultante a cada segmento
-    for i, segment in enumerate(diarization_results):
-        segment["transcript"] = transcriptions[i]
+    # Reutiliza el pipeline recibido o lo construye con el modelo del registro (con varios procesos, cada
+    # proceso carga el suyo)
+    if asr_pipeline is None and not multiproceso:
+        asr_pipeline = cargar_pipeline_asr(model_id, revision, backend=backend)
+
+    # Muestras del audio (mapeadas sin copia cuando es un WAV PCM_16)
+    muestras, sample_rate, convertir = abrir_audio(audio_path)
 
-    # Guarda los resultados alineados (con transcripción y tiempos) en un JSON
     aligned_path = os.path.join(output_dir, "aligned_transcription.json")
-    with open(aligned_path, "w", encoding="utf-8") as f:
-        json.dump(diarization_results, f, ensure_ascii=False, indent=4)
+    if larga:
+        if reanudar:
+            print("⚠️ --reanudar no aplica a la transcripción de forma larga; se transcribe completa")
+        segmentos = transcripcion_larga(muestras, sample_rate, diarization_results, asr_pipeline, convertir, metricas)
+        temporal = aligned_path + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(segmentos, f, ensure_ascii=False, indent=4)
+        os.replace(temporal, aligned_path)
+        if indexar:
+            actualizar_indice(output_dir, segmentos)
+        print(f"✅ Transcripción completada y guardada en '{aligned_path}'.")
+        return segmentos
+
+    # Opcionalmente une micro-turnos y divide turnos largos antes de transcribir
+    segmentos = diarization_results
+    if planificar:
+        segmentos, descartados = planificar_segmentos(
+            diarization_results, muestras, sample_rate, convertir, **(opciones_planificador or {})
+        )
+        print(f"🧩 Segmentos planificados: {len(diarization_results)} turno(s) → {len(segmentos)} segmento(s) "
+              f"({len(descartados)} turno(s) corto(s) sin transcribir)")
+        # Los turnos cortos aislados no se mandan a Whisper, pero se conservan en la salida con "transcript" vacío
+        # y "descartado": True, así ningún turno de la diarización desaparece del resultado
+        segmentos = sorted(
+            segmentos + [{**diarization_results[i], "turnos": [i], "descartado": True} for i in descartados],
+            key=lambda s: s["start_time"]
+        )
+
+    # Vistas de audio de cada segmento (vacías para los turnos descartados, que se completan sin transcribir)
+    segmentos_audio = [audio[:0] if segmento.get("descartado") else audio
+                       for segmento, audio in zip(segmentos, extraer_segmentos(muestras, sample_rate, segmentos))]
+
+    # Cada segmento terminado se agrega al diario JSONL, así una interrupción no pierde lo ya transcrito
+    modelo = nombre_modelo(asr_pipeline, model_id) if asr_pipeline is not None else model_id
+    diario = DiarioTranscripcion(
+        os.path.join(output_dir, "aligned_transcription.jsonl"), huella_segmentos(segmentos, modelo, revision, backend),
+        len(segmentos)
+    ).abrir(reanudar=reanudar)
+
+    def al_completar(indice, texto):
+        diario.agregar(indice, {**segmentos[indice], "transcript": texto})
+
+    # Transcribe los segmentos en lotes agrupados por duración
+    try:
+        if multiproceso:
+            obtener_transcriptor(modelo, revision, backend, procesos).transcribir(
+                segmentos_audio,
+                sample_rate=sample_rate,
+                convertir=convertir,
+                omitir=set(diario.completados),
+                al_completar=al_completar,
+                metricas=metricas,
+                max_relleno=max_relleno
+            )
+        else:
+            transcribir_por_lotes(
+                segmentos_audio,
+                asr_pipeline,
+                sample_rate=sample_rate,
+                batch_size=batch_size,
+                max_relleno=max_relleno,
+                convertir=convertir,
+                omitir=set(diario.completados),
+                al_completar=al_completar,
+                metricas=metricas
+            )
+    finally:
+        diario.cerrar()
+
+    # Compacta el diario en el JSON final (con transcripción y tiempos)
+    diario.compactar(segmentos, aligned_path)
+    if indexar:
+        actualizar_indice(output_dir, segmentos)
 
     print(f"✅ Transcripción completada y guardada en '{aligned_path}'.")
-    return diarization_results
+    return segmentos
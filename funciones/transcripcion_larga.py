@@ -0,0 +1,165 @@
+import os                 # Para leer la configuración desde variables de entorno
+import time               # Para medir cada bloque
+import numpy as np        # Para el índice de intervalos de los turnos
+from funciones.segmentacion import _punto_de_corte  # Corte en el punto de menor energía
+
+# Duración de cada bloque de audio que se pasa completo al pipeline (limita la memoria en float32)
+BLOQUE_LARGO_S = float(os.getenv("TRANSCRIPCION_LARGA_BLOQUE_S", "600"))
+# Margen al final de cada bloque en el que se busca el punto de menor energía para cortar
+MARGEN_CORTE_S = 5.0
+# Distancia máxima (s) entre una palabra fuera de todo turno y el turno más cercano para asignársela
+MAX_DISTANCIA_S = 1.0
+
+def _bloques(muestras, convertir, sample_rate, bloque_s=BLOQUE_LARGO_S):
+    """Divide el audio en bloques de ~`bloque_s` cortando en silencios. Regresa [(inicio_s, fin_s)]."""
+    duracion = len(muestras) / sample_rate
+    bloques, inicio = [], 0.0
+    while duracion - inicio > bloque_s:
+        fin = _punto_de_corte(muestras, convertir, sample_rate, inicio + bloque_s - MARGEN_CORTE_S, inicio + bloque_s)
+        bloques.append((inicio, fin))
+        inicio = fin
+    if duracion > inicio:
+        bloques.append((inicio, duracion))
+    return bloques
+
+def transcribir_palabras(muestras, sample_rate, asr_pipeline, convertir=None, metricas=None, bloque_s=BLOQUE_LARGO_S):
+    """
+    Transcribe el audio completo en modo de forma larga (chunks de 30 s con sobreposición) y regresa
+    cada palabra con sus tiempos.
+
+    El audio se pasa al pipeline por bloques de ~10 min cortados en silencios, para no convertir
+    horas de audio a float32 de una vez. Si el modelo no tiene `alignment_heads` (necesarios para los
+    tiempos por palabra), se usan los tiempos por frase de Whisper.
+
+    Args:
+        muestras (np.ndarray): Audio completo (ver `abrir_audio`).
+        sample_rate (int): Frecuencia de muestreo.
+        asr_pipeline (Pipeline): Pipeline ASR.
+        convertir (callable, opcional): Convierte un tramo de `muestras` a float32 mono.
+        metricas (MetricasEjecucion, opcional): Registra el tiempo y los segundos de audio de cada bloque.
+        bloque_s (float): Duración aproximada de cada bloque.
+
+    Returns:
+        list: Tuplas (texto, inicio, fin) en segundos desde el inicio del audio.
+    """
+    convertir = convertir or (lambda audio: audio)
+    timestamps = "word"
+    palabras = []
+    bloques = _bloques(muestras, convertir, sample_rate, bloque_s)
+    print(f"📜 Transcripción de forma larga: {len(bloques)} bloque(s) de hasta {bloque_s:.0f} s")
+    for inicio_s, fin_s in bloques:
+        audio = convertir(muestras[int(inicio_s * sample_rate):int(fin_s * sample_rate)])
+        inicio = time.perf_counter()
+        try:
+            result = asr_pipeline({"raw": audio, "sampling_rate": sample_rate}, return_timestamps=timestamps)
+        except ValueError as e:
+            if timestamps != "word":
+                raise
+            print(f"⚠️ Sin tiempos por palabra ({e}); se usan los tiempos por frase")
+            timestamps = True
+            result = asr_pipeline({"raw": audio, "sampling_rate": sample_rate}, return_timestamps=timestamps)
+        if metricas is not None:
+            metricas.registrar_lote("bloque", 1, fin_s - inicio_s, time.perf_counter() - inicio)
+
+        for chunk in result.get("chunks", []):
+            texto = chunk["text"].strip().lower()
+            if not texto:
+                continue
+            a, b = chunk["timestamp"]
+            a = inicio_s + (a or 0.0)
+            # La última palabra de un bloque puede no tener tiempo de fin
+            b = min(inicio_s + b, fin_s) if b is not None else fin_s
+            palabras.append((texto, a, max(a, b)))
+    return palabras
+
+def asignar_palabras(palabras, turnos, max_distancia_s=MAX_DISTANCIA_S):
+    """
+    Asigna cada palabra al turno de hablante con el que más se traslapa.
+
+    Los turnos se ordenan por inicio y se guarda el máximo acumulado de sus fines: para una palabra,
+    los candidatos son los turnos que empiezan antes de que termine (búsqueda binaria) y se recorren
+    hacia atrás solo mientras el máximo acumulado del fin sea posterior al inicio de la palabra. Así
+    cada palabra revisa unos pocos turnos aunque haya decenas de miles. Una palabra que no se
+    traslapa con ningún turno se asigna al más cercano si está a menos de `max_distancia_s`.
+
+    Args:
+        palabras (list): Tuplas (texto, inicio, fin).
+        turnos (list): Turnos con "start_time" y "end_time".
+        max_distancia_s (float): Distancia máxima para asignar palabras fuera de todo turno.
+
+    Returns:
+        list: Índice del turno de cada palabra (o -1 si no se asignó).
+    """
+    if not turnos:
+        return [-1] * len(palabras)
+    orden = np.argsort([t["start_time"] for t in turnos], kind="stable")
+    inicios = np.array([turnos[i]["start_time"] for i in orden], dtype=np.float64)
+    fines = np.array([turnos[i]["end_time"] for i in orden], dtype=np.float64)
+    # Máximo acumulado del fin y el turno que lo alcanza
+    fin_max = np.maximum.accumulate(fines)
+    arg_max = np.zeros(len(fines), dtype=np.int64)
+    for k in range(1, len(fines)):
+        arg_max[k] = k if fines[k] >= fin_max[k - 1] else arg_max[k - 1]
+
+    asignacion = []
+    for _, a, b in palabras:
+        b = max(b, a + 1e-3)  # Palabras sin duración se tratan como un instante
+        j = int(np.searchsorted(inicios, b, side="left"))  # Turnos [0, j) empiezan antes de que termine
+        mejor, traslape = -1, 0.0
+        k = j - 1
+        while k >= 0 and fin_max[k] > a:
+            t = min(b, fines[k]) - max(a, inicios[k])
+            if t > traslape:
+                mejor, traslape = k, t
+            k -= 1
+        if mejor < 0:
+            # Sin traslape: el turno anterior que termina más tarde o el siguiente que empieza
+            distancias = []
+            if j > 0:
+                distancias.append((a - fin_max[j - 1], arg_max[j - 1]))
+            if j < len(inicios):
+                distancias.append((inicios[j] - b, j))
+            distancia, k = min(distancias)
+            if distancia <= max_distancia_s:
+                mejor = k
+        asignacion.append(int(orden[mejor]) if mejor >= 0 else -1)
+    return asignacion
+
+def segmentos_con_palabras(turnos, palabras, asignacion):
+    """
+    Construye los segmentos de `aligned_transcription.json` (un segmento por turno, con el mismo
+    esquema que la transcripción por turnos) y agrega las palabras con sus tiempos en "palabras".
+    """
+    por_turno = [[] for _ in turnos]
+    for (texto, a, b), i in zip(palabras, asignacion):
+        if i >= 0:
+            por_turno[i].append({"palabra": texto, "inicio": round(a, 3), "fin": round(b, 3)})
+    return [
+        {**turno, "transcript": " ".join(p["palabra"] for p in lista), "palabras": lista}
+        for turno, lista in zip(turnos, por_turno)
+    ]
+
+def transcripcion_larga(muestras, sample_rate, diarization_results, asr_pipeline, convertir=None, metricas=None):
+    """
+    Transcribe el audio completo una sola vez y reparte las palabras entre los turnos de la diarización.
+
+    A diferencia de transcribir cada turno por separado, el encoder de Whisper procesa cada ventana de
+    30 s una sola vez (sin rellenar turnos cortos) y el decoder conserva el contexto entre turnos.
+
+    Args:
+        muestras (np.ndarray): Audio completo (ver `abrir_audio`).
+        sample_rate (int): Frecuencia de muestreo.
+        diarization_results (list): Turnos de `realizar_diarizacion`.
+        asr_pipeline (Pipeline): Pipeline ASR.
+        convertir (callable, opcional): Convierte un tramo de `muestras` a float32 mono.
+        metricas (MetricasEjecucion, opcional): Registra el tiempo de cada bloque.
+
+    Returns:
+        list: Segmentos con la transcripción (uno por turno).
+    """
+    palabras = transcribir_palabras(muestras, sample_rate, asr_pipeline, convertir, metricas)
+    asignacion = asignar_palabras(palabras, diarization_results)
+    sin_turno = sum(1 for i in asignacion if i < 0)
+    print(f"🔗 {len(palabras)} palabra(s) asignadas a {len(diarization_results)} turno(s)"
+          + (f"; {sin_turno} fuera de los turnos descartada(s)" if sin_turno else ""))
+    return segmentos_con_palabras(diarization_results, palabras, asignacion)
@@ -0,0 +1,166 @@
+import os                 # Para leer la configuración desde variables de entorno
+import time               # Para medir cada tarea
+import atexit             # Para cerrar los procesos al salir
+import threading          # Para proteger los grupos de procesos compartidos
+import multiprocessing    # Para crear los procesos con "spawn" (seguro con torch)
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np        # Para convertir los segmentos antes de mandarlos a los procesos
+from funciones.gobernador_memoria import GobernadorLotes, ASR_MEMORIA_MB, ASR_BATCH_MAX, ASR_LOTE_ADAPTATIVO, \
+    _memoria_disponible_bytes
+from funciones.transcripcion_por_lotes import transcribir_por_lotes, agrupar_por_duracion, ASR_BATCH_SIZE, ASR_MAX_RELLENO
+
+# Procesos de transcripción en CPU (0 o 1 = la transcripción corre en el proceso principal)
+ASR_PROCESOS = int(os.getenv("ASR_PROCESOS", "0"))
+# Segmentos de cada tarea que toma un proceso (segmentos de duración parecida). Una tarea es el lote más
+# grande que puede probar el gobernador de lotes del proceso, así que por defecto es su tamaño máximo
+ASR_SEGMENTOS_POR_TAREA = int(os.getenv("ASR_SEGMENTOS_POR_TAREA",
+                                        str(ASR_BATCH_MAX if ASR_LOTE_ADAPTATIVO else ASR_BATCH_SIZE)))
+# Tareas encoladas por proceso: su audio ya está convertido, así que se limitan para no copiar todo el archivo
+TAREAS_EN_COLA_POR_PROCESO = 2
+
+# Estado de cada proceso de trabajo: su pipeline y su gobernador de lotes (se crean una sola vez)
+_PROCESO = {}
+
+def _iniciar_proceso(model_id, revision, backend, hilos, nucleos, contador, presupuesto_mb):
+    """Inicializa un proceso de trabajo: fija sus núcleos e hilos y carga el modelo una sola vez."""
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""  # Los procesos son de CPU; la GPU se usa con un solo proceso
+    with contador.get_lock():
+        k = contador.value
+        contador.value += 1
+    # Cada proceso se queda con su parte de los núcleos para que no compitan entre sí
+    propios = nucleos[k * hilos:(k + 1) * hilos]
+    if propios and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, propios)
+
+    import torch
+    torch.set_num_threads(hilos)
+    torch.set_num_interop_threads(1)
+    from funciones.transcripcion import cargar_pipeline_asr
+    _PROCESO["pipeline"] = cargar_pipeline_asr(model_id, revision, backend=backend)
+    _PROCESO["gobernador"] = GobernadorLotes("cpu", batch_inicial=ASR_BATCH_SIZE, presupuesto_mb=presupuesto_mb)
+
+def _transcribir_tarea(indices, audios, sample_rate, max_relleno, generate_kwargs):
+    """Transcribe una tarea dentro de un proceso de trabajo. Regresa (índices, textos, segundos)."""
+    inicio = time.perf_counter()
+    textos = transcribir_por_lotes(audios, _PROCESO["pipeline"], sample_rate=sample_rate, max_relleno=max_relleno,
+                                   generate_kwargs=generate_kwargs, gobernador=_PROCESO["gobernador"], informar=False)
+    return indices, textos, time.perf_counter() - inicio
+
+class TranscriptorMultiproceso:
+    """
+    Grupo de procesos de CPU, cada uno con su copia del modelo Whisper y una parte fija de los núcleos.
+
+    PyTorch escala mal más allá de unos cuantos hilos por operación; con varios procesos de pocos hilos
+    cada uno, el rendimiento crece casi linealmente con los núcleos. Los segmentos se agrupan en tareas de
+    duración parecida y se encolan de la más larga a la más corta en una cola compartida: cada proceso
+    toma la siguiente en cuanto termina la suya, así que las tareas cortas del final equilibran la carga.
+    Los procesos se crean una vez y se reutilizan entre archivos.
+
+    Args:
+        model_id (str): Modelo Whisper.
+        revision (str, opcional): Revisión del modelo.
+        backend (str): Backend de inferencia de CPU (ver `cargar_pipeline_asr`).
+        procesos (int): Procesos de trabajo.
+        hilos (int, opcional): Hilos de torch por proceso (por defecto, los núcleos repartidos entre los procesos).
+    """
+
+    def __init__(self, model_id, revision=None, backend="eager", procesos=ASR_PROCESOS, hilos=None):
+        nucleos = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else \
+            list(range(os.cpu_count() or 1))
+        self.procesos = max(1, procesos)
+        self.hilos = max(1, hilos or len(nucleos) // self.procesos)
+        # La memoria se reparte entre los procesos (cada uno tiene su gobernador de lotes)
+        total_mb = ASR_MEMORIA_MB or _memoria_disponible_bytes() / 1024 / 1024 * 0.9
+        contexto = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.procesos, mp_context=contexto, initializer=_iniciar_proceso,
+            initargs=(model_id, revision, backend, self.hilos, nucleos, contexto.Value("i", 0),
+                      int(total_mb / self.procesos)),
+        )
+        self.roto = False
+        print(f"🧵 Transcripción en {self.procesos} proceso(s) de {self.hilos} hilo(s) cada uno")
+
+    def transcribir(self, segmentos_audio, sample_rate=16000, convertir=None, omitir=None, al_completar=None,
+                    metricas=None, max_relleno=ASR_MAX_RELLENO, segmentos_por_tarea=ASR_SEGMENTOS_POR_TAREA,
+                    generate_kwargs=None):
+        """
+        Transcribe los segmentos en los procesos de trabajo (misma interfaz que `transcribir_por_lotes`).
+
+        Returns:
+            list: Transcripción (en minúsculas) de cada segmento, en el orden original.
+        """
+        convertir = convertir or (lambda audio: audio)
+        omitir = omitir or set()
+        al_completar = al_completar or (lambda indice, texto: None)
+        transcripciones = [""] * len(segmentos_audio)
+        pendientes = []
+        for i, audio in enumerate(segmentos_audio):
+            if i in omitir:
+                continue
+            if len(audio) == 0:
+                al_completar(i, "")
+                continue
+            pendientes.append(i)
+
+        # Tareas de duración parecida, de la más larga a la más corta
+        tareas = agrupar_por_duracion([len(segmentos_audio[i]) for i in pendientes], segmentos_por_tarea, max_relleno)
+        tareas = [[pendientes[j] for j in tarea] for tarea in reversed(tareas)]
+        print(f"📦 {len(pendientes)} segmento(s) en {len(tareas)} tarea(s) para {self.procesos} proceso(s)")
+        siguientes = iter(tareas)
+        futuros = {}
+
+        def encolar():
+            indices = next(siguientes, None)
+            if indices is None:
+                return
+            # Cada tarea lleva su audio ya convertido a float32 (solo los segmentos de la tarea)
+            audios = [np.ascontiguousarray(convertir(segmentos_audio[i]), dtype=np.float32) for i in indices]
+            futuros[self._pool.submit(_transcribir_tarea, indices, audios, sample_rate, max_relleno,
+                                      generate_kwargs)] = sum(len(a) for a in audios) / sample_rate
+
+        try:
+            for _ in range(self.procesos * TAREAS_EN_COLA_POR_PROCESO):
+                encolar()
+            while futuros:
+                terminados, _ = wait(futuros, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    audio_s = futuros.pop(futuro)
+                    indices, textos, segundos = futuro.result()
+                    if metricas is not None:
+                        metricas.registrar_lote("tarea", len(indices), audio_s, segundos)
+                    for i, texto in zip(indices, textos):
+                        transcripciones[i] = texto
+                        al_completar(i, texto)
+                    encolar()
+        except BrokenProcessPool as e:
+            self.cerrar()
+            self.roto = True
+            raise RuntimeError(f"Un proceso de transcripción terminó inesperadamente: {e}") from e
+        return transcripciones
+
+    def cerrar(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+# Grupos de procesos compartidos por el programa, por (modelo, revisión, backend, procesos)
+_TRANSCRIPTORES = {}
+_lock = threading.Lock()
+
+def obtener_transcriptor(model_id, revision=None, backend="eager", procesos=ASR_PROCESOS):
+    """
+    Regresa el grupo de procesos para esta configuración, creándolo la primera vez (los modelos se cargan
+    una sola vez por proceso y se reutilizan en los siguientes archivos).
+    """
+    clave = (model_id, revision, backend, procesos)
+    with _lock:
+        transcriptor = _TRANSCRIPTORES.get(clave)
+        if transcriptor is None or transcriptor.roto:
+            transcriptor = _TRANSCRIPTORES[clave] = TranscriptorMultiproceso(model_id, revision, backend, procesos)
+        return transcriptor
+
+@atexit.register
+def cerrar_transcriptores():
+    with _lock:
+        for transcriptor in _TRANSCRIPTORES.values():
+            transcriptor.cerrar()
+        _TRANSCRIPTORES.clear()
@@ -0,0 +1,183 @@
+import os                 # Para leer la configuración desde variables de entorno
+import time               # Para medir cada lote
+from funciones.gobernador_memoria import GobernadorLotes, es_falta_de_memoria, liberar_memoria  # Lote adaptativo
+
+# Tamaño del primer lote de segmentos enviados juntos a model.generate (luego lo ajusta el gobernador)
+ASR_BATCH_SIZE = int(os.getenv("ASR_BATCH_SIZE", "8"))
+# Máxima relación (duración rellenada / duración real) permitida dentro de un lote
+ASR_MAX_RELLENO = float(os.getenv("ASR_MAX_RELLENO", "1.5"))
+# Duración máxima (s) que Whisper procesa en una sola ventana; los segmentos más largos usan el pipeline por chunks
+VENTANA_WHISPER_S = 30.0
+
+def agrupar_por_duracion(duraciones, batch_size=ASR_BATCH_SIZE, max_relleno=ASR_MAX_RELLENO):
+    """
+    Agrupa segmentos en lotes de duración parecida para limitar el relleno (padding).
+
+    Los segmentos se ordenan por duración y se van agregando al lote actual mientras no se
+    exceda `batch_size` ni la relación entre la duración rellenada al más largo del lote y la
+    duración real sumada supere `max_relleno`.
+
+    Args:
+        duraciones (list): Duración (en segundos o muestras) de cada segmento.
+        batch_size (int): Número máximo de segmentos por lote.
+        max_relleno (float): Relación máxima permitida (>= 1.0).
+
+    Returns:
+        list: Lista de lotes; cada lote es una lista de índices de `duraciones`.
+    """
+    orden = sorted(range(len(duraciones)), key=lambda i: duraciones[i])
+    lotes = []
+    lote, suma = [], 0.0
+    for i in orden:
+        d = duraciones[i]
+        if lote:
+            # Como el orden es ascendente, el segmento nuevo es el más largo del lote
+            relleno = d * (len(lote) + 1) / max(suma + d, 1e-8)
+            if len(lote) >= batch_size or relleno > max_relleno:
+                lotes.append(lote)
+                lote, suma = [], 0.0
+        lote.append(i)
+        suma += d
+    if lote:
+        lotes.append(lote)
+    return lotes
+
+def _siguiente_lote(orden, posicion, tamano, max_relleno, segmentos_audio):
+    """
+    Índices del siguiente lote: hasta `tamano` segmentos consecutivos de `orden` (ordenados por duración)
+    sin que el relleno al más largo exceda `max_relleno` (mismo criterio que `agrupar_por_duracion`).
+    """
+    lote, suma = [orden[posicion]], len(segmentos_audio[orden[posicion]])
+    for i in orden[posicion + 1:posicion + tamano]:
+        d = len(segmentos_audio[i])
+        if d * (len(lote) + 1) / max(suma + d, 1e-8) > max_relleno:
+            break
+        lote.append(i)
+        suma += d
+    return lote
+
+def _generar_lote(audios, model, processor, sample_rate, generate_kwargs=None):
+    """Ejecuta una sola llamada a model.generate para un lote de segmentos y regresa sus textos."""
+    import torch  # Ya está cargado: lo importó quien construyó el modelo
+    features = processor.feature_extractor(
+        audios,
+        sampling_rate=sample_rate,
+        return_tensors="pt"
+    ).input_features.to(model.device, dtype=getattr(model, "dtype", torch.float32))  # Los modelos ONNX no tienen dtype
+    with torch.no_grad():
+        generated_ids = model.generate(features, **(generate_kwargs or {}))
+    return processor.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+
+def transcribir_por_lotes(segmentos_audio, asr_pipeline, sample_rate=16000,
+                          batch_size=ASR_BATCH_SIZE, max_relleno=ASR_MAX_RELLENO, convertir=None,
+                          omitir=None, al_completar=None, metricas=None, generate_kwargs=None, gobernador=None,
+                          informar=True):
+    """
+    Transcribe una lista de segmentos agrupándolos por duración en lotes.
+
+    Cada lote se procesa con una sola llamada a `generate`. Whisper rellena todas las entradas a
+    una ventana de 30 s, así que el costo del encoder por lote es fijo; agrupar por duración
+    hace que los textos del lote terminen en un número de pasos parecido y limita el trabajo
+    desperdiciado del decoder. Los segmentos de más de 30 s se mandan al pipeline por chunks.
+
+    El tamaño de cada lote lo decide un `GobernadorLotes` con la memoria y la latencia observadas; si un
+    lote se queda sin memoria, se reintenta con uno más chico en lugar de fallar.
+
+    Args:
+        segmentos_audio (list): Arreglos de audio (mono) de cada segmento.
+        asr_pipeline (Pipeline): Pipeline ASR (se usan su modelo, tokenizer y extractor de features).
+        sample_rate (int): Frecuencia de muestreo del audio.
+        batch_size (int): Tamaño del primer lote.
+        max_relleno (float): Relación máxima de relleno permitida dentro de un lote.
+        convertir (callable, opcional): Convierte un segmento a float32 mono justo antes de pasarlo al
+            modelo (por ejemplo, vistas int16 de un WAV mapeado en memoria). Solo se aplica al lote actual.
+        omitir (set, opcional): Índices que ya están transcritos (p. ej. al reanudar); se quedan con string vacío.
+        al_completar (callable, opcional): Se llama con (índice, texto) en cuanto termina cada segmento,
+            por ejemplo para escribirlo en el diario de la transcripción.
+        metricas (MetricasEjecucion, opcional): Registra tiempo y segundos de audio de cada lote.
+        generate_kwargs (dict, opcional): Parámetros de decodificación para `generate` (p. ej. `num_beams`,
+            `max_length`); por defecto, los de la configuración de generación del modelo.
+        gobernador (GobernadorLotes, opcional): Gobernador de lotes (por defecto uno nuevo que empieza en `batch_size`).
+        informar (bool): Imprime el resumen de lotes (los procesos de `transcripcion_multiproceso` no lo hacen).
+
+    Returns:
+        list: Transcripción (en minúsculas) de cada segmento, en el orden original.
+    """
+    convertir = convertir or (lambda audio: audio)
+    omitir = omitir or set()
+    al_completar = al_completar or (lambda indice, texto: None)
+    model = asr_pipeline.model
+    processor = asr_pipeline  # El pipeline expone .tokenizer y .feature_extractor igual que el procesador
+    transcripciones = [""] * len(segmentos_audio)
+
+    # El extractor de Whisper solo acepta su frecuencia nativa; si no coincide, el pipeline re-muestrea
+    ventana = int(VENTANA_WHISPER_S * sample_rate)
+    mismo_sr = sample_rate == asr_pipeline.feature_extractor.sampling_rate
+    cortos, largos = [], []
+    for i, audio in enumerate(segmentos_audio):
+        if i in omitir:
+            continue
+        if len(audio) == 0:
+            al_completar(i, "")  # Segmento vacío: se queda con string vacío
+            continue
+        if mismo_sr and len(audio) <= ventana:
+            cortos.append(i)
+        else:
+            largos.append(i)
+
+    # Segmentos cortos: lotes de duración parecida (en orden ascendente), una llamada a generate por lote
+    gobernador = gobernador or GobernadorLotes(getattr(model, "device", "cpu"), batch_inicial=batch_size)
+    orden = sorted(cortos, key=lambda i: len(segmentos_audio[i]))
+    if informar:
+        print(f"📦 {len(cortos)} segmento(s) en lotes desde {gobernador.tamano}; {len(largos)} segmento(s) largo(s) por chunks")
+    posicion = 0
+    while posicion < len(orden):
+        indices = _siguiente_lote(orden, posicion, gobernador.tamano, max_relleno, segmentos_audio)
+        audio_s = sum(len(segmentos_audio[i]) for i in indices) / sample_rate
+        inicio = time.perf_counter()
+        textos = None
+        try:
+            with gobernador.medir() as medicion:
+                textos = _generar_lote([convertir(segmentos_audio[i]) for i in indices], model, processor,
+                                       sample_rate, generate_kwargs)
+        except Exception as e:
+            if not es_falta_de_memoria(e) or len(indices) == 1:
+                raise
+        if textos is None:
+            # Fuera del except: el traceback ya no retiene los tensores del lote que falló
+            gobernador.al_faltar_memoria(len(indices))
+            continue
+        pared_s = time.perf_counter() - inicio
+        gobernador.observar(medicion, len(indices), pared_s, audio_s)
+        if metricas is not None:
+            metricas.registrar_lote("lote", len(indices), audio_s, pared_s)
+        for i, texto in zip(indices, textos):
+            transcripciones[i] = texto.lower()
+            al_completar(i, transcripciones[i])
+        posicion += len(indices)
+
+    # Segmentos largos: el pipeline los divide en chunks de 30 s con sobreposición
+    for i in largos:
+        inicio = time.perf_counter()
+        kwargs = {"generate_kwargs": generate_kwargs} if generate_kwargs else {}
+        result = None
+        try:
+            result = asr_pipeline({"raw": convertir(segmentos_audio[i]), "sampling_rate": sample_rate}, **kwargs)
+        except Exception as e:
+            if not es_falta_de_memoria(e):
+                raise
+        if result is None:
+            # Sin memoria: se reintenta procesando un chunk a la vez
+            liberar_memoria()
+            gobernador.reintentos += 1
+            print("⚠️ Falta de memoria en un segmento largo; se reintenta con un chunk a la vez")
+            result = asr_pipeline({"raw": convertir(segmentos_audio[i]), "sampling_rate": sample_rate},
+                                  batch_size=1, **kwargs)
+        if metricas is not None:
+            metricas.registrar_lote("chunks", 1, len(segmentos_audio[i]) / sample_rate, time.perf_counter() - inicio)
+        transcripciones[i] = result["text"].lower()
+        al_completar(i, transcripciones[i])
+
+    if informar and (gobernador.reintentos or gobernador.tamano != gobernador.inicial):
+        print(f"🎛️ Lote ASR: {gobernador.inicial} → {gobernador.tamano} ({gobernador.reintentos} reintento(s) por memoria)")
+    return transcripciones
@@ -0,0 +1,199 @@
+import os                 # Para leer la configuración desde variables de entorno
+import json               # Para guardar el mapa de tiempos junto a los resultados
+import numpy as np        # Para el cálculo de energía por frames
+from funciones.audio_en_memoria import AudioEnMemoria  # Audio condensado
+
+# Parámetros de la detección de voz por energía (configurables por variable de entorno)
+VAD_FRAME_S = float(os.getenv("VAD_FRAME_S", "0.03"))            # Tamaño de frame
+VAD_UMBRAL_DB = float(os.getenv("VAD_UMBRAL_DB", "12"))          # dB sobre el piso de ruido para considerar voz
+VAD_PISO_DBFS = float(os.getenv("VAD_PISO_DBFS", "-55"))         # Energía mínima absoluta de la voz (dBFS)
+VAD_MIN_VOZ_S = float(os.getenv("VAD_MIN_VOZ_S", "0.25"))        # Tramos de voz más cortos se descartan
+VAD_MIN_SILENCIO_S = float(os.getenv("VAD_MIN_SILENCIO_S", "0.5"))  # Silencios más cortos no se quitan
+VAD_MARGEN_S = float(os.getenv("VAD_MARGEN_S", "0.2"))           # Audio que se conserva antes y después de cada tramo
+# Silencio que se deja entre tramos en el audio condensado (para no pegar palabras de tramos distintos)
+SEPARACION_S = 0.1
+# Percentil de la energía por frame que se toma como piso de ruido
+PERCENTIL_RUIDO = 10
+# Segundos de audio que se convierten a float32 a la vez al calcular la energía
+BLOQUE_ENERGIA_S = 60
+
+def parametros_vad():
+    """Parámetros actuales de la detección de voz (forman parte de las claves de caché)."""
+    return {"frame_s": VAD_FRAME_S, "umbral_db": VAD_UMBRAL_DB, "piso_dbfs": VAD_PISO_DBFS,
+            "min_voz_s": VAD_MIN_VOZ_S, "min_silencio_s": VAD_MIN_SILENCIO_S, "margen_s": VAD_MARGEN_S,
+            "separacion_s": SEPARACION_S}
+
+def _energia_db(muestras, sample_rate, convertir, frame_s):
+    """Energía RMS (dBFS) por frame, calculada por bloques para no convertir todo el audio a la vez."""
+    frame = max(1, int(frame_s * sample_rate))
+    por_bloque = frame * max(1, int(BLOQUE_ENERGIA_S / frame_s))
+    n_frames = len(muestras) // frame
+    energia = np.empty(n_frames, dtype=np.float32)
+    for inicio in range(0, n_frames * frame, por_bloque):
+        tramo = convertir(muestras[inicio:min(inicio + por_bloque, n_frames * frame)])
+        frames = tramo.reshape(-1, frame).astype(np.float32)
+        energia[inicio // frame:inicio // frame + len(frames)] = np.mean(frames ** 2, axis=1)
+    return 10 * np.log10(energia + 1e-12)
+
+def _unir_cercanos(inicios, fines, min_hueco):
+    # Une tramos separados por menos de `min_hueco` frames
+    if len(inicios) == 0:
+        return inicios, fines
+    conservar = (inicios[1:] - fines[:-1]) >= min_hueco
+    return inicios[np.concatenate(([True], conservar))], fines[np.concatenate((conservar, [True]))]
+
+def detectar_voz(muestras, sample_rate, convertir=None, frame_s=VAD_FRAME_S, umbral_db=VAD_UMBRAL_DB,
+                 piso_dbfs=VAD_PISO_DBFS, min_voz_s=VAD_MIN_VOZ_S, min_silencio_s=VAD_MIN_SILENCIO_S,
+                 margen_s=VAD_MARGEN_S):
+    """
+    Detecta los tramos con voz por energía (vectorizado por frames).
+
+    Un frame es voz si su energía supera el piso de ruido de la grabación (percentil 10) más
+    `umbral_db` y además `piso_dbfs`. Los silencios cortos se rellenan, los tramos de voz cortos se
+    descartan y a cada tramo se le agrega un margen.
+
+    Args:
+        muestras (np.ndarray): Audio preprocesado (ver `abrir_audio`).
+        sample_rate (int): Frecuencia de muestreo.
+        convertir (callable, opcional): Convierte un tramo de `muestras` a float32 mono.
+        frame_s, umbral_db, piso_dbfs, min_voz_s, min_silencio_s, margen_s: Parámetros (ver constantes VAD_*).
+
+    Returns:
+        np.ndarray: Tramos de voz (K x 2) en segundos, ordenados y sin traslape.
+    """
+    convertir = convertir or (lambda audio: audio)
+    energia = _energia_db(muestras, sample_rate, convertir, frame_s)
+    if len(energia) == 0:
+        return np.zeros((0, 2))
+    umbral = max(np.percentile(energia, PERCENTIL_RUIDO) + umbral_db, piso_dbfs)
+    cambios = np.diff(np.concatenate(([0], (energia > umbral).astype(np.int8), [0])))
+    inicios, fines = np.flatnonzero(cambios == 1), np.flatnonzero(cambios == -1)
+
+    inicios, fines = _unir_cercanos(inicios, fines, int(round(min_silencio_s / frame_s)))
+    largos = (fines - inicios) >= int(round(min_voz_s / frame_s))
+    inicios, fines = inicios[largos], fines[largos]
+    margen = int(round(margen_s / frame_s))
+    inicios, fines = np.maximum(inicios - margen, 0), np.minimum(fines + margen, len(energia))
+    inicios, fines = _unir_cercanos(inicios, fines, 1)
+    duracion = len(muestras) / sample_rate
+    return np.minimum(np.stack([inicios, fines], axis=1) * frame_s, duracion)
+
+class MapaTiempo:
+    """
+    Relación entre los tiempos del audio condensado (solo voz) y los del audio original.
+
+    Cada tramo de voz ocupa en el audio condensado [inicio condensado, inicio condensado + duración];
+    entre tramos hay `separacion_s` de silencio. Los tiempos que caen en una separación se llevan al
+    final del tramo anterior.
+    """
+
+    def __init__(self, tramos, separacion_s=SEPARACION_S):
+        self.tramos = np.asarray(tramos, dtype=np.float64).reshape(-1, 2)
+        self.separacion_s = separacion_s
+        self.duraciones = self.tramos[:, 1] - self.tramos[:, 0]
+        self.inicios_condensados = np.concatenate(([0.0], np.cumsum(self.duraciones + separacion_s)[:-1])) \
+            if len(self.tramos) else np.zeros(0)
+
+    @property
+    def duracion_voz(self):
+        return float(self.duraciones.sum())
+
+    def a_original(self, t):
+        """Convierte tiempos del audio condensado a la línea de tiempo original (escalar o arreglo)."""
+        t = np.asarray(t, dtype=np.float64)
+        k = np.clip(np.searchsorted(self.inicios_condensados, t, side="right") - 1, 0, len(self.tramos) - 1)
+        desfase = np.clip(t - self.inicios_condensados[k], 0.0, self.duraciones[k])
+        return self.tramos[k, 0] + desfase
+
+    def a_condensado(self, t):
+        """Convierte tiempos originales al audio condensado (los silencios quitados se llevan al tramo anterior)."""
+        t = np.asarray(t, dtype=np.float64)
+        k = np.searchsorted(self.tramos[:, 0], t, side="right") - 1
+        antes = k < 0
+        k = np.clip(k, 0, len(self.tramos) - 1)
+        desfase = np.clip(t - self.tramos[k, 0], 0.0, self.duraciones[k])
+        return np.where(antes, 0.0, self.inicios_condensados[k] + desfase)
+
+    def condensar(self, muestras, sample_rate, convertir=None, origen=""):
+        """
+        Construye el audio condensado: los tramos de voz uno tras otro, separados por `separacion_s`.
+
+        Returns:
+            AudioEnMemoria: Audio condensado (float32).
+        """
+        convertir = convertir or (lambda audio: audio)
+        separacion = int(round(self.separacion_s * sample_rate))
+        limites = np.round(self.tramos * sample_rate).astype(np.int64)
+        total = int((limites[:, 1] - limites[:, 0]).sum()) + separacion * max(0, len(limites) - 1)
+        datos = np.zeros(total, dtype=np.float32)
+        posicion = 0
+        for k, (a, b) in enumerate(limites):
+            # Cada tramo empieza donde lo indica el mapa (se corrige el redondeo acumulado)
+            posicion = int(round(self.inicios_condensados[k] * sample_rate)) if k else 0
+            tramo = convertir(muestras[a:b])
+            n = min(len(tramo), total - posicion)
+            datos[posicion:posicion + n] = tramo[:n]
+        return AudioEnMemoria(datos=datos, sample_rate=sample_rate, origen=origen)
+
+    def turnos_a_original(self, turnos):
+        """Copia de los turnos/segmentos con "start_time", "end_time" (y "palabras") en tiempo original."""
+        if not turnos:
+            return []
+        inicios = self.a_original([t["start_time"] for t in turnos])
+        fines = self.a_original([t["end_time"] for t in turnos])
+        resultado = []
+        for turno, inicio, fin in zip(turnos, inicios, fines):
+            turno = {**turno, "start_time": round(float(inicio), 2), "end_time": round(float(fin), 2)}
+            if turno.get("palabras"):
+                tiempos = self.a_original([[p["inicio"], p["fin"]] for p in turno["palabras"]])
+                turno["palabras"] = [{**p, "inicio": round(float(a), 3), "fin": round(float(b), 3)}
+                                     for p, (a, b) in zip(turno["palabras"], tiempos)]
+            resultado.append(turno)
+        return resultado
+
+    def turnos_a_condensado(self, turnos):
+        """Copia de los turnos con los tiempos llevados al audio condensado (p. ej. al restaurar del caché)."""
+        if not turnos:
+            return []
+        inicios = self.a_condensado([t["start_time"] for t in turnos])
+        fines = self.a_condensado([t["end_time"] for t in turnos])
+        return [{**t, "start_time": float(a), "end_time": float(b)} for t, a, b in zip(turnos, inicios, fines)]
+
+    def guardar(self, carpeta):
+        ruta = os.path.join(carpeta, "vad_tramos.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"separacion_s": self.separacion_s, "tramos": np.round(self.tramos, 3).tolist()}, f)
+        return ruta
+
+    @classmethod
+    def cargar(cls, carpeta):
+        """Mapa guardado en una carpeta de resultados, o None si se procesó sin VAD."""
+        try:
+            with open(os.path.join(carpeta, "vad_tramos.json"), "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls(datos["tramos"], datos["separacion_s"])
+
+def condensar_voz(muestras, sample_rate, convertir=None, origen=""):
+    """
+    Detecta la voz y construye el audio condensado con su mapa de tiempos.
+
+    Returns:
+        tuple: (AudioEnMemoria condensado o None si no se detectó voz, MapaTiempo, resumen con las
+            duraciones y la aceleración esperada de las etapas siguientes).
+    """
+    tramos = detectar_voz(muestras, sample_rate, convertir)
+    mapa = MapaTiempo(tramos)
+    duracion = len(muestras) / sample_rate
+    if len(tramos) == 0:
+        return None, mapa, {"duracion_s": round(duracion, 2), "voz_s": 0.0, "tramos": 0, "aceleracion": None}
+    condensado = mapa.condensar(muestras, sample_rate, convertir, origen)
+    resumen = {
+        "duracion_s": round(duracion, 2),
+        "voz_s": round(mapa.duracion_voz, 2),
+        "condensado_s": round(condensado.duracion, 2),
+        "tramos": len(tramos),
+        "aceleracion": round(duracion / condensado.duracion, 2) if condensado.duracion else None,
+    }
+    return condensado, mapa, resumen
@@ -1,17 +1,60 @@
 # Importa módulos estándar de Python para manejo de archivos y argumentos
 import os
 import sys
+import json
+import shutil
+import argparse
+import threading
+import contextlib
 
-# Importa funciones personalizadas desde tu módulo 'funciones'
-from funciones.procesamiento_de_audio import procesamiento_de_audio
-from funciones.diarizacion import realizar_diarizacion
-from funciones.transcripcion import transcripcion_de_audio
-from funciones.convertir_video_a_audio import convertir_video_a_mp3
+# Carga el .env antes de importar los módulos que leen su configuración de variables de entorno
+from funciones.entorno import cargar_entorno
+cargar_entorno()
+
+# Importa funciones personalizadas desde tu módulo 'funciones'. Ninguno importa torch, pyannote,
+# transformers, librosa ni scipy.signal al cargarse: cada etapa los importa cuando los necesita
+from funciones.procesamiento_de_audio import (
+    procesamiento_de_audio, procesamiento_de_audio_por_bloques, EQ_LOW, EQ_HIGH, EQ_ORDEN
+)
+from funciones.diarizacion import realizar_diarizacion, cargar_pipeline_diarizacion, DIARIZATION_MODEL
+from funciones.segmentacion import (
+    DURACION_OBJETIVO_S, DURACION_MINIMA_S, DURACION_MAXIMA_S, MAX_PAUSA_S
+)
+from funciones.transcripcion import (
+    transcripcion_de_audio, cargar_pipeline_asr, actualizar_indice, nombre_modelo, abrir_audio,
+    MODEL_PATH, CHUNK_LENGTH_S, STRIDE_LENGTH_S
+)
+from funciones.almacen_hablantes import ALMACEN_HABLANTES, cargar_reagrupamiento, reagrupar
+from funciones.vad import condensar_voz, parametros_vad
+from funciones.diarizacion_por_ventanas import VENTANA_DIARIZACION_S, SOLAPE_DIARIZACION_S, UMBRAL_HABLANTES
+from funciones.transcripcion_larga import BLOQUE_LARGO_S, MAX_DISTANCIA_S
+from funciones.backends_asr import BACKENDS_ASR, ASR_BACKEND
+from funciones.transcripcion_multiproceso import ASR_PROCESOS
+from funciones.convertir_video_a_audio import convertir_video_a_wav
+from funciones.audio_en_memoria import decodificar_audio, AudioEnMemoria
+from funciones import cache_etapas
+from funciones.instrumentacion import MetricasEjecucion, duracion_de_audio, escribir_prometheus
+from funciones.cache_etapas import clave_etapa, hash_archivo
+from funciones.ejecucion_por_etapas import PipelineEscalonado, Etapa
 
 # Extensiones soportadas para archivos de audio y video
 AUDIO_EXTS = (".wav", ".mp3", ".m4a")
 VIDEO_EXTS = (".mp4", ".mkv", ".mov", ".avi", ".webm")
 
+# Extensiones de manifiesto (un archivo de audio/video por línea)
+MANIFEST_EXTS = (".txt", ".lst")
+
+# Carpeta raíz donde se guardan los resultados de cada archivo
+RESULTADOS_DIR = "resultados"
+
+# Hilos por etapa en el modo por lotes (las etapas con modelos comparten un solo modelo)
+CONCURRENCIA_ETAPAS = {
+    "conversion": 2,
+    "preprocesamiento": 2,
+    "diarizacion": 1,
+    "transcripcion": 1,
+}
+
 # Función para verificar si un archivo es de audio según la extensión
 def es_audio(path):
     return path.lower().endswith(AUDIO_EXTS)
@@ -20,62 +63,665 @@ def es_audio(path):
 def es_video(path):
     return path.lower().endswith(VIDEO_EXTS)
 
+# Función para verificar si un archivo es un manifiesto de lote según la extensión
+def es_manifiesto(path):
+    return path.lower().endswith(MANIFEST_EXTS)
+
 # Imprime un banner decorativo al inicio del programa
 def print_banner():
     print("="*60)
     print(" Procesador de Audio y Video con IA ".center(60, "="))
     print("="*60)
 
-# Función principal del script
-def main():
-    print_banner()
-    
-    # Verifica que se haya pasado un argumento (el archivo a procesar)
-    if len(sys.argv) < 2:
-        print("Uso: python post_partum.py <archivo_audio_o_video>")
-        print("Ejemplo: python post_partum.py entrevista.mp3")
-        sys.exit(1)
-    
-    input_path = sys.argv[1]
-    
+def listar_entradas_de_lote(input_path):
+    """
+    Obtiene la lista de archivos a procesar a partir de una carpeta o de un manifiesto.
+
+    Args:
+        input_path (str): Carpeta con archivos de audio/video, o manifiesto con una ruta por línea
+            (las líneas vacías y las que empiezan con '#' se ignoran).
+
+    Returns:
+        list: Rutas de los archivos a procesar, en orden.
+    """
+    if os.path.isdir(input_path):
+        return [
+            os.path.join(input_path, nombre)
+            for nombre in sorted(os.listdir(input_path))
+            if es_audio(nombre) or es_video(nombre)
+        ]
+
+    # Las rutas relativas del manifiesto se resuelven respecto a la carpeta del manifiesto
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    entradas = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea or linea.startswith("#"):
+                continue
+            entradas.append(linea if os.path.isabs(linea) else os.path.join(base_dir, linea))
+    return entradas
+
+def convertir_entrada(input_path, output_dir, en_memoria=True, por_bloques=False, **_):
+    """
+    Obtiene el audio de la entrada según el modo elegido (decodificación en memoria, WAV extraído o ruta directa).
+
+    Args:
+        input_path (str): Ruta al archivo de audio o video.
+        output_dir (str): Carpeta de resultados del archivo.
+        en_memoria (bool): Decodifica una sola vez con ffmpeg y regresa el audio en memoria.
+        por_bloques (bool): El preprocesamiento por bloques decodifica por su cuenta; se regresa la ruta tal cual.
+
+    Returns:
+        str | AudioEnMemoria: Audio listo para preprocesar.
+    """
+    # Por bloques: la decodificación ocurre dentro del preprocesamiento
+    if por_bloques:
+        return input_path
+
+    # En memoria: ffmpeg decodifica audio o video directo a 16 kHz mono, sin MP3 ni WAV intermedios
+    if en_memoria:
+        print(f"\n🎞️ Decodificando audio en memoria con ffmpeg: {input_path}")
+        audio = decodificar_audio(input_path)
+        print(f"✅ Audio decodificado: {audio.duracion:.1f} s")
+        return audio
+
+    # Detecta si el archivo es video, y si lo es, extrae su audio a WAV 16 kHz mono (sin MP3 intermedio)
+    if es_video(input_path):
+        print("\n🎥 Archivo detectado como video, extrayendo audio a WAV...")
+        audio_path = convertir_video_a_wav(input_path, output_dir=output_dir)
+        if audio_path is None:
+            raise RuntimeError(f"No se pudo convertir el video: {input_path}")
+        print(f"✅ Video convertido: {audio_path}")
+        return audio_path
+
+    # Si es audio, simplemente toma la ruta original
+    print(f"\n🎵 Archivo detectado como audio, usando directamente: {input_path}")
+    return input_path
+
+def preprocesar_audio(audio, output_dir, guardar_wav=True, por_bloques=False, **_):
+    """
+    Preprocesa el audio (ecualización y normalización) según el modo elegido.
+
+    Args:
+        audio (str | AudioEnMemoria): Audio obtenido por `convertir_entrada`.
+        output_dir (str): Carpeta de resultados del archivo.
+        guardar_wav (bool): En modo en memoria, guarda también el `*_processed.wav`.
+        por_bloques (bool): Preprocesa por bloques con memoria constante (grabaciones de varias horas).
+
+    Returns:
+        str | AudioEnMemoria: Audio preprocesado.
+    """
+    # Preprocesa el archivo de audio (ruido, normalización, etc)
+    if por_bloques:
+        print("\n🎧 Preprocesando audio por bloques...")
+        processed_audio = procesamiento_de_audio_por_bloques(audio, output_dir=output_dir)
+    else:
+        print("\n🎧 Preprocesando audio...")
+        processed_audio = procesamiento_de_audio(audio, output_dir=output_dir, guardar_wav=guardar_wav)
+    print(f"✅ Audio preprocesado: {processed_audio}")
+    return processed_audio
+
+def parametros_de_etapa(etapa, opciones, asr_pipeline=None):
+    """
+    Regresa los parámetros que determinan el resultado de una etapa (forman parte de su clave de caché).
+
+    Args:
+        etapa (str): "preprocesamiento", "diarizacion" o "transcripcion".
+        opciones (dict): Opciones del archivo (modo de preprocesamiento, planificador de segmentos).
+        asr_pipeline (Pipeline, opcional): Pipeline ASR en uso (de él se toma el modelo).
+
+    Returns:
+        dict: Parámetros de la etapa.
+    """
+    if etapa == "preprocesamiento":
+        if opciones.get("por_bloques"):
+            modo = "bloques"
+        else:
+            modo = "memoria" if opciones.get("en_memoria", True) else "disco"
+        return {"sample_rate": 16000, "low": EQ_LOW, "high": EQ_HIGH, "orden": EQ_ORDEN, "modo": modo}
+    vad = {"vad": parametros_vad()} if opciones.get("vad") else {}
+    if etapa == "diarizacion":
+        parametros = {"modelo": DIARIZATION_MODEL, "revision": None, **vad}
+        if opciones.get("ventanas"):
+            # El número de procesos no cambia el resultado; las ventanas y el umbral sí
+            parametros["ventanas"] = {"ventana_s": VENTANA_DIARIZACION_S, "solape_s": SOLAPE_DIARIZACION_S,
+                                      "umbral": UMBRAL_HABLANTES}
+        return parametros
+    modelo = nombre_modelo(asr_pipeline) if asr_pipeline is not None else MODEL_PATH
+    parametros = {"modelo": modelo, "revision": None, "chunk_length_s": CHUNK_LENGTH_S, "stride_length_s": STRIDE_LENGTH_S,
+                  **vad}
+    backend = opciones.get("backend_asr", ASR_BACKEND)
+    if backend != "eager":
+        # Los backends optimizados pueden cambiar ligeramente el texto (eager conserva las claves anteriores)
+        parametros["backend"] = backend
+    if opciones.get("larga"):
+        parametros["larga"] = {"bloque_s": BLOQUE_LARGO_S, "max_distancia_s": MAX_DISTANCIA_S}
+    elif opciones.get("planificar", True):
+        parametros["planificador"] = {
+            "objetivo_s": DURACION_OBJETIVO_S, "minima_s": DURACION_MINIMA_S,
+            "maxima_s": DURACION_MAXIMA_S, "max_pausa_s": MAX_PAUSA_S,
+        }
+    return parametros
+
+def escribir_json(datos, ruta):
+    """Escribe un JSON de resultados de forma atómica."""
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=4)
+    os.replace(temporal, ruta)
+
+def reutilizar_de_cache(contexto, etapa, entradas, parametros, nombre, destino):
+    """
+    Calcula la clave de una etapa y, si hay un artefacto válido en el caché, lo copia a `destino`.
+
+    Args:
+        contexto (dict): Contexto del archivo (aquí se guarda la clave de la etapa).
+        etapa (str): Nombre de la etapa.
+        entradas (list): Hashes/claves de las que depende la etapa.
+        parametros (dict): Parámetros de la etapa.
+        nombre (str): Nombre del artefacto dentro del caché.
+        destino (str): Ruta en la carpeta de resultados donde se restaura el artefacto.
+
+    Returns:
+        bool: True si se reutilizó el artefacto del caché.
+    """
+    clave = clave_etapa(etapa, entradas, parametros)
+    contexto.setdefault("claves", {})[etapa] = clave
+    artefactos = cache_etapas.buscar(etapa, clave)
+    if artefactos is None:
+        return False
+    shutil.copyfile(artefactos[nombre], destino)
+    contexto.setdefault("desde_cache", []).append(etapa)
+    print(f"♻️ {etapa}: resultado reutilizado del caché ({clave[:12]})")
+    return True
+
+# --- Etapas del flujo; cada una recibe y completa el contexto (dict) de un archivo ---
+
+def etapa_conversion(contexto):
+    input_path = contexto["archivo"]
+    opciones = contexto["opciones"]
+
     # Checa si el archivo existe
     if not os.path.exists(input_path):
-        print(f"❌ Archivo no encontrado: {input_path}")
-        sys.exit(1)
-    
+        raise FileNotFoundError(f"Archivo no encontrado: {input_path}")
+
+    # Rechaza archivos que no son audio ni video antes de crear la carpeta de salida
+    if not (es_video(input_path) or es_audio(input_path)):
+        raise ValueError("Archivo no es audio ni video válido.")
+
     # Define el nombre base del archivo (sin extensión) y la carpeta de resultados
     nombre_base = os.path.splitext(os.path.basename(input_path))[0]
-    output_dir = os.path.join("resultados", nombre_base)
+    output_dir = os.path.join(RESULTADOS_DIR, nombre_base)
     os.makedirs(output_dir, exist_ok=True)
     print(f"\n📂 Carpeta de salida: {output_dir}")
+    contexto["carpeta"] = output_dir
 
-    # Detecta si el archivo es video, y si lo es, lo convierte a audio (mp3)
-    if es_video(input_path):
-        print(f"\n🎥 Archivo detectado como video, convirtiendo a MP3...")
-        audio_path = convertir_video_a_mp3(input_path, output_dir=output_dir)
-        print(f"✅ Video convertido: {audio_path}")
-    # Si es audio, simplemente toma la ruta original
-    elif es_audio(input_path):
-        audio_path = input_path
-        print(f"\n🎵 Archivo detectado como audio, usando directamente: {audio_path}")
-    else:
-        print("❌ Archivo no es audio ni video válido.")
-        sys.exit(1)
+    # Si el audio preprocesado ya está en el caché, se salta la conversión y el preprocesamiento
+    if opciones.get("usar_cache", True):
+        destino = os.path.join(output_dir, f"{nombre_base}_processed.wav")
+        if reutilizar_de_cache(contexto, "preprocesamiento", [hash_archivo(input_path)],
+                               parametros_de_etapa("preprocesamiento", opciones), "processed.wav", destino):
+            contexto["audio"] = destino
+            return contexto
 
-    # Preprocesa el archivo de audio (ruido, normalización, etc)
-    print("\n🎧 Preprocesando audio...")
-    processed_audio = procesamiento_de_audio(audio_path, output_dir=output_dir)
-    print(f"✅ Audio preprocesado: {processed_audio}")
+    contexto["audio"] = convertir_entrada(input_path, output_dir, **opciones)
+    return contexto
+
+def aplicar_vad(contexto):
+    """
+    Con la opción `vad`, detecta la voz en el audio preprocesado y deja en el contexto el audio condensado
+    (solo voz) para la diarización y la transcripción, con su mapa de tiempos hacia el audio original.
+    """
+    tramos = os.path.join(contexto["carpeta"], "vad_tramos.json")
+    if os.path.exists(tramos):
+        os.remove(tramos)  # Mapa de una ejecución anterior: ya no corresponde a estos resultados
+    if not contexto["opciones"].get("vad"):
+        return
+    muestras, sample_rate, convertir = abrir_audio(contexto["audio"])
+    condensado, mapa, resumen = condensar_voz(muestras, sample_rate, convertir, origen=contexto["archivo"])
+    contexto.setdefault("metricas", MetricasEjecucion(contexto["archivo"])).vad = resumen
+    if condensado is None:
+        print("⚠️ VAD: no se detectó voz; se procesa el audio completo")
+        return
+    contexto["audio_vad"], contexto["mapa_vad"] = condensado, mapa
+    mapa.guardar(contexto["carpeta"])
+    print(f"🔇 VAD: {resumen['voz_s']:.1f} s de voz en {resumen['tramos']} tramo(s) de {resumen['duracion_s']:.1f} s; "
+          f"diarización y transcripción sobre {resumen['condensado_s']:.1f} s (×{resumen['aceleracion']} menos audio)")
+
+def etapa_preprocesamiento(contexto):
+    if "preprocesamiento" in contexto.get("desde_cache", []):
+        aplicar_vad(contexto)
+        return contexto
+    contexto["audio"] = preprocesar_audio(contexto["audio"], contexto["carpeta"], **contexto["opciones"])
+
+    # Guarda el WAV procesado en el caché (si el audio solo está en memoria, se escribe directo ahí)
+    clave = contexto.get("claves", {}).get("preprocesamiento")
+    if clave is not None:
+        audio = contexto["audio"]
+        if isinstance(audio, AudioEnMemoria):
+            ruta = audio.ruta or AudioEnMemoria(audio.datos, audio.sample_rate).guardar_wav(
+                cache_etapas.ruta_para_guardar("preprocesamiento", clave, "processed.wav")
+            )
+        else:
+            ruta = audio
+        cache_etapas.guardar("preprocesamiento", clave, {"processed.wav": ruta},
+                             parametros_de_etapa("preprocesamiento", contexto["opciones"]), contexto["archivo"])
+    aplicar_vad(contexto)
+    return contexto
+
+def etapa_diarizacion(contexto, pipeline=None):
+    usar_cache = "preprocesamiento" in contexto.get("claves", {})
+    destino = os.path.join(contexto["carpeta"], "diarization_results.json")
+    parametros = parametros_de_etapa("diarizacion", contexto["opciones"])
+    # Si la carpeta se re-agrupó con `scripts/hablantes.py`, esos parámetros se vuelven a aplicar y distinguen
+    # la entrada del caché (si no, el caché o una diarización nueva regresarían a los turnos anteriores)
+    reagrupamiento = cargar_reagrupamiento(contexto["carpeta"])
+    if reagrupamiento is not None:
+        parametros["reagrupamiento"] = reagrupamiento
+    if usar_cache and reutilizar_de_cache(contexto, "diarizacion", [contexto["claves"]["preprocesamiento"]],
+                                          parametros, "diarization_results.json", destino):
+        with open(destino, "r", encoding="utf-8") as f:
+            contexto["diarizacion"] = json.load(f)
+        if "mapa_vad" in contexto:
+            # El caché guarda los tiempos originales; la transcripción trabaja sobre el audio condensado
+            contexto["diarizacion"] = contexto["mapa_vad"].turnos_a_condensado(contexto["diarizacion"])
+        # El almacén de embeddings (si se guardó) también se restaura, para poder re-agrupar
+        artefactos = cache_etapas.buscar("diarizacion", contexto["claves"]["diarizacion"]) or {}
+        if ALMACEN_HABLANTES in artefactos:
+            shutil.copyfile(artefactos[ALMACEN_HABLANTES], os.path.join(contexto["carpeta"], ALMACEN_HABLANTES))
+        return contexto
 
     # Realiza diarización (separar intervenciones de diferentes hablantes)
     print("\n🗣️ Ejecutando diarización...")
-    diarization_results = realizar_diarizacion(processed_audio, output_dir=output_dir)
-    print(f"✅ Diarización completada: {diarization_results}")
+    contexto["diarizacion"] = realizar_diarizacion(
+        contexto.get("audio_vad", contexto["audio"]), output_dir=contexto["carpeta"], pipeline=pipeline,
+        por_ventanas=contexto["opciones"].get("ventanas", False)
+    )
+    if "mapa_vad" in contexto:
+        # El JSON queda en la línea de tiempo original; el contexto conserva los tiempos del audio condensado
+        escribir_json(contexto["mapa_vad"].turnos_a_original(contexto["diarizacion"]), destino)
+    if reagrupamiento is not None:
+        try:
+            turnos = reagrupar(contexto["carpeta"], pipeline=pipeline, **reagrupamiento)
+        except (OSError, RuntimeError) as e:
+            print(f"⚠️ No se pudo volver a aplicar el re-agrupamiento guardado: {e}")
+        else:
+            contexto["diarizacion"] = contexto["mapa_vad"].turnos_a_condensado(turnos) if "mapa_vad" in contexto \
+                else turnos
+    print(f"✅ Diarización completada: {len(contexto['diarizacion'])} segmento(s)")
+    if usar_cache:
+        archivos = {"diarization_results.json": destino}
+        almacen = os.path.join(contexto["carpeta"], ALMACEN_HABLANTES)
+        if os.path.exists(almacen):
+            archivos[ALMACEN_HABLANTES] = almacen
+        cache_etapas.guardar("diarizacion", contexto["claves"]["diarizacion"], archivos, parametros, contexto["archivo"])
+    return contexto
+
+def etapa_transcripcion(contexto, asr_pipeline=None):
+    usar_cache = "diarizacion" in contexto.get("claves", {})
+    destino = os.path.join(contexto["carpeta"], "aligned_transcription.json")
+    parametros = parametros_de_etapa("transcripcion", contexto["opciones"], asr_pipeline)
+    entradas = [contexto["claves"].get("preprocesamiento"), contexto["claves"].get("diarizacion")] if usar_cache else []
+    if usar_cache and reutilizar_de_cache(contexto, "transcripcion", entradas, parametros,
+                                          "aligned_transcription.json", destino):
+        actualizar_indice(contexto["carpeta"])
+        return contexto
 
     # Ejecuta transcripción automática del audio procesado
     print("\n✍️ Ejecutando transcripción...")
-    transcribed = transcripcion_de_audio(processed_audio, diarization_results, output_dir=output_dir)
-    print(f"✅ Transcripción completada: {transcribed}")
+    transcribed = transcripcion_de_audio(
+        contexto.get("audio_vad", contexto["audio"]), contexto["diarizacion"], output_dir=contexto["carpeta"],
+        asr_pipeline=asr_pipeline, planificar=contexto["opciones"].get("planificar", True),
+        reanudar=contexto["opciones"].get("reanudar", False), indexar="mapa_vad" not in contexto,
+        metricas=contexto.get("metricas"), backend=contexto["opciones"].get("backend_asr", ASR_BACKEND),
+        larga=contexto["opciones"].get("larga", False), procesos=contexto["opciones"].get("procesos_asr", ASR_PROCESOS)
+    )
+    if "mapa_vad" in contexto:
+        # Los tiempos del audio condensado se llevan a la línea de tiempo original antes de indexar
+        transcribed = contexto["mapa_vad"].turnos_a_original(transcribed)
+        escribir_json(transcribed, destino)
+        actualizar_indice(contexto["carpeta"], transcribed)
+    print(f"✅ Transcripción completada: {len(transcribed)} segmento(s) en {contexto['carpeta']}")
+    if usar_cache:
+        cache_etapas.guardar("transcripcion", contexto["claves"]["transcripcion"], {"aligned_transcription.json": destino},
+                             parametros, contexto["archivo"])
+    return contexto
+
+def con_metricas(nombre, funcion):
+    """
+    Envuelve una etapa para registrar sus métricas (tiempo, CPU, RSS, memoria de torch) en el
+    `MetricasEjecucion` del contexto.
+
+    Args:
+        nombre (str): Nombre de la etapa.
+        funcion (callable): Función de la etapa (recibe el contexto).
+
+    Returns:
+        callable: La etapa instrumentada.
+    """
+    def etapa(contexto, **kwargs):
+        metricas = contexto.setdefault("metricas", MetricasEjecucion(contexto["archivo"]))
+        try:
+            with metricas.etapa(nombre):
+                return funcion(contexto, **kwargs)
+        finally:
+            # En cuanto se conoce el audio se registra su duración (para el factor de tiempo real)
+            if metricas.audio_s is None and "audio" in contexto:
+                metricas.audio_s = duracion_de_audio(contexto["audio"])
+    return etapa
+
+def guardar_metricas(contexto):
+    """Escribe `metrics.json` en la carpeta de resultados del archivo y regresa su resumen."""
+    metricas = contexto.get("metricas")
+    if metricas is None:
+        return None
+    if "carpeta" in contexto:
+        metricas.guardar(contexto["carpeta"])
+    return metricas.resumen()
+
+def procesar_archivo(input_path, pipeline_diarizacion=None, asr_pipeline=None, candados=None, **opciones):
+    """
+    Ejecuta el flujo completo (conversión, preprocesamiento, diarización y transcripción) para un archivo.
+
+    Args:
+        input_path (str): Ruta al archivo de audio o video.
+        pipeline_diarizacion (Pipeline, opcional): Pipeline de pyannote ya cargado.
+        asr_pipeline (Pipeline, opcional): Pipeline ASR ya cargado.
+        candados (dict, opcional): Lock por etapa ("diarizacion", "transcripcion") para que varios hilos que
+            comparten los modelos no los usen al mismo tiempo (modo servicio).
+        **opciones: 
+            en_memoria (bool): Si es True (por defecto), el audio se decodifica una sola vez con ffmpeg y pasa
+                en memoria entre etapas. Si es False, se usa el flujo con archivos intermedios (WAV).
+            guardar_wav (bool): En modo en memoria, guarda también el `*_processed.wav` (por defecto True).
+            por_bloques (bool): El preprocesamiento decodifica y filtra por bloques con memoria constante
+                (para grabaciones de varias horas); tiene prioridad sobre `en_memoria`.
+            usar_cache (bool): Reutiliza resultados del caché de etapas si la entrada, los parámetros y los
+                modelos no cambiaron (por defecto True).
+            planificar (bool): Une micro-turnos y divide turnos largos antes de transcribir (por defecto True).
+            reanudar (bool): Continúa una transcripción interrumpida desde su diario `aligned_transcription.jsonl`.
+            backend_asr (str): Backend de inferencia de Whisper (eager, int8, onnx, compile).
+            vad (bool): Quita los silencios antes de la diarización y la transcripción (los tiempos de los JSON
+                siguen siendo los del audio original).
+            ventanas (bool): Diariza por ventanas sobrepuestas en varios procesos (archivos largos en CPU).
+            larga (bool): Transcribe el audio completo una sola vez y asigna las palabras a los turnos.
+            procesos_asr (int): Con 2 o más, transcribe en ese número de procesos de CPU con su parte de los núcleos.
+            prometheus (str): Si se indica, escribe las métricas por etapa en este archivo de texto de Prometheus.
+
+    Returns:
+        str: Carpeta de salida con los resultados.
+    """
+    candados = candados or {}
+    contexto = {"archivo": input_path, "opciones": opciones, "metricas": MetricasEjecucion(input_path)}
+    try:
+        con_metricas("conversion", etapa_conversion)(contexto)
+        con_metricas("preprocesamiento", etapa_preprocesamiento)(contexto)
+        with candados.get("diarizacion", contextlib.nullcontext()):
+            con_metricas("diarizacion", etapa_diarizacion)(contexto, pipeline=pipeline_diarizacion)
+        with candados.get("transcripcion", contextlib.nullcontext()):
+            con_metricas("transcripcion", etapa_transcripcion)(contexto, asr_pipeline=asr_pipeline)
+    finally:
+        # Las métricas se guardan también si una etapa falla
+        resumen = guardar_metricas(contexto)
+        if opciones.get("prometheus") and resumen is not None:
+            escribir_prometheus([resumen], opciones["prometheus"])
+    print(f"⏱️ Métricas guardadas en '{os.path.join(contexto['carpeta'], 'metrics.json')}'")
+    return contexto["carpeta"]
+
+def cargar_pipeline_asr_principal(opciones):
+    # Con varios procesos de transcripción cada proceso carga su modelo; el principal no necesita uno
+    if opciones.get("procesos_asr", ASR_PROCESOS) > 1 and not opciones.get("larga"):
+        return None
+    return cargar_pipeline_asr(backend=opciones.get("backend_asr", ASR_BACKEND))
+
+def procesar_lote(entradas, concurrencia=None, prometheus=None, **opciones):
+    """
+    Procesa varios archivos cargando los modelos de diarización y transcripción una sola vez.
+
+    Las etapas se ejecutan escalonadas: cada una tiene su propio grupo de hilos y colas acotadas,
+    así que mientras un archivo se transcribe, los siguientes se pueden estar convirtiendo,
+    preprocesando o diarizando.
+
+    Args:
+        entradas (list): Rutas de los archivos de audio/video a procesar.
+        concurrencia (dict, opcional): Hilos por etapa (conversion, preprocesamiento, diarizacion,
+            transcripcion). Por defecto `CONCURRENCIA_ETAPAS`.
+        prometheus (str, opcional): Archivo de texto de Prometheus donde se escriben las métricas por etapa
+            de todos los archivos del lote.
+        **opciones: Opciones adicionales para `procesar_archivo` (en_memoria, guardar_wav, por_bloques, usar_cache,
+            planificar, reanudar).
+
+    Returns:
+        list: Resumen por archivo con su estado ("ok" o "error"), carpeta de salida y duración.
+    """
+    print(f"\n📚 Modo por lotes: {len(entradas)} archivo(s) por procesar")
+    concurrencia = {**CONCURRENCIA_ETAPAS, **(concurrencia or {})}
+
+    # Carga ambos modelos una sola vez para todo el lote
+    print("\n📦 Cargando modelos de diarización y transcripción...")
+    pipeline_diarizacion = cargar_pipeline_diarizacion()
+    asr_pipeline = cargar_pipeline_asr_principal(opciones)
+
+    escalonado = PipelineEscalonado([
+        Etapa("conversion", con_metricas("conversion", etapa_conversion), concurrencia["conversion"]),
+        Etapa("preprocesamiento", con_metricas("preprocesamiento", etapa_preprocesamiento), concurrencia["preprocesamiento"]),
+        Etapa("diarizacion", lambda c: con_metricas("diarizacion", etapa_diarizacion)(c, pipeline=pipeline_diarizacion),
+              concurrencia["diarizacion"]),
+        Etapa("transcripcion", lambda c: con_metricas("transcripcion", etapa_transcripcion)(c, asr_pipeline=asr_pipeline),
+              concurrencia["transcripcion"]),
+    ])
+    metricas_lote = []
+
+    def al_terminar(contexto):
+        # Resume el trabajo y suelta el audio y resultados intermedios para no acumularlos en memoria
+        estado = "error" if "error" in contexto else "ok"
+        marca = "✅" if estado == "ok" else "❌"
+        print(f"{marca} [{estado}] {contexto['archivo']}")
+        resumen = {"archivo": contexto["archivo"], "estado": estado}
+        if estado == "ok":
+            resumen["carpeta"] = contexto["carpeta"]
+        else:
+            resumen["error"] = contexto["error"]
+            resumen["etapa"] = contexto["etapa_con_error"]
+        resumen["segundos"] = round(sum(contexto.get("tiempos", {}).values()), 2)
+        resumen["tiempos"] = contexto.get("tiempos", {})
+        # Un error al escribir metrics.json no debe impedir que el trabajo quede resumido y liberado
+        try:
+            metricas = guardar_metricas(contexto)
+        except OSError as e:
+            print(f"⚠️ No se pudieron guardar las métricas de {contexto['archivo']}: {e}")
+            metricas = None
+        if metricas is not None:
+            metricas_lote.append(metricas)
+        contexto.clear()
+        contexto.update(resumen)
+
+    contextos = [{"archivo": entrada, "opciones": opciones} for entrada in entradas]
+    resumen = escalonado.ejecutar(contextos, al_terminar=al_terminar)
+
+    # Guarda el resumen del lote junto a las carpetas de resultados
+    os.makedirs(RESULTADOS_DIR, exist_ok=True)
+    resumen_path = os.path.join(RESULTADOS_DIR, "resumen_lote.json")
+    with open(resumen_path, "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=4)
+
+    exitosos = sum(1 for r in resumen if r.get("estado") == "ok")
+    print(f"\n📊 Lote terminado en {escalonado.duracion_s:.1f} s: {exitosos} correcto(s), {len(resumen) - exitosos} con error")
+    for r in resumen:
+        marca = "✅" if r.get("estado") == "ok" else "❌"
+        print(f"  {marca} {r['archivo']} ({r.get('segundos', 0)} s)")
+    print(f"📝 Resumen guardado en '{resumen_path}'")
+
+    # Reporta y guarda la utilización de cada etapa
+    utilizacion = escalonado.utilizacion()
+    print("\n⏱️ Utilización por etapa:")
+    for u in utilizacion:
+        print(f"  {u['etapa']:<17} hilos={u['hilos']}  archivos={u['procesados']}  "
+              f"ocupado={u['ocupado_s']} s  promedio={u['promedio_s']} s  utilización={u['utilizacion']:.0%}")
+    utilizacion_path = os.path.join(RESULTADOS_DIR, "utilizacion_etapas.json")
+    with open(utilizacion_path, "w", encoding="utf-8") as f:
+        json.dump({"duracion_s": round(escalonado.duracion_s, 2), "etapas": utilizacion}, f, ensure_ascii=False, indent=4)
+    if prometheus:
+        escribir_prometheus(metricas_lote, prometheus)
+        print(f"📈 Métricas de Prometheus guardadas en '{prometheus}'")
+    return resumen
+
+def validar_entrada(input_path):
+    """Lanza ValueError si el archivo no es audio ni video soportado."""
+    if not (es_video(input_path) or es_audio(input_path)):
+        raise ValueError(f"Archivo no es audio ni video válido: {input_path}")
+
+def iniciar_servicio(host, puerto, socket_unix=None, concurrencia=1, **opciones):
+    """
+    Modo servicio: carga los modelos una sola vez y atiende trabajos por HTTP local o socket Unix.
+
+    Args:
+        host (str): Interfaz TCP.
+        puerto (int): Puerto TCP.
+        socket_unix (str, opcional): Ruta de un socket Unix (en lugar de TCP).
+        concurrencia (int): Trabajos procesados al mismo tiempo. Con más de uno, la conversión y el
+            preprocesamiento de un trabajo se traslapan con la inferencia de otro; cada modelo lo usa
+            un solo trabajo a la vez.
+        **opciones: Opciones por defecto de los trabajos (cada trabajo puede cambiarlas).
+    """
+    from funciones.servicio import ServicioTranscripcion, ejecutar_servicio
+
+    print("\n📦 Cargando modelos de diarización y transcripción...")
+    pipeline_diarizacion = cargar_pipeline_diarizacion()
+    asr_pipeline = cargar_pipeline_asr_principal(opciones)
+    candados = {"diarizacion": threading.Lock(), "transcripcion": threading.Lock()}
+
+    def procesar(archivo, **opciones_trabajo):
+        return procesar_archivo(archivo, pipeline_diarizacion, asr_pipeline, candados=candados,
+                                **{**opciones, **opciones_trabajo})
+
+    servicio = ServicioTranscripcion(procesar, concurrencia=concurrencia, validar=validar_entrada)
+    ejecutar_servicio(servicio, host=host, puerto=puerto, socket_unix=socket_unix)
+
+def parsear_concurrencia(texto):
+    """
+    Convierte "conversion=2,diarizacion=1" en {"conversion": 2, "diarizacion": 1}.
+
+    Args:
+        texto (str): Pares etapa=hilos separados por comas.
+
+    Returns:
+        dict: Hilos por etapa.
+    """
+    concurrencia = {}
+    for par in filter(None, (p.strip() for p in texto.split(","))):
+        etapa, _, hilos = par.partition("=")
+        if etapa not in CONCURRENCIA_ETAPAS or not hilos.isdigit() or int(hilos) < 1:
+            raise argparse.ArgumentTypeError(
+                f"Concurrencia inválida '{par}'. Etapas válidas: {', '.join(CONCURRENCIA_ETAPAS)}"
+            )
+        concurrencia[etapa] = int(hilos)
+    return concurrencia
+
+# Construye el parser de argumentos de línea de comandos
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="Procesa audio/video: preprocesamiento, diarización y transcripción.",
+        usage="python post_partum.py <archivo_audio_o_video | carpeta | manifiesto.txt> [opciones]"
+    )
+    parser.add_argument("entrada", nargs="?", help="Archivo de audio/video, carpeta o manifiesto (.txt/.lst)")
+    parser.add_argument("--intermedios-en-disco", action="store_true",
+                        help="Usa el flujo con archivos intermedios (video→WAV→preprocesado) en lugar de pasar el audio en memoria")
+    parser.add_argument("--sin-wav-procesado", action="store_true",
+                        help="No guarda el *_processed.wav (solo en el modo en memoria)")
+    parser.add_argument("--por-bloques", action="store_true",
+                        help="Preprocesa por bloques con memoria constante (grabaciones de varias horas)")
+    parser.add_argument("--sin-cache", action="store_true",
+                        help="No reutiliza ni guarda resultados en el caché de etapas")
+    parser.add_argument("--sin-planificador", action="store_true",
+                        help="Transcribe cada turno de la diarización por separado (sin unir micro-turnos ni dividir turnos largos)")
+    parser.add_argument("--vad", action="store_true",
+                        help="Quita los silencios (detección de voz por energía) antes de la diarización y la transcripción")
+    parser.add_argument("--diarizacion-por-ventanas", action="store_true",
+                        help="Diariza por ventanas sobrepuestas en varios procesos y une los hablantes con un agrupamiento global (CPU, archivos largos)")
+    parser.add_argument("--transcripcion-larga", action="store_true",
+                        help="Transcribe el audio completo una sola vez con tiempos por palabra y asigna las palabras a los turnos")
+    parser.add_argument("--reanudar", action="store_true",
+                        help="Continúa una transcripción interrumpida saltando los segmentos ya guardados en aligned_transcription.jsonl")
+    parser.add_argument("--metricas-prometheus", metavar="ARCHIVO", default=os.getenv("METRICAS_PROMETHEUS"),
+                        help="Escribe las métricas por etapa en un archivo de texto de Prometheus (textfile collector)")
+    parser.add_argument("--backend-asr", choices=BACKENDS_ASR, default=ASR_BACKEND,
+                        help="Backend de inferencia de Whisper: eager (PyTorch), int8, onnx o compile (CPU). "
+                             "Ver scripts/validar_backends_asr.py")
+    parser.add_argument("--procesos-asr", type=int, default=ASR_PROCESOS, metavar="N",
+                        help="Transcribe en N procesos de CPU, cada uno con su copia del modelo y su parte de los núcleos")
+    parser.add_argument("--servicio", action="store_true",
+                        help="Inicia el modo servicio: modelos precargados y cola de trabajos por HTTP local o socket Unix")
+    parser.add_argument("--host", default="127.0.0.1", help="Interfaz del modo servicio (por defecto solo local)")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto del modo servicio")
+    parser.add_argument("--socket", default=None, help="Atiende el modo servicio en este socket Unix en lugar de TCP")
+    parser.add_argument("--trabajos-simultaneos", type=int, default=1,
+                        help="Trabajos que el modo servicio procesa al mismo tiempo")
+    parser.add_argument("--concurrencia", type=parsear_concurrencia, default={},
+                        help="Hilos por etapa en modo por lotes, p. ej. conversion=4,preprocesamiento=2,diarizacion=1,transcripcion=1")
+    return parser
+
+# Función principal del script
+def main():
+    print_banner()
+
+    parser = crear_parser()
+    args = parser.parse_args()
+
+    input_path = args.entrada
+    opciones = {
+        "en_memoria": not args.intermedios_en_disco,
+        "guardar_wav": not args.sin_wav_procesado,
+        "por_bloques": args.por_bloques,
+        "usar_cache": not args.sin_cache,
+        "planificar": not args.sin_planificador,
+        "reanudar": args.reanudar,
+        "prometheus": args.metricas_prometheus,
+        "backend_asr": args.backend_asr,
+        "larga": args.transcripcion_larga,
+        "ventanas": args.diarizacion_por_ventanas,
+        "vad": args.vad,
+        "procesos_asr": args.procesos_asr,
+    }
+
+    # Modo servicio: no recibe archivo, los trabajos llegan por HTTP o socket Unix
+    if args.servicio:
+        iniciar_servicio(args.host, args.puerto, socket_unix=args.socket,
+                         concurrencia=args.trabajos_simultaneos, **opciones)
+        return
+
+    # Verifica que se haya pasado un argumento (el archivo a procesar)
+    if input_path is None:
+        print("Uso: python post_partum.py <archivo_audio_o_video | carpeta | manifiesto.txt> [opciones]")
+        print("Ejemplo: python post_partum.py entrevista.mp3")
+        print("Ejemplo (lote): python post_partum.py grabaciones/")
+        print("Ejemplo (servicio): python post_partum.py --servicio")
+        print("Opciones: python post_partum.py --help")
+        sys.exit(1)
+
+    # Checa si el archivo existe
+    if not os.path.exists(input_path):
+        print(f"❌ Archivo no encontrado: {input_path}")
+        sys.exit(1)
+
+    # Una carpeta o un manifiesto activan el modo por lotes
+    if os.path.isdir(input_path) or es_manifiesto(input_path):
+        entradas = listar_entradas_de_lote(input_path)
+        if not entradas:
+            print("❌ No se encontraron archivos de audio o video para procesar.")
+            sys.exit(1)
+        resumen = procesar_lote(entradas, concurrencia=args.concurrencia, **opciones)
+        # Regresa código de error si algún archivo falló
+        if any(r.get("estado") != "ok" for r in resumen):
+            sys.exit(2)
+        print("\n🎉 ¡Proceso finalizado! Todos los resultados están en la carpeta indicada.\n")
+        return
+
+    try:
+        procesar_archivo(input_path, **opciones)
+    except (FileNotFoundError, ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
 
     # Mensaje de éxito final
     print("\n🎉 ¡Proceso finalizado! Todos los resultados están en la carpeta indicada.\n")
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from types import SimpleNamespace
+from datetime import datetime
+
+import numpy as np
+import soundfile as sf
+import torch
+from transformers import WhisperFeatureExtractor
+
+# Permite importar el paquete 'funciones' al ejecutar el script desde cualquier carpeta
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from funciones.audio_en_memoria import AudioEnMemoria
+from funciones.instrumentacion import MetricasEjecucion
+from funciones.procesamiento_de_audio import _ecualizar_y_normalizar, procesamiento_de_audio
+from funciones.diarizacion import realizar_diarizacion
+from funciones.segmentacion import planificar_segmentos
+from funciones.transcripcion import abrir_audio, extraer_segmentos, transcripcion_de_audio
+from funciones import indice_corpus
+
+SAMPLE_RATE = 16000
+BENCHMARKS_DIR = os.path.join("resultados", "benchmarks")
+
+# --- Audio sintético ---
+
+def generar_audio_sintetico(duracion_s, hablantes=2, sample_rate=SAMPLE_RATE, semilla=0):
+    """
+    Genera una "entrevista" sintética: turnos de varios hablantes (tonos armónicos con modulación
+    silábica y ruido), con micro-turnos, turnos largos y pausas, como en las grabaciones reales.
+
+    Returns:
+        tuple: (audio float32, turnos [{"start_time", "end_time", "speaker"}]).
+    """
+    rng = np.random.default_rng(semilla)
+    audio = np.zeros(int(duracion_s * sample_rate), dtype=np.float32)
+    f0s = np.linspace(110, 240, hablantes)
+    turnos = []
+    t, hablante = 0.0, 0
+    while t < duracion_s - 0.2:
+        # Mezcla de micro-turnos (<1 s), turnos normales y turnos de más de 30 s
+        tipo = rng.choice(3, p=[0.3, 0.55, 0.15])
+        largo = [rng.uniform(0.2, 0.8), rng.uniform(1.0, 8.0), rng.uniform(10.0, 45.0)][tipo]
+        fin = min(t + largo, duracion_s)
+        i0, i1 = int(t * sample_rate), int(fin * sample_rate)
+        tt = np.arange(i1 - i0, dtype=np.float32) / sample_rate
+        voz = sum(np.sin(2 * np.pi * k * f0s[hablante] * tt) / k for k in range(1, 9))
+        voz *= 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * tt)  # ~4 sílabas por segundo
+        audio[i0:i1] = 0.1 * voz + 0.01 * rng.standard_normal(i1 - i0)
+        turnos.append({"start_time": round(t, 2), "end_time": round(fin, 2), "speaker": f"SPEAKER_{hablante:02d}"})
+
+        t = fin + rng.uniform(0.05, 1.2)
+        if rng.random() > 0.35:  # A veces el mismo hablante sigue después de una pausa
+            hablante = (hablante + 1 + rng.integers(hablantes - 1)) % hablantes if hablantes > 1 else 0
+    return audio, turnos
+
+# --- Modelos simulados (deterministas, sin descargas, en CPU) ---
+
+class DiarizacionSimulada:
+    """Sustituto del pipeline de pyannote: regresa los turnos verdaderos del audio sintético."""
+
+    def __init__(self, turnos):
+        self.turnos = turnos
+
+    def __call__(self, entrada, hook=None, return_embeddings=False):
+        # Misma interfaz que `realizar_diarizacion` espera de pyannote; el hook no recibe capturas, así
+        # que no se escribe el almacén de embeddings
+        if return_embeddings:
+            return self, np.eye(len(self.labels()), dtype=np.float32)
+        return self
+
+    def labels(self):
+        return sorted({t["speaker"] for t in self.turnos})
+
+    def itertracks(self, yield_label=True):
+        for t in self.turnos:
+            yield SimpleNamespace(start=t["start_time"], end=t["end_time"]), None, t["speaker"]
+
+class _ModeloSimulado:
+    """Sustituto de Whisper: `generate` regresa tokens que dependen (de forma determinista) de las features."""
+    device = torch.device("cpu")
+    dtype = torch.float32
+    name_or_path = "modelo-simulado"
+
+    def generate(self, features):
+        # Trabajo determinista proporcional al lote (como el encoder, que siempre ve 30 s)
+        energia = features.mean(dim=1)
+        tokens = (energia > energia.mean()).sum(dim=1)
+        return [torch.arange(int(n) % 50 + 1) for n in tokens.tolist()]
+
+class _TokenizadorSimulado:
+    def batch_decode(self, ids, skip_special_tokens=True):
+        return [f"Segmento de {len(fila)} tokens" for fila in ids]
+
+class AsrSimulado:
+    """
+    Sustituto del pipeline ASR con la interfaz que usa `transcribir_por_lotes`: extractor de
+    features real de Whisper (configuración por defecto, sin descargas), modelo y tokenizador
+    simulados, y llamada por chunks de 30 s para segmentos largos.
+    """
+
+    def __init__(self):
+        self.model = _ModeloSimulado()
+        self.feature_extractor = WhisperFeatureExtractor()
+        self.tokenizer = _TokenizadorSimulado()
+
+    def __call__(self, entrada):
+        audio, sr = entrada["raw"], entrada["sampling_rate"]
+        ventana, paso = 30 * sr, 25 * sr
+        chunks = [audio[i:i + ventana] for i in range(0, max(len(audio) - 5 * sr, 1), paso)]
+        features = self.feature_extractor(chunks, sampling_rate=sr, return_tensors="pt").input_features
+        return {"text": " ".join(self.tokenizer.batch_decode(self.model.generate(features)))}
+
+# --- Medición ---
+
+def medir(nombre, audio_s, funcion, repeticiones=1):
+    """
+    Ejecuta una etapa con la instrumentación del pipeline y se queda con la repetición más rápida.
+
+    Returns:
+        tuple: (resultado de la última repetición, métricas de la etapa).
+    """
+    metricas = MetricasEjecucion()
+    metricas.audio_s = audio_s
+    for _ in range(repeticiones):
+        with metricas.etapa(nombre):
+            resultado = funcion()
+    mejor = min(metricas.resumen()["etapas"], key=lambda e: e["pared_s"])
+    mejor["x_tiempo_real"] = round(audio_s / mejor["pared_s"], 1) if mejor["pared_s"] else None
+    return resultado, mejor
+
+def _commit_actual():
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True, check=True)
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- Suite ---
+
+def ejecutar_benchmark(duracion_s=600, hablantes=2, repeticiones=1, semilla=0, planificar=True, carpeta=None):
+    """
+    Ejecuta todas las etapas sobre audio sintético con modelos simulados.
+
+    Returns:
+        dict: Metadatos de la corrida y métricas por etapa.
+    """
+    carpeta = carpeta or tempfile.mkdtemp(prefix="benchmark_etapas_")
+    os.makedirs(carpeta, exist_ok=True)
+    etapas = []
+
+    audio, turnos = generar_audio_sintetico(duracion_s, hablantes, semilla=semilla)
+    duracion = len(audio) / SAMPLE_RATE
+    entrada_wav = os.path.join(carpeta, "sintetico.wav")
+    original = AudioEnMemoria(datos=audio, sample_rate=SAMPLE_RATE, origen=entrada_wav)
+
+    _, m = medir("escritura_wav", duracion, lambda: sf.write(entrada_wav, audio, SAMPLE_RATE, subtype="PCM_16"), repeticiones)
+    etapas.append(m)
+    _, m = medir("ecualizacion", duracion, lambda: _ecualizar_y_normalizar(audio, SAMPLE_RATE), repeticiones)
+    etapas.append(m)
+    procesado, m = medir("preprocesamiento_memoria", duracion,
+                         lambda: procesamiento_de_audio(original, output_dir=carpeta, guardar_wav=True), repeticiones)
+    etapas.append(m)
+    _, m = medir("preprocesamiento_disco", duracion,
+                 lambda: procesamiento_de_audio(entrada_wav, output_dir=os.path.join(carpeta, "disco")), repeticiones)
+    etapas.append(m)
+
+    diarizacion, m = medir("diarizacion", duracion,
+                           lambda: realizar_diarizacion(procesado, output_dir=carpeta, pipeline=DiarizacionSimulada(turnos)),
+                           repeticiones)
+    etapas.append(m)
+
+    def segmentar():
+        muestras, sr, convertir = abrir_audio(procesado.ruta)
+        segmentos = diarizacion
+        if planificar:
+            segmentos, _ = planificar_segmentos(diarizacion, muestras, sr, convertir)
+        return extraer_segmentos(muestras, sr, segmentos)
+    segmentos_audio, m = medir("segmentacion", duracion, segmentar, repeticiones)
+    m["segmentos"] = len(segmentos_audio)
+    etapas.append(m)
+
+    asr = AsrSimulado()
+    transcritos, m = medir("transcripcion", duracion,
+                           lambda: transcripcion_de_audio(procesado.ruta, [dict(t) for t in diarizacion], output_dir=carpeta,
+                                                          asr_pipeline=asr, planificar=planificar, indexar=False),
+                           repeticiones)
+    m["segmentos"] = len(transcritos)
+    etapas.append(m)
+
+    db = os.path.join(carpeta, "corpus.sqlite")
+    _, m = medir("indice_corpus", duracion,
+                 lambda: indice_corpus.indexar_transcripcion(carpeta, transcritos, db=db), repeticiones)
+    etapas.append(m)
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": {"duracion_s": duracion_s, "hablantes": hablantes, "repeticiones": repeticiones,
+                       "semilla": semilla, "planificar": planificar, "turnos": len(turnos)},
+        "etapas": etapas,
+    }
+
+def imprimir(reporte, base=None):
+    anteriores = {e["etapa"]: e for e in base["etapas"]} if base else {}
+    print(f"\n{'etapa':<26} {'pared s':>9} {'cpu s':>9} {'RTF':>9} {'x t.real':>9} {'RSS pico':>9} {'Δ RSS':>8}"
+          + ("  vs base" if base else ""))
+    for e in reporte["etapas"]:
+        linea = (f"{e['etapa']:<26} {e['pared_s']:>9.3f} {e['cpu_s']:>9.3f} {e['rtf']:>9.4f} "
+                 f"{e['x_tiempo_real'] or 0:>9.1f} {e['rss_pico_mb']:>8.1f}M {e['rss_delta_mb']:>7.1f}M")
+        anterior = anteriores.get(e["etapa"])
+        if anterior and anterior["pared_s"]:
+            linea += f"  {e['pared_s'] / anterior['pared_s']:>6.2f}x"
+        print(linea)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark de las etapas del pipeline con audio sintético y modelos simulados (offline, CPU)"
+    )
+    parser.add_argument("--duracion", type=float, default=600, help="Duración del audio sintético en segundos")
+    parser.add_argument("--hablantes", type=int, default=2, help="Número de hablantes")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Repeticiones por etapa (se reporta la más rápida)")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del audio sintético")
+    parser.add_argument("--sin-planificador", action="store_true", help="Transcribe cada turno por separado")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados (por defecto en resultados/benchmarks/)")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior para comparar tiempos")
+    parser.add_argument("--conservar", action="store_true", help="No borra la carpeta temporal con los artefactos")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="benchmark_etapas_")
+    try:
+        reporte = ejecutar_benchmark(args.duracion, args.hablantes, args.repeticiones, args.semilla,
+                                     planificar=not args.sin_planificador, carpeta=carpeta)
+    finally:
+        if args.conservar:
+            print(f"📁 Artefactos en {carpeta}")
+        else:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir(reporte, base)
+
+    salida = args.salida or os.path.join(
+        BENCHMARKS_DIR, f"benchmark_{reporte['commit'] or 'sin-commit'}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=4)
+    print(f"\n💾 Resultados guardados en {salida}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+
+# Permite importar el paquete 'funciones' al ejecutar el script desde cualquier carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funciones import cache_etapas
+
+def listar():
+    entradas = cache_etapas.listar_entradas()
+    if not entradas:
+        print(f"🗂️ El caché de etapas está vacío ({cache_etapas.CACHE_ETAPAS_DIR})")
+        return
+    print(f"🗂️ Caché de etapas: {cache_etapas.CACHE_ETAPAS_DIR}\n")
+    print(f"{'etapa':<17} {'clave':<14} {'MB':>8}  {'último uso':<16}  {'estado':<8} origen")
+    for e in entradas:
+        uso = datetime.fromtimestamp(e["ultimo_uso"]).strftime("%Y-%m-%d %H:%M") if e["ultimo_uso"] else "-"
+        estado = "válida" if e["valida"] else "inválida"
+        print(f"{e['etapa']:<17} {e['clave'][:12]:<14} {e['bytes'] / 1024 / 1024:>8.1f}  {uso:<16}  {estado:<8} {e['origen'] or '-'}")
+    total = sum(e["bytes"] for e in entradas) / 1024 / 1024
+    print(f"\n📊 {len(entradas)} entrada(s), {total:.1f} MB")
+
+def limpiar(max_dias, max_mb):
+    borradas = cache_etapas.limpiar(max_dias=max_dias, max_mb=max_mb)
+    liberado = sum(e["bytes"] for e in borradas) / 1024 / 1024
+    for e in borradas:
+        print(f"🗑️ {e['etapa']} {e['clave'][:12]} ({e['origen'] or '-'})")
+    print(f"✅ {len(borradas)} entrada(s) borrada(s), {liberado:.1f} MB liberados")
+
+def main():
+    parser = argparse.ArgumentParser(description="Lista o limpia el caché de etapas de post_partum.py")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("listar", help="Lista las entradas del caché")
+    p_limpiar = sub.add_parser("limpiar", help="Borra entradas inválidas, antiguas o que exceden el tamaño máximo")
+    p_limpiar.add_argument("--dias", type=float, default=None, help="Borra entradas sin usar en más de N días")
+    p_limpiar.add_argument("--max-mb", type=float, default=None, help="Tamaño máximo del caché (borra las menos usadas)")
+    args = parser.parse_args()
+
+    if args.comando == "listar":
+        listar()
+    else:
+        limpiar(args.dias, args.max_mb)
+
+if __name__ == "__main__":
+    main()
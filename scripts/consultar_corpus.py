@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import argparse
+
+# Permite importar el paquete 'funciones' al ejecutar el script desde cualquier carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funciones import indice_corpus
+
+def buscar(args):
+    inicio = time.perf_counter()
+    resultados = indice_corpus.buscar(
+        texto=args.texto, hablante=args.hablante, archivo=args.archivo,
+        desde=args.desde, hasta=args.hasta, limite=args.limite
+    )
+    ms = (time.perf_counter() - inicio) * 1000
+    for r in resultados:
+        print(f"{r['archivo']:<30} {r['inicio']:>8.1f}-{r['fin']:<8.1f} {r['hablante']:<11} {r['texto']}")
+    print(f"\n📊 {len(resultados)} segmento(s) en {ms:.1f} ms")
+
+def reindexar(args):
+    resumen = indice_corpus.reindexar(args.carpeta, forzar=args.forzar)
+    print(f"✅ Índice actualizado ({indice_corpus.CORPUS_DB}): {resumen['indexadas']} indexada(s), "
+          f"{resumen['sin_cambios']} sin cambios, {resumen['eliminadas']} eliminada(s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca en las transcripciones de todas las carpetas de resultados")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_buscar = sub.add_parser("buscar", help="Busca segmentos por texto, hablante, archivo y rango de tiempo")
+    p_buscar.add_argument("--texto", help='Palabras que deben aparecer (sin distinguir acentos; "lact*" busca por prefijo)')
+    p_buscar.add_argument("--hablante", help="Hablante, p. ej. SPEAKER_01")
+    p_buscar.add_argument("--archivo", help="Parte del nombre del archivo procesado")
+    p_buscar.add_argument("--desde", type=float, default=None, help="Segundo inicial del rango de tiempo")
+    p_buscar.add_argument("--hasta", type=float, default=None, help="Segundo final del rango de tiempo")
+    p_buscar.add_argument("--limite", type=int, default=100, help="Número máximo de resultados")
+    p_reindexar = sub.add_parser("reindexar", help="Sincroniza el índice con las carpetas de resultados")
+    p_reindexar.add_argument("carpeta", nargs="?", default="resultados", help="Carpeta de resultados")
+    p_reindexar.add_argument("--forzar", action="store_true", help="Re-indexa todas las transcripciones")
+    args = parser.parse_args()
+
+    if args.comando == "buscar":
+        buscar(args)
+    else:
+        reindexar(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Caché compacto del dataset para el fine-tuning de Whisper.
+#
+# En lugar de guardar los `input_features` (80 x 3000 float32 = 960 KB por muestra, sin importar la
+# duración), se guarda el audio decodificado en float16 (32 KB por segundo) en shards mapeables en
+# memoria, junto con los tokens de la transcripción. La aumentación y la extracción de features se
+# hacen en cada época dentro de los procesos del DataLoader, así que cada época ve aumentaciones distintas.
+
+SAMPLE_RATE = 16000
+MAX_TOKENS = 400          # Las muestras con transcripciones más largas se descartan (igual que antes)
+CACHE_DIR = os.getenv("FINETUNING_CACHE_DIR", "./preprocessed_shards")  # Carpeta por defecto del caché
+TOKENIZADOR = "RebecaLeyva/STT-ParraPostPartum-v1"  # Tokenizador con el que se decodifican las referencias
+
+def _escribir_shard(args):
+    """Decodifica y tokeniza un shard del dataset y lo escribe en disco. Se ejecuta en un proceso aparte."""
+    dataset, tokenizer, carpeta, nombre = args
+    ruta_audio = os.path.join(carpeta, f"{nombre}.audio.f16")
+    posiciones, etiquetas, longitudes_etiquetas = [], [], []
+    descartadas = 0
+    offset = 0
+    with open(ruta_audio, "wb") as f:
+        for ejemplo in dataset:
+            ids = tokenizer(ejemplo["transcription"]).input_ids
+            if len(ids) > MAX_TOKENS:
+                descartadas += 1
+                continue
+            audio = np.asarray(ejemplo["audio"]["array"], dtype=np.float16)
+            f.write(audio.tobytes())
+            posiciones.append((offset, len(audio)))
+            offset += len(audio)
+            etiquetas.extend(ids)
+            longitudes_etiquetas.append(len(ids))
+
+    np.save(os.path.join(carpeta, f"{nombre}.indice.npy"), np.array(posiciones, dtype=np.int64).reshape(-1, 2))
+    np.save(os.path.join(carpeta, f"{nombre}.etiquetas.npy"), np.array(etiquetas, dtype=np.int32))
+    np.save(os.path.join(carpeta, f"{nombre}.longitudes.npy"), np.array(longitudes_etiquetas, dtype=np.int32))
+    return {"nombre": nombre, "muestras": len(posiciones), "descartadas": descartadas, "segundos": offset / SAMPLE_RATE}
+
+def preparar_cache(dataset_dict, tokenizer, carpeta, procesos=None, muestras_por_shard=2000):
+    """
+    Escribe el caché de shards de cada split con varios procesos en paralelo.
+
+    Args:
+        dataset_dict (DatasetDict): Dataset con columnas "audio" y "transcription".
+        tokenizer (WhisperTokenizer): Tokenizador para las etiquetas.
+        carpeta (str): Carpeta del caché.
+        procesos (int, opcional): Procesos de preprocesamiento (por defecto, todos los núcleos).
+        muestras_por_shard (int): Muestras aproximadas por shard.
+
+    Returns:
+        dict: Manifiesto del caché (también se guarda en `manifiesto.json`).
+    """
+    from datasets import Audio
+
+    procesos = procesos or os.cpu_count() or 1
+    os.makedirs(carpeta, exist_ok=True)
+    manifiesto = {"sample_rate": SAMPLE_RATE, "max_tokens": MAX_TOKENS, "splits": {}}
+    for split, dataset in dataset_dict.items():
+        dataset = dataset.cast_column("audio", Audio(sampling_rate=SAMPLE_RATE))
+        n_shards = max(1, -(-len(dataset) // muestras_por_shard))
+        tareas = [(dataset.shard(num_shards=n_shards, index=i, contiguous=True), tokenizer, carpeta, f"{split}-{i:05d}")
+                  for i in range(n_shards)]
+        print(f"⚙️ Preparando '{split}': {len(dataset)} muestra(s) en {n_shards} shard(s) con {procesos} proceso(s)...")
+        with ProcessPoolExecutor(max_workers=min(procesos, n_shards)) as pool:
+            shards = list(pool.map(_escribir_shard, tareas))
+        manifiesto["splits"][split] = shards
+        print(f"✅ '{split}': {sum(s['muestras'] for s in shards)} muestra(s), "
+              f"{sum(s['segundos'] for s in shards) / 3600:.1f} h, {sum(s['descartadas'] for s in shards)} descartada(s)")
+
+    # El manifiesto se escribe al final: si existe, el caché está completo
+    with open(os.path.join(carpeta, "manifiesto.json"), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=4)
+    return manifiesto
+
+def cache_completo(carpeta):
+    return os.path.exists(os.path.join(carpeta, "manifiesto.json"))
+
+def crear_aumentador():
+    """Aumentaciones de audio del fine-tuning (ruido, velocidad, tono y desplazamiento)."""
+    from audiomentations import Compose, AddGaussianNoise, TimeStretch, PitchShift, Shift
+    return Compose([
+        AddGaussianNoise(min_amplitude=0.001, max_amplitude=0.015, p=0.5),
+        TimeStretch(min_rate=0.85, max_rate=1.15, p=0.4),
+        PitchShift(min_semitones=-2, max_semitones=2, p=0.4),
+        Shift(min_shift=-0.1, max_shift=0.1, shift_unit="fraction", rollover=False, fade_duration=0.005, p=0.4),
+    ])
+
+def cargar_referencias(dataset, carpeta, split, tokenizador=TOKENIZADOR):
+    """
+    Texto de referencia de cada muestra del split. Se decodifica una sola vez desde los tokens del caché y
+    se guarda en `referencias_<split>.json` junto a los shards.
+    """
+    ruta = os.path.join(carpeta, f"referencias_{split}.json")
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        if datos["tokenizador"] == tokenizador and len(datos["textos"]) == len(dataset):
+            return datos["textos"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    from transformers import WhisperTokenizer
+    tokenizer = WhisperTokenizer.from_pretrained(tokenizador, language="Spanish", task="transcribe")
+    etiquetas = [dataset.audio_y_etiquetas(i)[1] for i in range(len(dataset))]
+    textos = [t.strip().lower() for t in tokenizer.batch_decode(etiquetas, skip_special_tokens=True)]
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"tokenizador": tokenizador, "textos": textos}, f, ensure_ascii=False)
+    print(f"💾 Referencias de '{split}' guardadas en '{ruta}'")
+    return textos
+
+try:
+    from torch.utils.data import Dataset as _DatasetTorch
+except ImportError:  # Solo se necesita torch para entrenar, no para preparar el caché
+    _DatasetTorch = object
+
+class DatasetWhisper(_DatasetTorch):
+    """
+    Dataset de PyTorch sobre los shards del caché.
+
+    Cada muestra se lee del memmap float16, se aumenta (si `aumentar`) y se convierte a log-mel en el
+    proceso del DataLoader que la pide. Los memmaps se abren la primera vez que cada proceso los usa.
+    """
+
+    def __init__(self, carpeta, split, feature_extractor=None, aumentar=False):
+        with open(os.path.join(carpeta, "manifiesto.json"), "r", encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        self.carpeta = carpeta
+        self.shards = [s["nombre"] for s in manifiesto["splits"][split]]
+        self.sample_rate = manifiesto["sample_rate"]
+        self.acumulado = np.cumsum([0] + [s["muestras"] for s in manifiesto["splits"][split]])
+        self.feature_extractor = feature_extractor
+        self.aumentar = aumentar
+        self._abiertos = {}
+        self._aumentador = None
+
+    def __len__(self):
+        return int(self.acumulado[-1])
+
+    def __getstate__(self):
+        # Los memmaps y el aumentador no se copian a los procesos del DataLoader; cada uno abre los suyos
+        estado = dict(self.__dict__)
+        estado["_abiertos"], estado["_aumentador"] = {}, None
+        return estado
+
+    def _shard(self, k):
+        if k not in self._abiertos:
+            nombre = os.path.join(self.carpeta, self.shards[k])
+            indice = np.load(f"{nombre}.indice.npy")
+            longitudes = np.load(f"{nombre}.longitudes.npy")
+            audio = np.memmap(f"{nombre}.audio.f16", dtype=np.float16, mode="r") if len(indice) else np.zeros(0, np.float16)
+            etiquetas = np.load(f"{nombre}.etiquetas.npy", mmap_mode="r")
+            self._abiertos[k] = (audio, indice, etiquetas, np.concatenate(([0], np.cumsum(longitudes))))
+        return self._abiertos[k]
+
+    def audio_y_etiquetas(self, i):
+        """Audio (float32, sin aumentar) y tokens de la transcripción de la muestra `i`."""
+        k = int(np.searchsorted(self.acumulado, i, side="right")) - 1
+        audio, indice, etiquetas, offsets = self._shard(k)
+        j = i - int(self.acumulado[k])
+        inicio, n = indice[j]
+        return np.asarray(audio[inicio:inicio + n], dtype=np.float32), etiquetas[offsets[j]:offsets[j + 1]].tolist()
+
+    def __getitem__(self, i):
+        muestras, etiquetas = self.audio_y_etiquetas(i)
+        if self.aumentar:
+            if self._aumentador is None:
+                self._aumentador = crear_aumentador()
+            muestras = self._aumentador(samples=muestras, sample_rate=self.sample_rate)
+        features = self.feature_extractor(muestras, sampling_rate=self.sample_rate).input_features[0]
+        return {"input_features": features, "labels": etiquetas}
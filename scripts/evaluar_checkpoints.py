@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+
+# Permite importar el paquete 'funciones' al ejecutar el script desde cualquier carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funciones.entorno import cargar_entorno
+cargar_entorno()
+
+from funciones.backends_asr import BACKENDS_ASR, ASR_BACKEND
+from funciones.gobernador_memoria import GobernadorLotes
+from funciones.instrumentacion import MetricasEjecucion
+from funciones.modelos import obtener_registro
+from funciones.transcripcion import cargar_pipeline_asr, MODEL_PATH
+from funciones.transcripcion_por_lotes import transcribir_por_lotes, ASR_BATCH_SIZE, ASR_MAX_RELLENO
+from datos_whisper import DatasetWhisper, CACHE_DIR, cache_completo, cargar_referencias
+
+# Carpeta donde se guarda la tabla de resultados
+EVALUACION_DIR = os.getenv("EVALUACION_DIR", os.path.join("resultados", ".evaluacion"))
+PERCENTILES = (50, 90, 99)
+
+def evaluar(audios, referencias, asr_pipeline, generate_kwargs, batch_size, max_relleno, sample_rate=16000):
+    """
+    Transcribe el conjunto con `transcribir_por_lotes` (el mismo camino que `transcripcion_de_audio`) y mide
+    precisión y rendimiento.
+
+    Returns:
+        dict: WER y CER (%), latencia por lote (percentiles, s), segundos totales y factor de tiempo real.
+    """
+    from jiwer import wer, cer
+
+    # Calentamiento: la primera llamada a generate incluye inicializaciones que no son parte del costo por lote
+    transcribir_por_lotes(audios[:1], asr_pipeline, sample_rate=sample_rate, generate_kwargs=generate_kwargs)
+
+    # Lote fijo (solo se reduce si falta memoria) para que la latencia sea comparable entre configuraciones
+    gobernador = GobernadorLotes(getattr(asr_pipeline.model, "device", "cpu"), batch_inicial=batch_size, adaptativo=False)
+    metricas = MetricasEjecucion()
+    inicio = time.perf_counter()
+    hipotesis = transcribir_por_lotes(audios, asr_pipeline, sample_rate=sample_rate, max_relleno=max_relleno,
+                                      metricas=metricas, generate_kwargs=generate_kwargs, gobernador=gobernador)
+    segundos = time.perf_counter() - inicio
+    audio_s = sum(len(a) for a in audios) / sample_rate
+
+    # jiwer no acepta referencias vacías; esas muestras se omiten de WER y CER
+    pares = [(r, h) for r, h in zip(referencias, hipotesis) if r.strip()]
+    latencias = [lote["pared_s"] for lote in metricas.lotes_asr]
+    resultado = {
+        "muestras": len(audios),
+        "audio_s": round(audio_s, 2),
+        "wer": round(wer([r for r, _ in pares], [h for _, h in pares]) * 100, 2) if pares else None,
+        "cer": round(cer([r for r, _ in pares], [h for _, h in pares]) * 100, 2) if pares else None,
+        "segundos": round(segundos, 2),
+        "rtf": round(segundos / audio_s, 4) if audio_s else None,
+        "lotes": len(latencias),
+    }
+    for p in PERCENTILES:
+        resultado[f"latencia_p{p}_s"] = round(float(np.percentile(latencias, p)), 3) if latencias else None
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara checkpoints de Whisper y parámetros de decodificación (WER, CER, latencia y RTF)"
+    )
+    parser.add_argument("checkpoints", nargs="*", default=[MODEL_PATH],
+                        help="Modelos a evaluar (carpetas locales con modelo y procesador, o nombres en HuggingFace)")
+    parser.add_argument("--cache", default=CACHE_DIR, help="Caché de shards del fine-tuning (ver datos_whisper.py)")
+    parser.add_argument("--split", default="test", help="Split del caché a evaluar")
+    parser.add_argument("--max-muestras", type=int, default=None, help="Evalúa solo las primeras N muestras")
+    parser.add_argument("--num-beams", type=int, nargs="+", default=[None], help="Tamaños de beam a comparar")
+    parser.add_argument("--max-length", type=int, nargs="+", default=[None], help="Longitudes máximas a comparar")
+    parser.add_argument("--backend", choices=BACKENDS_ASR, default=ASR_BACKEND, help="Backend de inferencia")
+    parser.add_argument("--batch-size", type=int, default=ASR_BATCH_SIZE, help="Segmentos por lote")
+    parser.add_argument("--max-relleno", type=float, default=ASR_MAX_RELLENO, help="Relleno máximo por lote")
+    args = parser.parse_args()
+
+    if not cache_completo(args.cache):
+        print(f"❌ No existe el caché '{args.cache}'. Prepáralo primero con scripts/finetuning-Whisper-v3.py.")
+        sys.exit(1)
+    dataset = DatasetWhisper(args.cache, args.split)
+    referencias = cargar_referencias(dataset, args.cache, args.split)
+    n = min(len(dataset), args.max_muestras or len(dataset))
+    audios = [dataset.audio_y_etiquetas(i)[0] for i in range(n)]
+    referencias = referencias[:n]
+    print(f"🎧 {n} muestra(s) de '{args.split}' ({sum(len(a) for a in audios) / dataset.sample_rate / 60:.1f} min)")
+
+    resultados = []
+    for checkpoint in args.checkpoints:
+        try:
+            asr_pipeline = cargar_pipeline_asr(checkpoint, backend=args.backend)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"⚠️ No se pudo cargar '{checkpoint}': {e}")
+            continue
+        for num_beams, max_length in itertools.product(args.num_beams, args.max_length):
+            generate_kwargs = {}
+            if num_beams is not None:
+                generate_kwargs["num_beams"] = num_beams
+            if max_length is not None:
+                generate_kwargs["max_length"] = max_length
+            print(f"🔎 {checkpoint} {generate_kwargs or '(configuración del modelo)'}")
+            resultado = evaluar(audios, referencias, asr_pipeline, generate_kwargs, args.batch_size, args.max_relleno,
+                                sample_rate=dataset.sample_rate)
+            resultados.append({"checkpoint": checkpoint, "backend": args.backend,
+                               "num_beams": num_beams, "max_length": max_length, **resultado})
+        # Solo un checkpoint en memoria a la vez
+        del asr_pipeline
+        obtener_registro().liberar()
+
+    ancho = max([len("checkpoint")] + [len(r["checkpoint"]) for r in resultados])
+    print(f"\n{'checkpoint':<{ancho}} {'beams':>5} {'max_len':>7} {'WER':>7} {'CER':>7} "
+          f"{'p50 (s)':>8} {'p90 (s)':>8} {'p99 (s)':>8} {'RTF':>7}")
+    for r in resultados:
+        print(f"{r['checkpoint']:<{ancho}} {r['num_beams'] or '-'!s:>5} {r['max_length'] or '-'!s:>7} "
+              f"{r['wer']!s:>6}% {r['cer']!s:>6}% {r['latencia_p50_s']!s:>8} {r['latencia_p90_s']!s:>8} "
+              f"{r['latencia_p99_s']!s:>8} {r['rtf']!s:>7}")
+
+    os.makedirs(EVALUACION_DIR, exist_ok=True)
+    salida = os.path.join(EVALUACION_DIR, "evaluacion.json")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=4)
+    print(f"\n💾 Evaluación guardada en '{salida}'")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
 import os
 import gc
 import torch
-import numpy as np
-from datasets import DatasetDict, load_dataset
+from datasets import load_dataset
 
 # === LIBERACIÓN DE VRAM Y RAM ===
 def clear_vram():
@@ -22,86 +21,17 @@ def clear_ram():
     except:
         print("🪛 RAM liberada")
 
-# === CARGA O DESCARGA DEL DATASET ===
-DATASET_PROCESADO_PATH = "./preprocessed_data"
-os.makedirs(DATASET_PROCESADO_PATH, exist_ok=True)
-
-# Si ya existe un dataset preprocesado en disco, cárgalo
-if os.path.exists(os.path.join(DATASET_PROCESADO_PATH, "dataset_dict.json")):
-    print("✅ Cargando dataset preprocesado desde disco...")
-    ds = DatasetDict.load_from_disk(DATASET_PROCESADO_PATH)
-else:
-    # Si no, descárgalo desde Hugging Face y prepáralo
-    print("⬇  Descargando dataset desde Hugging Face...")
-    ds = load_dataset("RebecaLeyva/UNAM_ParraPostPartum_dataset")
-
-    # Tokenizador Whisper específico para español y tarea de transcripción
-    from transformers import WhisperTokenizer
-    tokenizer = WhisperTokenizer.from_pretrained("RebecaLeyva/STT-ParraPostPartum-v1", language="Spanish", task="transcribe")
-
-    # --- Filtrado de muestras demasiado largas (máximo 400 tokens) ---
-    def is_short_enough(batch):
-        return len(tokenizer(batch["transcription"]).input_ids) <= 400
-
-    ds["train"] = ds["train"].filter(is_short_enough)
-    ds["test"] = ds["test"].filter(is_short_enough)
-
-    # --- Añadir campo "split" para identificar train/test ---
-    ds["train"] = ds["train"].map(lambda x: {**x, "split": "train"})
-    ds["test"] = ds["test"].map(lambda x: {**x, "split": "test"})
-
-    # --- Extraer arreglo de audio en float32 ---
-    def extract_audio_array(batch):
-        batch["audio_array"] = np.array(batch["audio"]["array"], dtype=np.float32)
-        return batch
-
-    ds["train"] = ds["train"].map(extract_audio_array, num_proc=1)
-    ds["test"] = ds["test"].map(extract_audio_array, num_proc=1)
-
-    # --- AUMENTACIÓN DE DATOS ---
-    # Añade ruido, cambio de pitch, time stretch y desplazamiento (shift)
-    from audiomentations import Compose, AddGaussianNoise, TimeStretch, PitchShift, Shift
-    augmenter = Compose([
-        AddGaussianNoise(min_amplitude=0.001, max_amplitude=0.015, p=0.5),
-        TimeStretch(min_rate=0.85, max_rate=1.15, p=0.4),
-        PitchShift(min_semitones=-2, max_semitones=2, p=0.4),
-        Shift(min_shift=-0.1, max_shift=0.1, shift_unit="fraction", rollover=False, fade_duration=0.005, p=0.4),
-    ])
-
-    def augment_audio(batch):
-        """Aplica aumentaciones solo sobre la señal de audio."""
-        if not isinstance(batch["audio_array"], np.ndarray):
-            batch["audio_array"] = np.array(batch["audio_array"], dtype=np.float32)
-        batch["audio_array"] = augmenter(samples=batch["audio_array"], sample_rate=16000)
-        return batch
-
-    ds["train"] = ds["train"].map(augment_audio, num_proc=1)
+# === CARGA O PREPARACIÓN DEL DATASET ===
+# El caché guarda el audio en float16 y los tokens en shards mapeables en memoria (ver `datos_whisper.py`);
+# la aumentación y los log-mel se calculan en cada época en los procesos del DataLoader.
+from datos_whisper import DatasetWhisper, cache_completo, preparar_cache, CACHE_DIR
 
-    # --- EXTRACCIÓN DE FEATURES Y LABELS PARA WHISPER ---
-    from transformers import WhisperProcessor
-    processor = WhisperProcessor.from_pretrained("RebecaLeyva/STT-ParraPostPartum-v1", language="Spanish", task="transcribe")
-
-    def prepare_dataset(batch):
-        # Convierte el audio a features para el modelo y la transcripción a etiquetas de texto (tokens)
-        batch["input_features"] = processor.feature_extractor(
-            batch["audio_array"], sampling_rate=16000
-        ).input_features[0]
-        batch["labels"] = processor.tokenizer(batch["transcription"]).input_ids
-        return batch
-
-    ds["train"] = ds["train"].map(prepare_dataset, remove_columns=ds["train"].column_names)
-    ds["test"] = ds["test"].map(prepare_dataset, remove_columns=ds["test"].column_names)
-
-    # --- Guarda el dataset preprocesado en disco para acelerar futuras ejecuciones ---
-    ds.save_to_disk(DATASET_PROCESADO_PATH)
-    print(f"💾 Dataset preprocesado guardado en {DATASET_PROCESADO_PATH}")
+DATASET_PROCESADO_PATH = CACHE_DIR
+PROCESOS_PREPROCESAMIENTO = int(os.getenv("FINETUNING_PROCESOS", str(os.cpu_count() or 1)))
+DATALOADER_WORKERS = int(os.getenv("FINETUNING_DATALOADER_WORKERS", str(min(4, os.cpu_count() or 1))))
 
 # === ENTRENAMIENTO ===
 
-# --- Cargar el procesador Whisper ---
-from transformers import WhisperProcessor
-processor = WhisperProcessor.from_pretrained("RebecaLeyva/STT-ParraPostPartum-v1", language="Spanish", task="transcribe")
-
 # --- COLLATOR PARA AGRUPAR LOTES Y PADDING DINÁMICO ---
 from dataclasses import dataclass
 from typing import Any, Dict, List, Union
@@ -112,7 +42,7 @@ class DataCollatorSpeechSeq2SeqWithPadding:
     processor: Any
     decoder_start_token_id: int
 
-    def _call_(self, features: List[Dict[str, Union[List[int], torch.Tensor]]]) -> Dict[str, torch.Tensor]:
+    def __call__(self, features: List[Dict[str, Union[List[int], torch.Tensor]]]) -> Dict[str, torch.Tensor]:
         # Junta los features de entrada
         input_features = [{"input_features": f["input_features"]} for f in features]
         batch = self.processor.feature_extractor.pad(input_features, return_tensors="pt")
@@ -126,82 +56,113 @@ class DataCollatorSpeechSeq2SeqWithPadding:
         batch["labels"] = labels
         return batch
 
-data_collator = DataCollatorSpeechSeq2SeqWithPadding(
-    processor=processor,
-    decoder_start_token_id=processor.tokenizer.bos_token_id,
-)
-
-# --- MÉTRICAS ---
-from jiwer import wer
-
-def compute_metrics(pred):
-    """Calcula WER (Word Error Rate) usando jiwer."""
-    pred_ids = pred.predictions
-    label_ids = pred.label_ids
-    label_ids[label_ids == -100] = processor.tokenizer.pad_token_id
-    pred_str = processor.tokenizer.batch_decode(pred_ids, skip_special_tokens=True)
-    label_str = processor.tokenizer.batch_decode(label_ids, skip_special_tokens=True)
-    wer_score = wer(label_str, pred_str) * 100
-    return {"wer": wer_score}
-
-# --- CONFIGURACIÓN DEL ENTRENADOR ---
-from transformers import Seq2SeqTrainingArguments, EarlyStoppingCallback
-
-training_args = Seq2SeqTrainingArguments(
-    output_dir="./whisper-finetuned",
-    per_device_train_batch_size=2,
-    per_device_eval_batch_size=2,
-    learning_rate=5e-6,
-    num_train_epochs=10,
-    warmup_steps=500,
-    evaluation_strategy="steps",
-    eval_steps=200,
-    save_steps=200,
-    logging_steps=50,
-    save_total_limit=2,
-    predict_with_generate=True,
-    fp16=True,  # usa precisión mixta para GPU moderna (reduce RAM y acelera)
-    push_to_hub=False,
-    load_best_model_at_end=True,
-    metric_for_best_model="wer",
-    greater_is_better=False,
-    generation_max_length=444,
-)
-
-# --- LIMPIEZA DE MEMORIA ---
-clear_vram()
-clear_ram()
-
-# --- CARGA DEL MODELO BASE (Whisper fine-tuneable) ---
-from transformers import WhisperForConditionalGeneration
-model = WhisperForConditionalGeneration.from_pretrained("RebecaLeyva/STT-ParraPostPartum-v1")
-model.generation_config.max_length = 444
-clear_vram()
-clear_ram()
-
-# --- INICIALIZACIÓN DEL ENTRENADOR ---
-from transformers import Seq2SeqTrainer
-trainer = Seq2SeqTrainer(
-    args=training_args,
-    model=model,
-    train_dataset=ds["train"],
-    eval_dataset=ds["test"],
-    data_collator=data_collator,
-    compute_metrics=compute_metrics,
-    tokenizer=processor.feature_extractor,
-    callbacks=[EarlyStoppingCallback(early_stopping_patience=3)],
-)
-
-clear_vram()
-clear_ram()
-
-# --- ENTRENAMIENTO DEL MODELO ---
-trainer.train()
-clear_vram()
-clear_ram()
-
-# --- GUARDADO FINAL DEL MODELO Y DEL PROCESSOR ---
-output_dir = "./whisper-finetuned-augment"
-model.save_pretrained(output_dir)
-processor.save_pretrained(output_dir)
-print(f"✅ Modelo y processor guardados en: {output_dir}")
+def main():
+    # Todo el trabajo ocurre aquí: los procesos del preprocesamiento y del DataLoader vuelven a importar
+    # este script en plataformas con "spawn" (macOS, Windows) y no deben repetir la preparación ni el entrenamiento
+
+    # --- Cargar el procesador Whisper (tokenizador en español y tarea de transcripción) ---
+    from transformers import WhisperProcessor
+    processor = WhisperProcessor.from_pretrained("RebecaLeyva/STT-ParraPostPartum-v1", language="Spanish", task="transcribe")
+
+    # Si ya existe el caché en disco se reutiliza; si no, se descarga el dataset y se prepara en paralelo
+    if cache_completo(DATASET_PROCESADO_PATH):
+        print("✅ Cargando dataset preprocesado desde disco...")
+    else:
+        print("⬇  Descargando dataset desde Hugging Face...")
+        ds = load_dataset("RebecaLeyva/UNAM_ParraPostPartum_dataset")
+        preparar_cache(ds, processor.tokenizer, DATASET_PROCESADO_PATH, procesos=PROCESOS_PREPROCESAMIENTO)
+        print(f"💾 Dataset preprocesado guardado en {DATASET_PROCESADO_PATH}")
+        del ds
+
+    # Solo el conjunto de entrenamiento se aumenta (con aumentaciones nuevas en cada época)
+    ds = {
+        "train": DatasetWhisper(DATASET_PROCESADO_PATH, "train", processor.feature_extractor, aumentar=True),
+        "test": DatasetWhisper(DATASET_PROCESADO_PATH, "test", processor.feature_extractor, aumentar=False),
+    }
+
+    # --- COLLATOR ---
+    data_collator = DataCollatorSpeechSeq2SeqWithPadding(
+        processor=processor,
+        decoder_start_token_id=processor.tokenizer.bos_token_id,
+    )
+
+    # --- MÉTRICAS ---
+    from jiwer import wer
+
+    def compute_metrics(pred):
+        """Calcula WER (Word Error Rate) usando jiwer."""
+        pred_ids = pred.predictions
+        label_ids = pred.label_ids
+        label_ids[label_ids == -100] = processor.tokenizer.pad_token_id
+        pred_str = processor.tokenizer.batch_decode(pred_ids, skip_special_tokens=True)
+        label_str = processor.tokenizer.batch_decode(label_ids, skip_special_tokens=True)
+        wer_score = wer(label_str, pred_str) * 100
+        return {"wer": wer_score}
+
+    # --- CONFIGURACIÓN DEL ENTRENADOR ---
+    from transformers import Seq2SeqTrainingArguments, EarlyStoppingCallback
+
+    training_args = Seq2SeqTrainingArguments(
+        output_dir="./whisper-finetuned",
+        per_device_train_batch_size=2,
+        per_device_eval_batch_size=2,
+        learning_rate=5e-6,
+        num_train_epochs=10,
+        warmup_steps=500,
+        evaluation_strategy="steps",
+        eval_steps=200,
+        save_steps=200,
+        logging_steps=50,
+        save_total_limit=2,
+        predict_with_generate=True,
+        fp16=True,  # usa precisión mixta para GPU moderna (reduce RAM y acelera)
+        push_to_hub=False,
+        load_best_model_at_end=True,
+        metric_for_best_model="wer",
+        greater_is_better=False,
+        generation_max_length=444,
+        dataloader_num_workers=DATALOADER_WORKERS,  # aumentación y log-mel en paralelo con el entrenamiento
+        dataloader_pin_memory=True,
+        remove_unused_columns=False,
+    )
+
+    # --- LIMPIEZA DE MEMORIA ---
+    clear_vram()
+    clear_ram()
+
+    # --- CARGA DEL MODELO BASE (Whisper fine-tuneable) ---
+    from transformers import WhisperForConditionalGeneration
+    model = WhisperForConditionalGeneration.from_pretrained("RebecaLeyva/STT-ParraPostPartum-v1")
+    model.generation_config.max_length = 444
+    clear_vram()
+    clear_ram()
+
+    # --- INICIALIZACIÓN DEL ENTRENADOR ---
+    from transformers import Seq2SeqTrainer
+    trainer = Seq2SeqTrainer(
+        args=training_args,
+        model=model,
+        train_dataset=ds["train"],
+        eval_dataset=ds["test"],
+        data_collator=data_collator,
+        compute_metrics=compute_metrics,
+        tokenizer=processor.feature_extractor,
+        callbacks=[EarlyStoppingCallback(early_stopping_patience=3)],
+    )
+
+    clear_vram()
+    clear_ram()
+
+    # --- ENTRENAMIENTO DEL MODELO ---
+    trainer.train()
+    clear_vram()
+    clear_ram()
+
+    # --- GUARDADO FINAL DEL MODELO Y DEL PROCESSOR ---
+    output_dir = "./whisper-finetuned-augment"
+    model.save_pretrained(output_dir)
+    processor.save_pretrained(output_dir)
+    print(f"✅ Modelo y processor guardados en: {output_dir}")
+
+if __name__ == "__main__":
+    main()
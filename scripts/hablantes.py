@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+
+# Permite importar el paquete 'funciones' al ejecutar el script desde cualquier carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funciones.entorno import cargar_entorno
+cargar_entorno()
+
+from funciones import almacen_hablantes
+from funciones.diarizacion_por_ventanas import UMBRAL_HABLANTES
+from funciones.backends_asr import BACKENDS_ASR, ASR_BACKEND
+
+def transcribir_de_nuevo(carpeta, turnos, planificar=True, backend=ASR_BACKEND):
+    """
+    Vuelve a planificar y transcribir los turnos re-agrupados sobre el `*_processed.wav` de la carpeta (en el
+    tiempo original, así que también sirve si la carpeta se procesó con VAD) y actualiza el índice del corpus.
+    """
+    from funciones.transcripcion import transcripcion_de_audio
+
+    wavs = sorted(n for n in os.listdir(carpeta) if n.endswith("_processed.wav"))
+    if not wavs:
+        raise ValueError(f"'{carpeta}' no tiene *_processed.wav; vuelve a correr post_partum.py sobre el archivo "
+                         f"original (el re-agrupamiento guardado se aplica de nuevo)")
+    transcripcion_de_audio(os.path.join(carpeta, wavs[0]), turnos, output_dir=carpeta, planificar=planificar,
+                           backend=backend)
+
+def reagrupar(args):
+    inicio = time.perf_counter()
+    turnos = almacen_hablantes.reagrupar(
+        args.carpeta, umbral=args.umbral, num_hablantes=args.hablantes,
+        min_hablantes=args.min_hablantes, max_hablantes=args.max_hablantes
+    )
+    print(f"⏱️ Re-agrupado en {time.perf_counter() - inicio:.1f} s")
+    if args.sin_transcribir:
+        print("ℹ️ aligned_transcription.json sigue con los turnos anteriores (--sin-transcribir).")
+        return
+    transcribir_de_nuevo(args.carpeta, turnos, planificar=not args.sin_planificador, backend=args.backend_asr)
+
+def buscar(args):
+    carpetas = [os.path.join(args.resultados, n) for n in sorted(os.listdir(args.resultados))
+                if os.path.isfile(os.path.join(args.resultados, n, almacen_hablantes.ALMACEN_HABLANTES))]
+    embedding = almacen_hablantes.embedding_de_hablante(args.carpeta, args.hablante)
+    inicio = time.perf_counter()
+    coincidencias = almacen_hablantes.buscar_hablante(embedding, carpetas, umbral=args.umbral, limite=args.limite)
+    ms = (time.perf_counter() - inicio) * 1000
+    for carpeta, hablante, distancia in coincidencias:
+        print(f"{os.path.basename(carpeta):<30} {hablante:<11} distancia {distancia:.3f}")
+    print(f"\n📊 {len(coincidencias)} coincidencia(s) en {len(carpetas)} sesión(es) en {ms:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-agrupa hablantes y busca hablantes entre sesiones con los embeddings guardados")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_reagrupar = sub.add_parser("reagrupar", help="Recalcula los turnos sin volver a correr pyannote y vuelve a transcribir")
+    p_reagrupar.add_argument("carpeta", help="Carpeta de resultados con diarization_embeddings.npz")
+    p_reagrupar.add_argument("--umbral", type=float, default=None, help="Umbral de agrupamiento (distancia coseno)")
+    p_reagrupar.add_argument("--hablantes", type=int, default=None, help="Número exacto de hablantes")
+    p_reagrupar.add_argument("--min-hablantes", type=int, default=None, help="Número mínimo de hablantes")
+    p_reagrupar.add_argument("--max-hablantes", type=int, default=None, help="Número máximo de hablantes")
+    p_reagrupar.add_argument("--sin-transcribir", action="store_true",
+                             help="Solo reescribe diarization_results.json (no vuelve a transcribir)")
+    p_reagrupar.add_argument("--sin-planificador", action="store_true",
+                             help="Transcribe cada turno tal cual, sin unir ni dividir segmentos")
+    p_reagrupar.add_argument("--backend-asr", choices=BACKENDS_ASR, default=ASR_BACKEND, help="Backend de inferencia")
+    p_buscar = sub.add_parser("buscar", help="Busca un hablante de una sesión en todas las sesiones")
+    p_buscar.add_argument("carpeta", help="Carpeta de resultados de la sesión de referencia")
+    p_buscar.add_argument("hablante", help="Hablante de referencia, p. ej. SPEAKER_01")
+    p_buscar.add_argument("--resultados", default="resultados", help="Carpeta con las carpetas de resultados")
+    p_buscar.add_argument("--umbral", type=float, default=UMBRAL_HABLANTES, help="Distancia coseno máxima")
+    p_buscar.add_argument("--limite", type=int, default=50, help="Número máximo de coincidencias")
+    args = parser.parse_args()
+
+    try:
+        {"reagrupar": reagrupar, "buscar": buscar}[args.comando](args)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import argparse
+
+# Permite importar el paquete 'funciones' al ejecutar el script desde cualquier carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funciones.entorno import cargar_entorno
+cargar_entorno()
+
+from funciones.backends_asr import BACKENDS_ASR, BACKENDS_ASR_DIR, evaluar_backend
+from funciones.transcripcion import abrir_audio, extraer_segmentos, MODEL_PATH
+from datos_whisper import DatasetWhisper, cache_completo, cargar_referencias
+
+def cargar_segmentos(carpetas, max_segmentos):
+    """
+    Toma segmentos de carpetas de resultados ya procesadas: el audio sale del `*_processed.wav` y los
+    tramos de `aligned_transcription.json`. Sus "transcript" los produjo el propio pipeline, así que no
+    sirven como referencia: con estas carpetas solo se mide el acuerdo de cada backend con eager.
+    """
+    audios = []
+    for carpeta in carpetas:
+        with open(os.path.join(carpeta, "aligned_transcription.json"), "r", encoding="utf-8") as f:
+            segmentos = json.load(f)
+        wavs = [n for n in os.listdir(carpeta) if n.endswith("_processed.wav")]
+        if not wavs:
+            print(f"⚠️ '{carpeta}' no tiene *_processed.wav; se omite")
+            continue
+        muestras, sr, convertir = abrir_audio(os.path.join(carpeta, wavs[0]))
+        convertir = convertir or (lambda tramo: tramo)
+        for segmento, audio in zip(segmentos, extraer_segmentos(muestras, sr, segmentos)):
+            if len(audio) == 0:
+                continue
+            audios.append(convertir(audio))
+            if len(audios) >= max_segmentos:
+                return audios
+    return audios
+
+def cargar_muestras_etiquetadas(carpeta, split, max_segmentos):
+    """Audio y transcripción humana de las muestras del caché de shards del fine-tuning (ver datos_whisper.py)."""
+    dataset = DatasetWhisper(carpeta, split)
+    referencias = cargar_referencias(dataset, carpeta, split)
+    n = min(len(dataset), max_segmentos)
+    return [dataset.audio_y_etiquetas(i)[0] for i in range(n)], referencias[:n]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara los backends optimizados de Whisper contra eager (WER con jiwer y rendimiento)"
+    )
+    parser.add_argument("carpetas", nargs="*", help="Carpetas de resultados con *_processed.wav y aligned_transcription.json")
+    parser.add_argument("--cache", default=None,
+                        help="Caché de shards del fine-tuning: usa sus transcripciones humanas como referencia")
+    parser.add_argument("--split", default="test", help="Split del caché a usar con --cache")
+    parser.add_argument("--backends", nargs="+", choices=[b for b in BACKENDS_ASR if b != "eager"],
+                        default=[b for b in BACKENDS_ASR if b != "eager"], help="Backends a evaluar")
+    parser.add_argument("--modelo", default=MODEL_PATH, help="Modelo Whisper")
+    parser.add_argument("--max-segmentos", type=int, default=100, help="Máximo de segmentos a transcribir")
+    parser.add_argument("--max-wer", type=float, default=None,
+                        help="Falla (código 1) si algún backend se aleja de eager más que este WER (%%)")
+    args = parser.parse_args()
+
+    if args.cache:
+        if not cache_completo(args.cache):
+            print(f"❌ No existe el caché '{args.cache}'. Prepáralo primero con scripts/finetuning-Whisper-v3.py.")
+            sys.exit(1)
+        audios, referencias = cargar_muestras_etiquetadas(args.cache, args.split, args.max_segmentos)
+    else:
+        audios, referencias = cargar_segmentos(args.carpetas, args.max_segmentos), None
+    if not audios:
+        print("❌ No se encontraron segmentos para evaluar.")
+        sys.exit(1)
+    print(f"🎧 {len(audios)} segmento(s) de validación")
+
+    resultados = []
+    for backend in args.backends:
+        try:
+            resultados.append(evaluar_backend(backend, audios, referencias, model_id=args.modelo))
+        except RuntimeError as e:
+            print(f"⚠️ {backend}: {e}")
+
+    # WER contra las referencias solo con muestras etiquetadas (--cache)
+    print(f"\n{'backend':<9} {'WER vs eager':>13}" + (f" {'WER eager':>10} {'WER backend':>12}" if referencias else "")
+          + f" {'RTF':>8} {'aceleración':>12}")
+    for r in resultados:
+        print(f"{r['backend']:<9} {r['wer_vs_eager']!s:>12}%"
+              + (f" {r['wer_eager']!s:>9}% {r['wer_backend']!s:>11}%" if referencias else "")
+              + f" {r['rtf_' + r['backend']]!s:>8} {r['aceleracion']!s:>11}x")
+
+    os.makedirs(BACKENDS_ASR_DIR, exist_ok=True)
+    salida = os.path.join(BACKENDS_ASR_DIR, "validacion.json")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=4)
+    print(f"\n💾 Validación guardada en '{salida}'")
+
+    if args.max_wer is not None:
+        excedidos = [r["backend"] for r in resultados if (r["wer_vs_eager"] or 0) > args.max_wer]
+        if excedidos:
+            print(f"❌ Exceden el WER máximo ({args.max_wer}%): {', '.join(excedidos)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deben cargarse solo por importar post_partum.py (los importa cada etapa al usarlos)
+MODULOS_PESADOS = ("torch", "torchaudio", "pyannote", "transformers", "librosa", "scipy.signal", "lightning")
+
+# Tiempo máximo (mediana) de `python post_partum.py` sin argumentos
+PRESUPUESTO_MS = float(os.getenv("ARRANQUE_PRESUPUESTO_MS", "800"))
+
+def medir_arranque(repeticiones):
+    """Mide el tiempo de pared de `python post_partum.py` sin argumentos (imprime el uso y sale)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "post_partum.py"], cwd=RAIZ,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+def modulos_pesados_cargados():
+    """Regresa los módulos pesados que quedan cargados después de importar post_partum."""
+    codigo = (
+        "import sys, json; import post_partum; "
+        f"print(json.dumps([m for m in {MODULOS_PESADOS!r} if m in sys.modules]))"
+    )
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+def importaciones_mas_lentas(n=10):
+    """Regresa los `n` módulos con mayor tiempo acumulado de importación (python -X importtime)."""
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", "import post_partum"],
+                            cwd=RAIZ, capture_output=True, text=True)
+    filas = []
+    for linea in salida.stderr.splitlines():
+        partes = linea.split("|")
+        if len(partes) == 3 and partes[1].strip().isdigit():
+            filas.append((int(partes[1]), partes[2].rstrip()))
+    return sorted(filas, reverse=True)[:n]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Verifica que el arranque de post_partum.py no importe frameworks pesados ni exceda su presupuesto"
+    )
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS,
+                        help="Mediana máxima (ms) de `python post_partum.py` sin argumentos")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Número de mediciones")
+    args = parser.parse_args()
+
+    fallas = []
+    pesados = modulos_pesados_cargados()
+    if pesados:
+        fallas.append(f"importar post_partum carga módulos pesados: {', '.join(pesados)}")
+
+    tiempos = medir_arranque(args.repeticiones)
+    mediana = statistics.median(tiempos)
+    print(f"⏱️ Arranque sin argumentos: mediana {mediana:.0f} ms (mín {min(tiempos):.0f}, máx {max(tiempos):.0f}; "
+          f"presupuesto {args.presupuesto_ms:.0f} ms)")
+    if mediana > args.presupuesto_ms:
+        fallas.append(f"el arranque tarda {mediana:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+
+    if fallas:
+        for falla in fallas:
+            print(f"❌ {falla}")
+        print("\nImportaciones más lentas (acumulado, µs):")
+        for micros, modulo in importaciones_mas_lentas():
+            print(f"  {micros:>10}  {modulo}")
+        sys.exit(1)
+    print("✅ Arranque dentro del presupuesto y sin frameworks pesados")
+
+if __name__ == "__main__":
+    main()